@@ -0,0 +1,71 @@
+"""
+Measures starting spans in deep span trees carrying baggage, with child
+contexts sharing their parent's read-only baggage against copying it for
+every child as before, and the cost of setting a baggage item.
+
+    PYTHONPATH=. python benchmarks/bench_baggage.py
+"""
+import timeit
+from haystack import HaystackTracer
+from haystack.recorder import NoopRecorder
+from haystack.span import Baggage
+
+ITERATIONS = 2000
+DEPTH = 50
+REPEAT = 5
+
+
+class CopyingTracer(HaystackTracer):
+    """Copies the parent's baggage into every child like start_span did"""
+
+    def start_span(self, *args, **kwargs):
+        span = super().start_span(*args, **kwargs)
+        span.context._baggage = Baggage(span.context._baggage)
+        return span
+
+
+class SharingTracer(HaystackTracer):
+    """Same call overhead as CopyingTracer, keeping the shared baggage"""
+
+    def start_span(self, *args, **kwargs):
+        span = super().start_span(*args, **kwargs)
+        span.context._baggage = span.context._baggage
+        return span
+
+
+def start_tree(tracer, baggage_items):
+    root = tracer.start_span("root", ignore_active_span=True)
+    for i in range(baggage_items):
+        root.set_baggage_item(f"item-{i}", f"value-{i}")
+
+    def tree():
+        span = root
+        for _ in range(DEPTH):
+            span = tracer.start_span("op", child_of=span)
+
+    return tree
+
+
+def main():
+    print(f"{'baggage':>8} {'copying (us/span)':>18} {'shared (us/span)':>17} "
+          f"{'set item (us)':>14}")
+    for baggage_items in (0, 4, 16):
+        times = []
+        for tracer_class in (CopyingTracer, SharingTracer):
+            tracer = tracer_class("bench", NoopRecorder())
+            tree = start_tree(tracer, baggage_items)
+            times.append(min(timeit.repeat(tree, number=ITERATIONS,
+                                           repeat=REPEAT)) /
+                         (ITERATIONS * DEPTH) * 1e6)
+        root = HaystackTracer("bench", NoopRecorder()).start_span("root")
+        for i in range(baggage_items):
+            root.set_baggage_item(f"item-{i}", f"value-{i}")
+        set_item = timeit.timeit(lambda: root.set_baggage_item("k", "v"),
+                                 number=ITERATIONS * 10) / \
+            (ITERATIONS * 10) * 1e6
+        print(f"{baggage_items:>8} {times[0]:>18.2f} {times[1]:>17.2f} "
+              f"{set_item:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
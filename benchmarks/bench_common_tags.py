@@ -0,0 +1,51 @@
+"""
+Measures starting, finishing and serializing spans of a tracer with 15
+common tags, the size of a typical deployment tag set, against a tracer
+without common tags.
+
+    PYTHONPATH=. python benchmarks/bench_common_tags.py
+"""
+import time
+from haystack import HaystackTracer
+from haystack.json_encoder import serialize_span_json
+from haystack.proto_encoder import serialize_span
+from haystack.recorder import NoopRecorder
+
+ITERATIONS = 20000
+COMMON_TAGS = {"env": "production", "region": "us-west-2",
+               "zone": "us-west-2a", "cluster": "checkout-eks-7",
+               "namespace": "checkout", "pod": "checkout-6d9f7c9b4-xk2lp",
+               "host": "ip-10-0-3-17", "pid": 4242, "version": "1.4.2",
+               "commit": "9f2c1ab", "build": 1312, "team": "payments",
+               "tier": "backend", "canary": False, "weight": 0.25}
+
+
+def bench(function, iterations=ITERATIONS):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    print(f"{'common tags':>12} {'start+finish (us)':>18} {'proto (us)':>11} "
+          f"{'json (us)':>10}")
+    for common_tags in ({}, COMMON_TAGS):
+        tracer = HaystackTracer("bench", NoopRecorder(),
+                                common_tags=common_tags)
+
+        def start_and_finish():
+            span = tracer.start_span("op", tags={"http.status_code": 200})
+            span.finish()
+
+        span = tracer.start_span("op", tags={"http.status_code": 200})
+        span.finish()
+        lifecycle = bench(start_and_finish)
+        proto = bench(lambda: serialize_span(span))
+        json = bench(lambda: serialize_span_json(span))
+        print(f"{len(common_tags):>12} {lifecycle:>18.2f} {proto:>11.2f} "
+              f"{json:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
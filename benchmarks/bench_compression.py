@@ -0,0 +1,107 @@
+"""
+Reports bytes on the wire and CPU time of compressing a batch of spans for a
+few span shapes, payload formats and compression settings, to pick the
+`compression` / `compression_level` of the http recorders.
+
+    PYTHONPATH=. python benchmarks/bench_compression.py
+"""
+import time
+from haystack import HaystackTracer, SyncHttpRecorder
+from haystack.compression import get_compressor
+from haystack.constants import GZIP, DEFLATE, ZSTD
+from haystack.recorder import NoopRecorder
+from haystack.util import proto_batch_payload, json_batch_payload
+
+BATCH = 100
+ROUNDS = 20
+
+SETTINGS = ((GZIP, 1), (GZIP, 6), (GZIP, 9),
+            (DEFLATE, 1), (DEFLATE, 6),
+            (ZSTD, 1), (ZSTD, 3), (ZSTD, 9))
+
+
+def small_span(tracer, i):
+    span = tracer.start_span("get-user", ignore_active_span=True)
+    span.set_tag("span.kind", "client")
+    span.set_tag("user.id", i)
+    span.finish()
+    return span
+
+
+def http_server_span(tracer, i):
+    span = tracer.start_span("GET /api/v1/users/{id}",
+                             ignore_active_span=True)
+    span.set_tag("span.kind", "server")
+    span.set_tag("component", "flask")
+    span.set_tag("http.method", "GET")
+    span.set_tag("http.url", f"https://api.example.com/api/v1/users/{i}")
+    span.set_tag("http.status_code", 200)
+    span.set_tag("peer.hostname", "10.0.3.17")
+    span.set_tag("user.id", i)
+    span.set_tag("cache.hit", i % 2 == 0)
+    span.set_tag("db.rows", i * 3)
+    span.set_tag("response.size", 1024 + i)
+    span.log_kv({"event": "cache-miss", "key": f"user:{i}"})
+    span.finish()
+    return span
+
+
+def error_span(tracer, i):
+    span = tracer.start_span("process-order", ignore_active_span=True)
+    for tag in range(30):
+        span.set_tag(f"order.attribute.{tag}", f"value-{tag}-{i}")
+    span.set_tag("error", True)
+    for log in range(4):
+        span.log_kv({"event": "retry", "attempt": log})
+    span.log_kv({"event": "error",
+                 "stack": "Traceback (most recent call last):\n" +
+                          "  File \"/app/orders.py\", line 42, in submit\n" * 8})
+    span.finish()
+    return span
+
+
+def encode_batch(make_span, use_json):
+    tracer = HaystackTracer("order-service", NoopRecorder(),
+                            common_tags={"env": "production",
+                                         "region": "us-west-2"})
+    spans = [make_span(tracer, i) for i in range(BATCH)]
+    if use_json:
+        return json_batch_payload(
+            [SyncHttpRecorder.get_json_payload(span) for span in spans])
+    return proto_batch_payload(
+        [SyncHttpRecorder.get_binary_payload(span) for span in spans])
+
+
+def measure(compress, payload):
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        compressed = compress(payload)
+    elapsed = time.process_time() - start
+    return len(compressed), elapsed / ROUNDS
+
+
+def main():
+    print(f"{BATCH} spans per batch")
+    print(f"{'shape':>12} {'format':>6} {'codec':>8} {'level':>5} "
+          f"{'bytes/span':>10} {'ratio':>6} {'us/batch':>9}")
+    for shape, make_span in (("small", small_span),
+                             ("http-server", http_server_span),
+                             ("error", error_span)):
+        for use_json in (False, True):
+            payload = encode_batch(make_span, use_json)
+            payload_format = "json" if use_json else "proto"
+            print(f"{shape:>12} {payload_format:>6} {'none':>8} {'-':>5} "
+                  f"{len(payload) / BATCH:>10.0f} {1.0:>6.2f} {0:>9.0f}")
+            for codec, level in SETTINGS:
+                try:
+                    compress = get_compressor(codec, level)
+                except ImportError:
+                    continue
+                size, seconds = measure(compress, payload)
+                print(f"{shape:>12} {payload_format:>6} {codec:>8} "
+                      f"{level:>5} {size / BATCH:>10.0f} "
+                      f"{len(payload) / size:>6.2f} {seconds * 1e6:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
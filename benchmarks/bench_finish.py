@@ -0,0 +1,49 @@
+"""
+Measures the cost of Span.finish() for spans with an increasing number of tags
+and logs, comparing in-process proto translation with deferred recording.
+
+    PYTHONPATH=. python benchmarks/bench_finish.py
+"""
+import time
+from haystack import HaystackTracer, DeferredRecorder
+from haystack.recorder import SpanRecorder
+from haystack.proto_encoder import serialize_span
+
+ITERATIONS = 20000
+
+
+class ProtoRecorder(SpanRecorder):
+    """Translates spans in-process like SyncHttpRecorder, minus the network"""
+
+    def record_span(self, span):
+        serialize_span(span)
+
+
+def bench(recorder, tag_count):
+    tracer = HaystackTracer("bench", recorder)
+    tags = {f"tag.{i}": f"value-{i}" for i in range(tag_count)}
+
+    spans = []
+    for _ in range(ITERATIONS):
+        span = tracer.start_span("op", tags=dict(tags))
+        span.log_kv({"event": "bench"})
+        spans.append(span)
+
+    start = time.perf_counter()
+    for span in spans:
+        span.finish()
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def main():
+    print(f"{'tags':>6} {'in-process (us)':>16} {'deferred (us)':>14}")
+    for tag_count in (0, 10, 50, 200):
+        in_process = bench(ProtoRecorder(), tag_count)
+        deferred = bench(DeferredRecorder(ProtoRecorder(),
+                                          max_queue_size=ITERATIONS),
+                         tag_count)
+        print(f"{tag_count:>6} {in_process:>16.2f} {deferred:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Compares span throughput with uuid.uuid4() ids and the default PRNG backed
+RandomIdGenerator.
+
+    PYTHONPATH=. python benchmarks/bench_id_generator.py
+"""
+import timeit
+from haystack import HaystackTracer
+from haystack.recorder import NoopRecorder
+from haystack.id_generator import Uuid4IdGenerator, RandomIdGenerator
+
+ITERATIONS = 100000
+
+
+def spans_per_second(id_generator):
+    tracer = HaystackTracer("bench", NoopRecorder(), id_generator=id_generator)
+
+    def root_span():
+        tracer.start_span("op", ignore_active_span=True).finish()
+
+    return ITERATIONS / timeit.timeit(root_span, number=ITERATIONS)
+
+
+def ids_per_second(id_generator):
+    return ITERATIONS / timeit.timeit(id_generator.generate_span_id,
+                                      number=ITERATIONS)
+
+
+def main():
+    print(f"{'generator':>18} {'ids/s':>12} {'root spans/s':>14}")
+    for generator in (Uuid4IdGenerator(), RandomIdGenerator()):
+        print(f"{type(generator).__name__:>18} "
+              f"{ids_per_second(generator):>12,.0f} "
+              f"{spans_per_second(generator):>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares json encoding of spans through json.dumps(util.span_to_json(span))
+against json_encoder.serialize_span_json, with and without orjson, for
+single spans and 100 span batches joined by util.json_batch_payload, as the
+batching recorders do.
+
+    PYTHONPATH=. python benchmarks/bench_json_encoder.py
+"""
+import json
+import time
+from unittest import mock
+from haystack import HaystackTracer
+from haystack import json_encoder
+from haystack.recorder import NoopRecorder
+from haystack.util import span_to_json, json_batch_payload
+
+ITERATIONS = 2000
+BATCH = 100
+
+
+def dumps_span(span):
+    return json.dumps(
+        span_to_json(span),
+        default=lambda o: f"{o.__class__.__name__} is not serializable"
+    ).encode("utf-8")
+
+
+def make_span(tracer, tag_count, log_count):
+    span = tracer.start_span("op")
+    for i in range(tag_count):
+        span.set_tag(f"tag.{i}", ("value", 42, 3.5, True)[i % 4])
+    for i in range(log_count):
+        span.log_kv({"event": "bench", "attempt": i})
+    span.finish()
+    return span
+
+
+def bench(encode, argument, iterations=ITERATIONS):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(argument)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def batch_encoder(encode_span):
+    return lambda spans: json_batch_payload([encode_span(s) for s in spans])
+
+
+def encoders():
+    yield "json.dumps", dumps_span, batch_encoder(dumps_span)
+    encode_span = json_encoder.serialize_span_json
+    with mock.patch.object(json_encoder, "orjson", None):
+        yield "stdlib", encode_span, batch_encoder(encode_span)
+    if json_encoder.orjson is not None:
+        yield "orjson", encode_span, batch_encoder(encode_span)
+
+
+def main():
+    tracer = HaystackTracer("bench", NoopRecorder())
+    print(f"{'tags':>5} {'logs':>5} {'encoder':>10} {'us/span':>8} "
+          f"{'us/batch':>9}")
+    for tag_count, log_count in ((0, 0), (5, 1), (20, 2), (50, 5)):
+        span = make_span(tracer, tag_count, log_count)
+        batch = [span] * BATCH
+        for name, encode_span, encode_batch in encoders():
+            single = bench(encode_span, span)
+            batched = bench(encode_batch, batch, ITERATIONS // BATCH)
+            print(f"{tag_count:>5} {log_count:>5} {name:>10} {single:>8.1f} "
+                  f"{batched:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
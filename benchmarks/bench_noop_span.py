@@ -0,0 +1,47 @@
+"""
+Compares the cost of a child span with a tag and a log, started under an
+active root span, on the opentracing no-op tracer, an unsampled HaystackTracer
+and a sampled one.
+
+    PYTHONPATH=. python benchmarks/bench_noop_span.py
+"""
+import timeit
+import opentracing
+from haystack import HaystackTracer
+from haystack.recorder import NoopRecorder
+from haystack.sampler import ConstSampler
+
+ITERATIONS = 100000
+COMMON_TAGS = {f"deployment.tag.{i}": f"value-{i}" for i in range(15)}
+
+
+def usec_per_span(tracer):
+    def child_span():
+        span = tracer.start_span("child")
+        span.set_tag("http.method", "GET")
+        span.log_kv({"event": "bench"})
+        span.finish()
+
+    with tracer.start_active_span("root"):
+        elapsed = timeit.timeit(child_span, number=ITERATIONS)
+    return elapsed / ITERATIONS * 1e6
+
+
+def main():
+    noop = usec_per_span(opentracing.Tracer())
+    tracers = [
+        ("opentracing.Tracer()", opentracing.Tracer()),
+        ("HaystackTracer unsampled", HaystackTracer(
+            "bench", NoopRecorder(), common_tags=COMMON_TAGS,
+            sampler=ConstSampler(False))),
+        ("HaystackTracer sampled", HaystackTracer(
+            "bench", NoopRecorder(), common_tags=COMMON_TAGS)),
+    ]
+    print(f"{'tracer':>26} {'us/span':>8} {'x no-op':>8}")
+    for name, tracer in tracers:
+        cost = usec_per_span(tracer)
+        print(f"{name:>26} {cost:>8.2f} {cost / noop:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares injecting and extracting a span context through the dict carrier of
+TextPropagator, the same dict serialized to json bytes as it would be for a
+message queue or RPC header blob, and the bytearray carrier of
+BinaryPropagator.
+
+    PYTHONPATH=. python benchmarks/bench_propagation.py
+"""
+import json
+import timeit
+from haystack import HaystackTracer
+from haystack.recorder import NoopRecorder
+from haystack.text_propagator import TextPropagator
+from haystack.binary_propagator import BinaryPropagator
+
+ITERATIONS = 100000
+
+
+class JsonTextPropagator(object):
+    """TextPropagator with the carrier dict serialized to json bytes"""
+
+    def __init__(self):
+        self._propagator = TextPropagator()
+
+    def inject(self, span_context, carrier):
+        headers = {}
+        self._propagator.inject(span_context, headers)
+        carrier += json.dumps(headers).encode("utf-8")
+
+    def extract(self, carrier):
+        return self._propagator.extract(json.loads(carrier))
+
+
+def make_context(baggage_items):
+    tracer = HaystackTracer("bench", NoopRecorder())
+    parent = tracer.start_span("parent")
+    span = tracer.start_span("op", child_of=parent)
+    for i in range(baggage_items):
+        span.set_baggage_item(f"item-{i}", f"value-{i}")
+    return span.context
+
+
+def per_second(function):
+    return ITERATIONS / timeit.timeit(function, number=ITERATIONS)
+
+
+def carrier_size(carrier):
+    if isinstance(carrier, dict):
+        return sum(len(k) + len(v) for k, v in carrier.items())
+    return len(carrier)
+
+
+def main():
+    print(f"{'carrier':>10} {'baggage':>8} {'inject/s':>12} "
+          f"{'extract/s':>12} {'bytes':>6}")
+    for baggage_items in (0, 4):
+        span_context = make_context(baggage_items)
+        for name, propagator, new_carrier in (
+                ("dict", TextPropagator(), dict),
+                ("json", JsonTextPropagator(), bytearray),
+                ("binary", BinaryPropagator(), bytearray)):
+            carrier = new_carrier()
+            propagator.inject(span_context, carrier)
+            inject = per_second(
+                lambda: propagator.inject(span_context, new_carrier()))
+            extract = per_second(lambda: propagator.extract(carrier))
+            print(f"{name:>10} {baggage_items:>8} {inject:>12,.0f} "
+                  f"{extract:>12,.0f} {carrier_size(carrier):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Compares serializing spans by building span_pb2 messages with
+util.span_to_proto(span).SerializeToString() against writing the wire
+format directly with proto_encoder.serialize_span(span).
+
+    PYTHONPATH=. python benchmarks/bench_proto_encoder.py
+"""
+import time
+from haystack import HaystackTracer
+from haystack.proto_encoder import serialize_span
+from haystack.recorder import NoopRecorder
+from haystack.util import span_to_proto
+
+ITERATIONS = 5000
+
+
+def make_span(tracer, tag_count, log_count):
+    span = tracer.start_span("op")
+    for i in range(tag_count):
+        span.set_tag(f"tag.{i}", ("value", 42, 3.5, True)[i % 4])
+    for i in range(log_count):
+        span.log_kv({"event": "bench", "attempt": i})
+    span.finish()
+    return span
+
+
+def bench(serialize, span):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        serialize(span)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def main():
+    tracer = HaystackTracer("bench", NoopRecorder())
+    print(f"{'tags':>5} {'logs':>5} {'span_pb2 (us)':>14} "
+          f"{'encoder (us)':>13} {'speedup':>8}")
+    for tag_count, log_count in ((0, 0), (5, 1), (20, 2), (50, 5)):
+        span = make_span(tracer, tag_count, log_count)
+        messages = bench(lambda s: span_to_proto(s).SerializeToString(), span)
+        encoder = bench(serialize_span, span)
+        print(f"{tag_count:>5} {log_count:>5} {messages:>14.1f} "
+              f"{encoder:>13.1f} {messages / encoder:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
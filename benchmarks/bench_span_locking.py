@@ -0,0 +1,33 @@
+"""
+Compares span mutation throughput of the default locked spans with
+thread_safe_spans=False.
+
+    PYTHONPATH=. python benchmarks/bench_span_locking.py
+"""
+import timeit
+from haystack import HaystackTracer
+from haystack.recorder import NoopRecorder
+
+ITERATIONS = 1000000
+
+
+def ops_per_second(thread_safe_spans, statement):
+    tracer = HaystackTracer("bench", NoopRecorder(),
+                            thread_safe_spans=thread_safe_spans)
+    span = tracer.start_span("op")
+    elapsed = timeit.timeit(statement, globals={"span": span},
+                            number=ITERATIONS)
+    return ITERATIONS / elapsed
+
+
+def main():
+    print(f"{'operation':>28} {'locked ops/s':>14} {'lock-free ops/s':>16}")
+    for statement in ('span.set_tag("key", "value")',
+                      'span.get_baggage_item("key")',
+                      'span.set_operation_name("op")'):
+        print(f"{statement:>28} {ops_per_second(True, statement):>14,.0f} "
+              f"{ops_per_second(False, statement):>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
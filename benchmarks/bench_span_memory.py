@@ -0,0 +1,50 @@
+"""
+Reports the memory held per in-flight span (span, context, tags and logs) for
+a few span shapes.
+
+Most of the saving over plain dict-backed spans comes from allocating tags and
+logs lazily and from tuple based LogData. Span and SpanContext declare
+__slots__, but their opentracing base classes don't, so instances keep a
+__dict__; the slots only keep it empty, which saves a few bytes per object on
+python 3.11+ and more on earlier versions.
+
+    PYTHONPATH=. python benchmarks/bench_span_memory.py
+"""
+import gc
+import tracemalloc
+from haystack import HaystackTracer
+from haystack.recorder import NoopRecorder
+
+SPANS = 10000
+
+
+def bytes_per_span(tag_count, log_count):
+    tracer = HaystackTracer("bench", NoopRecorder())
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    spans = []
+    for _ in range(SPANS):
+        span = tracer.start_span("op", ignore_active_span=True)
+        for i in range(tag_count):
+            span.set_tag("tag", i)
+        for i in range(log_count):
+            span.log_kv({"event": i})
+        spans.append(span)
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return allocated / SPANS
+
+
+def main():
+    print(f"{'tags':>5} {'logs':>5} {'bytes/span':>11}")
+    for tag_count, log_count in ((0, 0), (1, 0), (1, 1), (5, 2)):
+        print(f"{tag_count:>5} {log_count:>5} "
+              f"{bytes_per_span(tag_count, log_count):>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compares TextPropagator.extract with the previous implementation, which
+lowercased every carrier key and every configured key on each comparison,
+for realistic inbound header sets: a dict of canonical-case headers as built
+from a WSGI environ, a dict of lowercase ASGI headers, and the
+case-insensitive mappings of requests and aiohttp (multidict).
+
+    PYTHONPATH=. python benchmarks/bench_text_extract.py
+"""
+import timeit
+from multidict import CIMultiDict
+from requests.structures import CaseInsensitiveDict
+from opentracing import SpanContextCorruptedException
+from haystack.propagator import PropagatorOpts
+from haystack.span import SpanContext
+from haystack.text_propagator import TextPropagator, parse_sampled
+
+ITERATIONS = 20000
+HEADER_COUNT = 50
+
+
+class LegacyTextPropagator(TextPropagator):
+    """TextPropagator.extract before keys were lowercased once"""
+
+    def extract(self, carrier):
+        count = 0
+        baggage = {}
+        parent_id = None
+        sampled = None
+        opts = self._propagator_opts
+
+        for key in carrier:
+            lc_key = key.lower()
+            value = carrier[key]
+            if lc_key == opts.span_id_key.lower():
+                span_id = value
+                count += 1
+            elif lc_key == opts.trace_id_key.lower():
+                trace_id = value
+                count += 1
+            elif lc_key.startswith(opts.baggage_key_prefix.lower()):
+                baggage[key[len(opts.baggage_key_prefix):]] = value
+            elif lc_key == opts.parent_id_key.lower():
+                parent_id = value
+            elif lc_key == opts.sampled_key.lower():
+                sampled = parse_sampled(value)
+
+        if count == 0:
+            return None
+        elif count != 2:
+            raise SpanContextCorruptedException(
+                "Both SpanID and TraceID are required")
+        return SpanContext(span_id=span_id, trace_id=trace_id,
+                           parent_id=parent_id, baggage=baggage,
+                           sampled=sampled)
+
+
+def wsgi_headers():
+    """Canonical-case headers of a browser request behind a load balancer"""
+    headers = {"Host": "www.example.com",
+               "User-Agent": "Mozilla/5.0 (X11; Linux x86_64)",
+               "Accept": "text/html,application/xhtml+xml",
+               "Accept-Encoding": "gzip, deflate, br",
+               "Accept-Language": "en-US,en;q=0.9",
+               "Cookie": "session=0123456789abcdef",
+               "X-Forwarded-For": "203.0.113.7",
+               "X-Forwarded-Proto": "https"}
+    for i in range(HEADER_COUNT - len(headers) - 6):
+        headers[f"X-Custom-Header-{i}"] = f"value-{i}"
+    propagator = TextPropagator()
+    propagator.inject(SpanContext(
+        trace_id="9c5a3b52-2f9e-4bb0-9a53-1e47ca1b6a10",
+        span_id="0d4b8e6c-42c0-4d0e-8f7c-3c2d25d0a4c1",
+        parent_id="6f1e0d36-0f52-4c55-b5d6-8d2f6f7f0a3e",
+        baggage={"user": "42", "tenant": "a"},
+        sampled=True), headers)
+    return headers
+
+
+def main():
+    headers = wsgi_headers()
+    carriers = (("wsgi dict", headers),
+                ("asgi dict", {k.lower(): v for k, v in headers.items()}),
+                ("requests", CaseInsensitiveDict(headers)),
+                ("multidict", CIMultiDict(headers)))
+    print(f"{'carrier':>10} {'headers':>8} {'legacy/s':>12} {'extract/s':>12}")
+    for name, carrier in carriers:
+        rates = [ITERATIONS / timeit.timeit(
+                     lambda: propagator.extract(carrier), number=ITERATIONS)
+                 for propagator in (LegacyTextPropagator(PropagatorOpts()),
+                                    TextPropagator())]
+        print(f"{name:>10} {len(carrier):>8} {rates[0]:>12,.0f} "
+              f"{rates[1]:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,10 @@ network and utilize HaystackAgentRecorder or offload the span record dispatching
 via Queue -> Worker model. In AWS this could mean implementing a SQSRecorder 
 which puts the finished span onto a SQS queue. The queue could then notify a 
 lambda implementing SyncHttpRecorder to dispatch the records. 
+
+Background recorders (AsyncHttpRecorder, BatchingHttpRecorder...) can be used 
+as long as the handler calls tracer.flush() before returning, so that no span 
+is left in flight when the execution context is frozen.
 """
 
 recorder = SyncHttpRecorder(os.env["COLLECTOR_URL"])
@@ -81,4 +85,6 @@ def handler(event, context):
         # child_scope's span will only represent total time interacting with the downstream service
         lambda_response = process_downstream_response(response)
 
+    # a no-op for SyncHttpRecorder, required for background recorders
+    tracer.flush()
     return lambda_response
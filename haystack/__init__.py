@@ -1,5 +1,13 @@
 from .tracer import HaystackTracer  # noqa
 from .http_recorder import AsyncHttpRecorder  # noqa
 from .http_recorder import SyncHttpRecorder  # noqa
+from .http_recorder import BatchingHttpRecorder  # noqa
 from .agent_recorder import HaystackAgentRecorder  # noqa
+from .agent_recorder import BatchingAgentRecorder  # noqa
 from .recorder import LoggerRecorder  # noqa
+from .background_recorder import DeferredRecorder  # noqa
+from .tail_sampling import TailSamplingRecorder  # noqa
+from .metrics import MetricsRecorder  # noqa
+from .ring_buffer import RingBufferRecorder  # noqa
+from .unix_socket_recorder import UnixSocketRecorder  # noqa
+from .asyncio_recorder import AsyncioHttpRecorder  # noqa
@@ -1,8 +1,24 @@
 import grpc
 import logging
-from haystack.recorder import SpanRecorder
-from haystack.agent import spanAgent_pb2_grpc
-from haystack.util import span_to_proto
+import threading
+from functools import partial
+from haystack import fork
+from haystack.recorder import SpanRecorder, PendingCalls
+from haystack.background_recorder import (
+    BatchingSpanRecorder,
+    deadline_after,
+)
+from haystack.agent import spanAgent_pb2
+from haystack.proto_encoder import serialize_span
+from haystack.constants import (
+    DEFAULT_AGENT_TIMEOUT,
+    DEFAULT_MAX_IN_FLIGHT,
+    DEFAULT_RECONNECT_TIMEOUT,
+    DEFAULT_MAX_QUEUE_SIZE,
+    DEFAULT_MAX_BATCH_BYTES,
+    DEFAULT_LINGER_MS,
+    DROP_NEWEST,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -16,8 +32,23 @@ class HaystackAgentRecorder(SpanRecorder):
     def __init__(self, agent_host="haystack-agent", agent_port=35000):
         logger.info("Initializing the remote grpc agent recorder, connecting "
                     f"at {agent_host}:{agent_port}")
-        channel = grpc.insecure_channel(f"{agent_host}:{agent_port}")
-        self._stub = spanAgent_pb2_grpc.SpanAgentStub(channel)
+        self._target = f"{agent_host}:{agent_port}"
+        self._connect()
+        self._pending = PendingCalls()
+        self._closed = False
+        fork.register(self)
+
+    def _connect(self):
+        self._channel = grpc.insecure_channel(self._target)
+        # spans are serialized by serialize_span, so requests are passed as-is
+        self._dispatch = self._channel.unary_unary(
+            "/SpanAgent/dispatch",
+            request_serializer=None,
+            response_deserializer=spanAgent_pb2.DispatchResult.FromString)
+
+    def _reinit_after_fork(self):
+        # channels created before fork are unusable in the child
+        self._connect()
 
     @staticmethod
     def process_response(future):
@@ -32,5 +63,172 @@ class HaystackAgentRecorder(SpanRecorder):
             logger.exception("Dispatch failed due to RPC error")
 
     def record_span(self, span):
-        future = self._stub.dispatch.future(span_to_proto(span))
+        if self._closed:
+            return
+        future = self._dispatch.future(serialize_span(span))
         future.add_done_callback(HaystackAgentRecorder.process_response)
+        self._pending.add(future)
+
+    def flush(self, timeout=None):
+        return self._pending.wait(timeout)
+
+    def close(self, timeout=None):
+        self._closed = True
+        flushed = self.flush(timeout)
+        self._channel.close()
+        return flushed
+
+
+class BatchingAgentRecorder(BatchingSpanRecorder):
+    """Haystack-agent recorder which coalesces finished spans on a background
+    flusher thread and pipelines them over one long-lived channel.
+
+    The agent only exposes a unary dispatch call, so spans are serialized once
+    on the flusher and sent as concurrent calls multiplexed on the same
+    HTTP/2 connection. At most `max_in_flight` calls are outstanding; beyond
+    that the flusher waits, the queue fills up and the drop policy applies,
+    so Span.finish() never blocks on the agent.
+
+    When the agent is unavailable the flusher waits up to
+    `reconnect_timeout_seconds` for the channel to reconnect before sending,
+    and rebuilds the channel if it does not. Spans which could not be sent
+    meanwhile are dropped, or kept in the `spill_queue` if one is given and
+    replayed once the agent is back.
+    """
+
+    def __init__(self,
+                 agent_host="haystack-agent",
+                 agent_port=35000,
+                 timeout_seconds=DEFAULT_AGENT_TIMEOUT,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 reconnect_timeout_seconds=DEFAULT_RECONNECT_TIMEOUT,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+                 max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+                 linger_ms=DEFAULT_LINGER_MS,
+                 drop_policy=DROP_NEWEST,
+                 spill_queue=None):
+        """
+        :param timeout_seconds: deadline of each dispatch call
+        :param max_in_flight: maximum number of unanswered dispatch calls
+        :param reconnect_timeout_seconds: time to wait for an unavailable
+        agent before the channel is rebuilt
+        :param max_queue_size: maximum number of spans waiting to be sent
+        :param max_batch_bytes: upper bound of spans coalesced per flush
+        :param linger_ms: maximum time a partial batch waits for more spans
+        :param drop_policy: DROP_NEWEST or DROP_OLDEST when the queue is full
+        :param spill_queue: optional :class:`haystack.spill.SpillQueue`
+        keeping spans on disk while the agent is unavailable
+        """
+        logger.info("Initializing the batching grpc agent recorder, "
+                    f"connecting at {agent_host}:{agent_port}")
+        self._target = f"{agent_host}:{agent_port}"
+        self._timeout_seconds = timeout_seconds
+        self._reconnect_timeout_seconds = reconnect_timeout_seconds
+        self._max_in_flight = max_in_flight
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._pending = PendingCalls()
+        self._unavailable = False
+        self._spill = spill_queue
+        self._connect()
+        super().__init__(max_queue_size=max_queue_size,
+                         max_batch_bytes=max_batch_bytes,
+                         linger_ms=linger_ms,
+                         drop_policy=drop_policy)
+
+    def _connect(self):
+        self._channel = grpc.insecure_channel(self._target)
+        # spans are serialized by encode_span, so requests are passed as-is
+        self._dispatch = self._channel.unary_unary(
+            "/SpanAgent/dispatch",
+            request_serializer=None,
+            response_deserializer=spanAgent_pb2.DispatchResult.FromString)
+
+    def _reinit_after_fork(self):
+        # channels created before fork are unusable in the child
+        self._connect()
+        self._in_flight = threading.BoundedSemaphore(self._max_in_flight)
+        self._unavailable = False
+        super()._reinit_after_fork()
+
+    def _await_agent(self):
+        try:
+            grpc.channel_ready_future(self._channel).result(
+                timeout=self._reconnect_timeout_seconds)
+            self._unavailable = False
+            return True
+        except grpc.FutureTimeoutError:
+            logger.warning(f"haystack-agent at {self._target} is unavailable, "
+                           f"rebuilding the channel")
+            self._channel.close()
+            self._connect()
+            return False
+
+    def encode_span(self, span):
+        return serialize_span(span)
+
+    def send_batch(self, encoded_spans):
+        if self._unavailable and not self._await_agent():
+            if self._spill is None:
+                logger.error(f"Dropped {len(encoded_spans)} spans as the "
+                             f"haystack-agent is unavailable")
+            else:
+                self._spill.append_all(encoded_spans)
+            return
+
+        if self._spill is not None and len(self._spill):
+            self._spill.append_all(encoded_spans)
+            self._spill.replay(self._dispatch_spilled)
+            return
+
+        for encoded_span in encoded_spans:
+            self._in_flight.acquire()
+            try:
+                future = self._dispatch.future(encoded_span,
+                                               timeout=self._timeout_seconds)
+            except Exception:
+                self._in_flight.release()
+                raise
+            future.add_done_callback(partial(self._on_dispatched,
+                                             encoded_span))
+            self._pending.add(future)
+
+    def _dispatch_spilled(self, encoded_spans):
+        """Send spilled spans one call at a time, False once the agent is
+        unavailable again."""
+        for encoded_span in encoded_spans:
+            try:
+                self._dispatch(encoded_span, timeout=self._timeout_seconds)
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.UNAVAILABLE:
+                    self._unavailable = True
+                    return False
+                logger.error(f"Dispatch of a spilled span failed with "
+                             f"{e.code()}")
+        return True
+
+    def wait_for_sent(self, timeout=None):
+        deadline = deadline_after(timeout)
+        if not self._pending.wait(timeout):
+            return False
+        if self._spill is None or not len(self._spill):
+            return True
+        if self._unavailable and not self._await_agent():
+            return False
+        return self._spill.replay(self._dispatch_spilled,
+                                  deadline=deadline)
+
+    def close_transport(self):
+        self._channel.close()
+        if self._spill is not None:
+            self._spill.close()
+
+    def _on_dispatched(self, encoded_span, future):
+        self._in_flight.release()
+        try:
+            future.result()
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNAVAILABLE:
+                self._unavailable = True
+                if self._spill is not None:
+                    self._spill.append(encoded_span)
+        HaystackAgentRecorder.process_response(future)
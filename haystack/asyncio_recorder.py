@@ -0,0 +1,336 @@
+import asyncio
+import concurrent.futures
+import logging
+from . import fork
+from .recorder import SpanRecorder
+from .http_recorder import SyncHttpRecorder
+from .compression import get_compressor
+from .util import proto_batch_payload, json_batch_payload
+from .constants import (
+    DEFAULT_HTTP_TIMEOUT,
+    DEFAULT_COMPRESSION_MIN_BYTES,
+    DEFAULT_MAX_QUEUE_SIZE,
+    DEFAULT_MAX_BATCH_BYTES,
+    DEFAULT_LINGER_MS,
+    DROP_NEWEST,
+    DROP_OLDEST,
+)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class _SpanQueue(asyncio.Queue):
+    """asyncio.Queue of span snapshots and the asyncio.Event flush markers
+    queued behind them."""
+
+    def evict_oldest_span(self):
+        """Remove the oldest queued span, skipping flush markers which are
+        awaited by aflush().
+
+        :return: False if only flush markers are queued.
+        """
+        for index, item in enumerate(self._queue):
+            if not isinstance(item, asyncio.Event):
+                del self._queue[index]
+                return True
+        return False
+
+
+class AsyncioHttpRecorder(SpanRecorder):
+    """Http span recorder for asyncio applications.
+
+    record_span enqueues a snapshot of the finished span onto an
+    asyncio.Queue without blocking the event loop. A background task started
+    on the first recorded span waits `linger_ms`, then encodes the queued
+    spans and posts them in batches of up to `max_batch_bytes` through a
+    single aiohttp session, reusing keep-alive connections. Spans finished
+    on other threads are handed over to the event loop.
+
+    A HaystackTracer pairs this recorder with ContextVarsScopeManager unless
+    told otherwise, so the active span follows coroutines.
+
+    On the event loop, use `await aflush()` / `await aclose()`; the blocking
+    flush() and close() are meant for other threads and for shutdown after
+    the event loop has stopped, in which case queued spans are posted from a
+    temporary event loop.
+
+    Requires aiohttp: `pip install haystack-client[asyncio]`
+    """
+
+    def __init__(self,
+                 collector_url="http://haystack-collector:8080/span",
+                 headers=None,
+                 timeout_seconds=DEFAULT_HTTP_TIMEOUT,
+                 use_json_payload=False,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+                 max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+                 linger_ms=DEFAULT_LINGER_MS,
+                 drop_policy=DROP_NEWEST,
+                 compression=None,
+                 compression_level=None,
+                 compression_min_bytes=DEFAULT_COMPRESSION_MIN_BYTES):
+        """
+        :param collector_url: the haystack collector endpoint accepting
+        batched payloads
+        :param timeout_seconds: timeout limit of the requests
+        :param use_json_payload: set True to enable json payload format.
+        :param max_queue_size: maximum number of spans waiting to be sent
+        :param max_batch_bytes: upper bound of a single posted payload
+        :param linger_ms: time spans are collected before being sent
+        :param drop_policy: DROP_NEWEST or DROP_OLDEST when the queue is full
+        :param compression: GZIP, DEFLATE or ZSTD to compress each batch,
+        None to send them uncompressed. Batches are compressed on the event
+        loop, so prefer a low compression level for large batches.
+        :param compression_level: level of the compression codec, None for
+        its default
+        :param compression_min_bytes: batches smaller than this are sent
+        uncompressed
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncioHttpRecorder requires aiohttp, install "
+                              "it with `pip install haystack-client[asyncio]`")
+        if drop_policy not in (DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"Unknown drop policy {drop_policy}")
+
+        self._collector_url = collector_url
+        self._headers = dict(headers or {})
+        self._headers["Content-Type"] = "application/json" \
+            if use_json_payload else "application/octet-stream"
+        self._timeout_seconds = timeout_seconds
+        self._use_json_payload = use_json_payload
+        self._max_queue_size = max_queue_size
+        self._max_batch_bytes = max_batch_bytes
+        self._linger_seconds = linger_ms / 1000.0
+        self._drop_policy = drop_policy
+        self._compress = None if compression is None \
+            else get_compressor(compression, compression_level)
+        self._compression_headers = {"Content-Encoding": compression}
+        self._compression_min_bytes = compression_min_bytes
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self._flush_requested = None
+        self._lingering = None
+        self._closed = False
+        self.dropped_spans = 0
+        fork.register(self)
+
+    def _reinit_after_fork(self):
+        # started again on the child's event loop by the next span
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    def default_scope_manager(self):
+        from opentracing.scope_managers.contextvars import \
+            ContextVarsScopeManager
+        return ContextVarsScopeManager()
+
+    def record_span(self, span):
+        if self._closed:
+            return
+        snapshot = span.snapshot()
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if self._loop is None or self._loop.is_closed():
+            if running_loop is None:
+                logger.error("AsyncioHttpRecorder needs a running event loop, "
+                             "dropped span")
+                self.dropped_spans += 1
+                return
+            self._start(running_loop)
+
+        if running_loop is self._loop:
+            self._enqueue(snapshot)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, snapshot)
+
+    def _start(self, loop):
+        self._loop = loop
+        self._queue = _SpanQueue(maxsize=self._max_queue_size)
+        self._flush_requested = asyncio.Event()
+        self._lingering = None
+        self._task = loop.create_task(self._run())
+
+    def _enqueue(self, snapshot):
+        try:
+            self._queue.put_nowait(snapshot)
+            return
+        except asyncio.QueueFull:
+            self.dropped_spans += 1
+        if self._drop_policy == DROP_OLDEST and \
+                self._queue.evict_oldest_span():
+            self._queue.put_nowait(snapshot)
+
+    def _encode(self, span):
+        try:
+            if self._use_json_payload:
+                return SyncHttpRecorder.get_json_payload(span)
+            return SyncHttpRecorder.get_binary_payload(span)
+        except Exception:
+            logger.exception("failed to convert span")
+            return None
+
+    async def _post(self, session, encoded_spans):
+        payload = json_batch_payload(encoded_spans) \
+            if self._use_json_payload else proto_batch_payload(encoded_spans)
+        headers = None
+        if self._compress is not None and \
+                len(payload) >= self._compression_min_bytes:
+            payload = self._compress(payload)
+            headers = self._compression_headers
+        try:
+            async with session.post(self._collector_url,
+                                    data=payload,
+                                    headers=headers) as response:
+                if response.status in range(200, 203):
+                    logger.debug("successfully submitted the spans to http "
+                                 "collector")
+                else:
+                    logger.error(f"Failed to submit spans to the http "
+                                 f"collector. Haystack Response: {response}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Failed to submit spans to the http collector due "
+                         f"to {e}")
+
+    def _client_session(self):
+        return aiohttp.ClientSession(
+            headers=self._headers,
+            timeout=aiohttp.ClientTimeout(total=self._timeout_seconds))
+
+    def _take_batch(self, first_encoded):
+        """Collect queued spans behind `first_encoded` into one batch.
+
+        :return: the batch, the encoded span which did not fit into it and
+        the flush marker the batch stopped at, if any.
+        """
+        batch = [first_encoded]
+        batch_bytes = len(first_encoded)
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if isinstance(item, asyncio.Event):
+                return batch, None, item
+            encoded = self._encode(item)
+            if encoded is None:
+                continue
+            if batch_bytes + len(encoded) > self._max_batch_bytes:
+                return batch, encoded, None
+            batch.append(encoded)
+            batch_bytes += len(encoded)
+        return batch, None, None
+
+    async def _run(self):
+        async with self._client_session() as session:
+            overflow = None
+            while True:
+                if overflow is None:
+                    item = await self._queue.get()
+                    if isinstance(item, asyncio.Event):
+                        item.set()
+                        continue
+                    # kept aside so a span taken off the queue is not lost
+                    # if the event loop stops while lingering
+                    self._lingering = item
+                    await self._linger()
+                    self._lingering = None
+                    overflow = self._encode(item)
+                    if overflow is None:
+                        continue
+
+                batch, overflow, marker = self._take_batch(overflow)
+                await self._post(session, batch)
+                if marker is not None:
+                    marker.set()
+
+    async def _linger(self):
+        try:
+            await asyncio.wait_for(self._flush_requested.wait(),
+                                   self._linger_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._flush_requested.clear()
+
+    async def _post_queued(self):
+        async with self._client_session() as session:
+            while self._lingering is not None or not self._queue.empty():
+                if self._lingering is not None:
+                    item, self._lingering = self._lingering, None
+                else:
+                    item = self._queue.get_nowait()
+                if isinstance(item, asyncio.Event):
+                    item.set()
+                    continue
+                overflow = self._encode(item)
+                while overflow is not None:
+                    batch, overflow, marker = self._take_batch(overflow)
+                    await self._post(session, batch)
+                    if marker is not None:
+                        marker.set()
+
+    async def aflush(self):
+        """Wait until every span recorded so far has been posted."""
+        if self._task is None or self._task.done():
+            return
+        marker = asyncio.Event()
+        await self._queue.put(marker)
+        self._flush_requested.set()
+        await marker.wait()
+
+    async def aclose(self):
+        """Post the recorded spans and stop the background task."""
+        self._closed = True
+        if self._task is None or self._task.done():
+            return
+        await self.aflush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def flush(self, timeout=None):
+        return self._block_on(self.aflush, timeout)
+
+    def close(self, timeout=None):
+        self._closed = True
+        return self._block_on(self.aclose, timeout)
+
+    def _block_on(self, coroutine_function, timeout):
+        if self._loop is None:
+            return True
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if self._loop.is_running():
+            if running_loop is self._loop:
+                logger.warning("Blocking flush/close called on the event "
+                               "loop, use `await aflush()`/`aclose()`")
+                return False
+            future = asyncio.run_coroutine_threadsafe(coroutine_function(),
+                                                      self._loop)
+            try:
+                future.result(timeout)
+                return True
+            except concurrent.futures.TimeoutError:
+                return False
+
+        if running_loop is not None:
+            logger.warning("Cannot post spans queued on a stopped event loop "
+                           "from another running event loop")
+            return False
+        # the event loop stopped with spans still queued
+        try:
+            asyncio.run(asyncio.wait_for(self._post_queued(), timeout))
+            return True
+        except asyncio.TimeoutError:
+            return False
@@ -0,0 +1,166 @@
+from opentracing import SpanContextCorruptedException
+from .propagator import (
+    Propagator,
+    find_keys,
+    hex_id,
+    parse_hex_id,
+    uuid_trace_id,
+)
+from .span import SpanContext
+from .constants import (
+    B3,
+    B3_TRACE_ID,
+    B3_SPAN_ID,
+    B3_PARENT_SPAN_ID,
+    B3_SAMPLED,
+    B3_FLAGS,
+)
+
+
+def _parse_sampled(value):
+    """Sampling state of B3 headers: 1 or d (debug) to record, 0 to drop."""
+    value = value.strip().lower()
+    if value in ("1", "d", "true"):
+        return True
+    if value in ("0", "false"):
+        return False
+    return None
+
+
+def _deny_only_context(sampled):
+    """A context carrying only a `0` sampling decision sent without ids,
+    None for any other decision, which has no trace to continue."""
+    if sampled is not None and _parse_sampled(sampled) is False:
+        return SpanContext(sampled=False)
+    return None
+
+
+class B3Propagator(Propagator):
+    """A propagator for Zipkin B3 headers, either the single `b3` header or
+    the multiple `X-B3-*` headers, as sent by Envoy, Istio and Zipkin
+    instrumented services.
+
+    Both forms are extracted, the single header taking precedence as the B3
+    specification asks. 64 and 128 bit trace ids are formatted like uuids in
+    the extracted context, so a trace started by a Haystack service keeps its
+    id. B3 span ids only have 64 bits: the low 16 hex digits of a uuid span
+    id are sent, so list TextPropagator first in a CompositePropagator for
+    Haystack services to link their spans with the full ids.
+
+    A deny-only `b3: 0` or `X-B3-Sampled: 0` header without ids is
+    extracted as a context holding only `sampled=False`, so the trace is
+    not recorded and the decision is passed on by inject. Like
+    W3CPropagator, the upstream sampling decision is honored unless
+    `ignore_sampled_flag` is set.
+    """
+
+    _lc_keys = (B3, B3_TRACE_ID.lower(), B3_SPAN_ID.lower(),
+                B3_PARENT_SPAN_ID.lower(), B3_SAMPLED.lower(),
+                B3_FLAGS.lower())
+
+    def __init__(self, single_header=False, ignore_sampled_flag=False):
+        """
+        :param single_header: inject the single `b3` header instead of the
+        multiple `X-B3-*` headers
+        :param ignore_sampled_flag: extract contexts without a sampling
+        decision, so the tracer's sampler decides instead of the upstream
+        sampled and debug flags
+        """
+        self._single_header = single_header
+        self._ignore_sampled_flag = ignore_sampled_flag
+
+    def inject(self, span_context, carrier):
+        trace_id = hex_id(span_context.trace_id, 32)
+        span_id = hex_id(span_context.span_id, 16)
+        if span_context.trace_id is None and span_context.sampled is False:
+            # a deny-only decision, as extracted from `b3: 0`
+            if self._single_header:
+                carrier[B3] = "0"
+            else:
+                carrier[B3_SAMPLED] = "0"
+            return
+        if trace_id is None or span_id is None:
+            # ids from custom generators that don't fit the headers
+            return
+        parent_id = None if span_context.parent_id is None \
+            else hex_id(span_context.parent_id, 16)
+        sampled = None if span_context.sampled is None \
+            else "1" if span_context.sampled else "0"
+
+        if self._single_header:
+            fields = [trace_id, span_id]
+            if sampled is not None:
+                fields.append(sampled)
+                if parent_id is not None:
+                    fields.append(parent_id)
+            carrier[B3] = "-".join(fields)
+            return
+        carrier[B3_TRACE_ID] = trace_id
+        carrier[B3_SPAN_ID] = span_id
+        if parent_id is not None:
+            carrier[B3_PARENT_SPAN_ID] = parent_id
+        if sampled is not None:
+            carrier[B3_SAMPLED] = sampled
+
+    def extract(self, carrier):
+        single, trace_id, span_id, parent_id, sampled, flags = \
+            find_keys(carrier, self._lc_keys)
+        if single is not None:
+            span_context = self._extract_single(single)
+        else:
+            span_context = self._extract_multi(trace_id, span_id, parent_id,
+                                               sampled, flags)
+        if span_context is not None and self._ignore_sampled_flag:
+            if span_context.trace_id is None:
+                return None
+            span_context.sampled = None
+        return span_context
+
+    @staticmethod
+    def _extract_multi(trace_id, span_id, parent_id, sampled, flags):
+        if trace_id is None and span_id is None:
+            return _deny_only_context(sampled)
+        if trace_id is None or span_id is None:
+            raise SpanContextCorruptedException(
+                "Both X-B3-TraceId and X-B3-SpanId are required")
+
+        trace_id = parse_hex_id(trace_id, (16, 32))
+        span_id = parse_hex_id(span_id, (16,))
+        if parent_id is not None:
+            parent_id = parse_hex_id(parent_id, (16,))
+            if parent_id is None:
+                raise SpanContextCorruptedException(
+                    "Invalid X-B3-ParentSpanId header")
+        if trace_id is None or span_id is None:
+            raise SpanContextCorruptedException(
+                "Invalid X-B3-TraceId or X-B3-SpanId header")
+        if flags is not None and flags.strip() == "1":
+            sampled = True
+        elif sampled is not None:
+            sampled = _parse_sampled(sampled)
+        return SpanContext(trace_id=uuid_trace_id(trace_id),
+                           span_id=span_id,
+                           parent_id=parent_id,
+                           sampled=sampled)
+
+    @staticmethod
+    def _extract_single(header):
+        fields = header.split("-")
+        if len(fields) == 1:
+            return _deny_only_context(header)
+        if len(fields) > 4:
+            raise SpanContextCorruptedException(
+                f"Invalid b3 header {header!r}")
+        trace_id = parse_hex_id(fields[0], (16, 32))
+        span_id = parse_hex_id(fields[1], (16,))
+        sampled = _parse_sampled(fields[2]) if len(fields) > 2 else None
+        parent_id = parse_hex_id(fields[3], (16,)) if len(fields) > 3 else None
+        if trace_id is None or span_id is None \
+                or len(fields) > 2 and sampled is None \
+                or len(fields) > 3 and parent_id is None:
+            raise SpanContextCorruptedException(
+                f"Invalid b3 header {header!r}")
+        return SpanContext(trace_id=uuid_trace_id(trace_id),
+                           span_id=span_id,
+                           parent_id=parent_id,
+                           sampled=sampled)
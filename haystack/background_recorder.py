@@ -0,0 +1,384 @@
+import logging
+import queue
+import threading
+import time
+from abc import abstractmethod
+from . import fork
+from .recorder import SpanRecorder
+from .constants import (
+    DEFAULT_MAX_QUEUE_SIZE,
+    DEFAULT_MAX_BATCH_BYTES,
+    DEFAULT_LINGER_MS,
+    DROP_NEWEST,
+    DROP_OLDEST,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def deadline_after(timeout):
+    """Monotonic deadline `timeout` seconds from now, None for no timeout."""
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def time_left(deadline):
+    """Seconds remaining until `deadline`, None for no deadline."""
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+class FlushMarker(object):
+    """Queued behind the spans recorded before a flush or close. The
+    background thread sets `done` once those spans have been handled and
+    exits if `stop` is set."""
+
+    __slots__ = ("done", "stop")
+
+    def __init__(self, stop=False):
+        self.done = threading.Event()
+        self.stop = stop
+
+
+class BoundedSpanQueue(object):
+    """A bounded FIFO of finished spans which never blocks the producer.
+
+    When the queue is full either the incoming span (DROP_NEWEST) or the
+    oldest queued span (DROP_OLDEST) is discarded and counted in `dropped`.
+    Flush markers are never discarded.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_QUEUE_SIZE,
+                 drop_policy=DROP_NEWEST):
+        if drop_policy not in (DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"Unknown drop policy {drop_policy}")
+        self._queue = queue.Queue(maxsize=max_size)
+        self._drop_policy = drop_policy
+        self._reported_drops = 0
+        self.dropped = 0
+        fork.register(self)
+
+    def _reinit_after_fork(self):
+        # spans queued by the parent are reported by the parent
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._reported_drops = 0
+        self.dropped = 0
+
+    def put(self, item):
+        """Enqueue `item` without blocking.
+
+        :return: False if `item` itself was dropped.
+        """
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        if self._drop_policy == DROP_OLDEST and self._evict_oldest_span():
+            self.dropped += 1
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                pass
+
+        self.dropped += 1
+        return False
+
+    def _evict_oldest_span(self):
+        """Remove the oldest queued span, skipping flush markers whose
+        callers wait for the flusher to reach them.
+
+        :return: False if only flush markers are queued.
+        """
+        with self._queue.mutex:
+            items = self._queue.queue
+            for index, item in enumerate(items):
+                if not isinstance(item, FlushMarker):
+                    del items[index]
+                    self._queue.not_full.notify()
+                    return True
+        return False
+
+    def put_blocking(self, item, timeout=None):
+        """Enqueue `item`, waiting up to `timeout` for a free slot.
+
+        Used for flush markers, which must not be dropped.
+
+        :return: False if the queue stayed full.
+        """
+        try:
+            self._queue.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def get(self, timeout=None):
+        """Dequeue the oldest item, raising queue.Empty after `timeout`."""
+        return self._queue.get(timeout=timeout)
+
+    def report_drops(self):
+        """Log the number of spans dropped since the previous report."""
+        dropped = self.dropped
+        if dropped != self._reported_drops:
+            logger.warning(f"Dropped {dropped - self._reported_drops} spans "
+                           f"due to a full recorder queue")
+            self._reported_drops = dropped
+
+    def __len__(self):
+        return self._queue.qsize()
+
+
+class BatchingSpanRecorder(SpanRecorder):
+    """Base recorder which enqueues finished spans and reports them in
+    batches from a single background flusher thread.
+
+    A batch is sent once it reaches `max_batch_bytes` or once `linger_ms` has
+    elapsed since its first span was dequeued, whichever comes first. Spans
+    are encoded on the flusher thread, so `record_span` only enqueues.
+
+    Subclasses provide `encode_span` and `send_batch`, both of which receive
+    :class:`SpanSnapshot` records rather than live spans.
+    """
+
+    def __init__(self,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+                 max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+                 linger_ms=DEFAULT_LINGER_MS,
+                 drop_policy=DROP_NEWEST):
+        """
+        :param max_queue_size: maximum number of finished spans waiting to be
+        encoded and sent.
+        :param max_batch_bytes: upper bound of a batch of encoded spans. A
+        single span larger than this is sent on its own.
+        :param linger_ms: maximum time a partial batch waits for more spans.
+        :param drop_policy: DROP_NEWEST or DROP_OLDEST, applied when the queue
+        is full so that record_span never blocks.
+        """
+        self._queue = BoundedSpanQueue(max_queue_size, drop_policy)
+        self._max_batch_bytes = max_batch_bytes
+        self._linger_seconds = linger_ms / 1000.0
+        self._closed = False
+        self._start_flusher()
+        fork.register(self)
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._run,
+                                         name="haystack-flusher",
+                                         daemon=True)
+        self._flusher.start()
+
+    def _reinit_after_fork(self):
+        # threads other than the forking one do not exist in the child
+        if not self._closed:
+            self._start_flusher()
+
+    @property
+    def dropped_spans(self):
+        """Approximate number of spans discarded due to a full queue."""
+        return self._queue.dropped
+
+    @abstractmethod
+    def encode_span(self, span):
+        """Translate a finished span to its bytes representation.
+
+        Called on the flusher thread.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def send_batch(self, encoded_spans):
+        """Report a list of spans produced by `encode_span`.
+
+        Called on the flusher thread.
+        """
+        raise NotImplementedError()
+
+    def wait_for_sent(self, timeout=None):
+        """Wait for batches handed over by `send_batch` which are still being
+        sent asynchronously. Called on flush once the flusher caught up.
+
+        :return: False if they were not sent within `timeout`.
+        """
+        return True
+
+    def close_transport(self):
+        """Release the transport once the flusher thread has stopped."""
+        pass
+
+    def record_span(self, span):
+        if not self._closed:
+            self._queue.put(span.snapshot())
+
+    def record_encoded_span(self, encoded_span):
+        """Enqueue a span already translated like `encode_span` does, e.g.
+        by another process."""
+        if not self._closed:
+            self._queue.put(encoded_span)
+
+    def flush(self, timeout=None):
+        if self._closed:
+            # close() flushed and stopped the flusher
+            return True
+        return self._flush(FlushMarker(), deadline_after(timeout))
+
+    def close(self, timeout=None):
+        if self._closed:
+            return True
+        self._closed = True
+        deadline = deadline_after(timeout)
+        flushed = self._flush(FlushMarker(stop=True), deadline)
+        self._flusher.join(time_left(deadline))
+        self.close_transport()
+        return flushed
+
+    def _flush(self, marker, deadline):
+        if not self._queue.put_blocking(marker, time_left(deadline)):
+            return False
+        if not marker.done.wait(time_left(deadline)):
+            return False
+        return self.wait_for_sent(time_left(deadline))
+
+    def _encode(self, span):
+        if isinstance(span, bytes):
+            return span
+        try:
+            return self.encode_span(span)
+        except Exception:
+            logger.exception("failed to convert span")
+            return None
+
+    def _send(self, encoded_spans):
+        try:
+            self.send_batch(encoded_spans)
+        except Exception:
+            logger.exception(f"Failed to send a batch of "
+                             f"{len(encoded_spans)} spans")
+        self._queue.report_drops()
+
+    def _run(self):
+        overflow = None
+        while True:
+            if overflow is None:
+                item = self._queue.get()
+                if isinstance(item, FlushMarker):
+                    item.done.set()
+                    if item.stop:
+                        return
+                    continue
+                overflow = self._encode(item)
+                if overflow is None:
+                    continue
+
+            batch = [overflow]
+            batch_bytes = len(overflow)
+            overflow = None
+            marker = None
+            deadline = time.monotonic() + self._linger_seconds
+
+            while batch_bytes < self._max_batch_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if isinstance(item, FlushMarker):
+                    marker = item
+                    break
+                encoded = self._encode(item)
+                if encoded is None:
+                    continue
+                if batch_bytes + len(encoded) > self._max_batch_bytes:
+                    overflow = encoded
+                    break
+                batch.append(encoded)
+                batch_bytes += len(encoded)
+
+            self._send(batch)
+            if marker is not None:
+                marker.done.set()
+                if marker.stop:
+                    return
+
+
+class DeferredRecorder(SpanRecorder):
+    """Recorder which moves span translation and transport off the thread
+    calling Span.finish().
+
+    record_span only captures an immutable :class:`SpanSnapshot` and enqueues
+    it, so the cost of finishing a span does not depend on its tag or log
+    count. A background worker passes each snapshot on to the wrapped
+    recorder, e.g. a SyncHttpRecorder or HaystackAgentRecorder.
+    """
+
+    def __init__(self,
+                 recorder,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+                 drop_policy=DROP_NEWEST):
+        """
+        :param recorder: the recorder which translates and reports spans on
+        the background worker.
+        :param max_queue_size: maximum number of snapshots waiting to be
+        recorded.
+        :param drop_policy: DROP_NEWEST or DROP_OLDEST when the queue is full
+        """
+        self._recorder = recorder
+        self._queue = BoundedSpanQueue(max_queue_size, drop_policy)
+        self._closed = False
+        self._start_worker()
+        fork.register(self)
+
+    def _start_worker(self):
+        self._worker = threading.Thread(target=self._run,
+                                        name="haystack-recorder",
+                                        daemon=True)
+        self._worker.start()
+
+    def _reinit_after_fork(self):
+        if not self._closed:
+            self._start_worker()
+
+    @property
+    def dropped_spans(self):
+        """Approximate number of spans discarded due to a full queue."""
+        return self._queue.dropped
+
+    def record_span(self, span):
+        if not self._closed:
+            self._queue.put(span.snapshot())
+
+    def flush(self, timeout=None):
+        if self._closed:
+            # close() flushed and stopped the worker
+            return True
+        deadline = deadline_after(timeout)
+        return self._flush(FlushMarker(), deadline) and \
+            self._recorder.flush(time_left(deadline))
+
+    def close(self, timeout=None):
+        if self._closed:
+            return True
+        self._closed = True
+        deadline = deadline_after(timeout)
+        flushed = self._flush(FlushMarker(stop=True), deadline)
+        self._worker.join(time_left(deadline))
+        return self._recorder.close(time_left(deadline)) and flushed
+
+    def _flush(self, marker, deadline):
+        return self._queue.put_blocking(marker, time_left(deadline)) and \
+            marker.done.wait(time_left(deadline))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if isinstance(item, FlushMarker):
+                item.done.set()
+                if item.stop:
+                    return
+                continue
+            try:
+                self._recorder.record_span(item)
+            except Exception:
+                logger.exception("Failed to record span")
+            self._queue.report_drops()
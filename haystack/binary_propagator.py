@@ -1,12 +1,196 @@
+from opentracing import InvalidCarrierException, SpanContextCorruptedException
 from .propagator import Propagator
+from .span import SpanContext
+
+# first byte of every encoded span context
+VERSION = 1
+
+# bits of the flags byte following the version
+_SAMPLED_KNOWN = 0x01
+_SAMPLED = 0x02
+_HAS_PARENT = 0x04
+# set if the trace, span or parent id is a uuid stored as 16 raw bytes,
+# otherwise the id is stored as a varint length and utf-8 string
+_RAW_TRACE_ID = 0x08
+_RAW_SPAN_ID = 0x10
+_RAW_PARENT_ID = 0x20
+# set if only the sampling decision follows, without ids or baggage
+_NO_TRACE = 0x40
+_KNOWN_FLAGS = 0x7f
+
+# longest varint accepted, lengths and counts fit in 32 bits
+_MAX_VARINT_BYTES = 5
+
+
+def _uuid_bytes(value):
+    """The 16 bytes of a lowercase uuid string, None for any other id."""
+    # uppercase ids would come back lowercase, keep them as strings
+    if len(value) != 36 or not \
+            value[8] == value[13] == value[18] == value[23] == "-" \
+            or value != value.lower():
+        return None
+    try:
+        raw = bytes.fromhex(value.replace("-", ""))
+    except ValueError:
+        return None
+    return raw if len(raw) == 16 else None
+
+
+def _uuid_string(raw):
+    hex_id = raw.hex()
+    return f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}-" \
+        f"{hex_id[16:20]}-{hex_id[20:]}"
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_string(out, value):
+    encoded = value.encode("utf-8")
+    if len(encoded) < 0x80:
+        out.append(len(encoded))
+    else:
+        _write_varint(out, len(encoded))
+    out += encoded
+
+
+def _write_id(out, value, raw_flag):
+    """Append an id, returning `raw_flag` if it was stored as raw bytes."""
+    value = str(value)
+    raw = _uuid_bytes(value)
+    if raw is None:
+        _write_string(out, value)
+        return 0
+    out += raw
+    return raw_flag
+
+
+def _read_varint(data, position):
+    """Decode the varint at `position`, returning it and the position after
+    it."""
+    value = 0
+    for shift in range(0, 7 * _MAX_VARINT_BYTES, 7):
+        if position >= len(data):
+            raise SpanContextCorruptedException("Truncated span context")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+    raise SpanContextCorruptedException("Malformed length in span context")
+
+
+def _read_string(data, position):
+    if position < len(data) and data[position] < 0x80:
+        length = data[position]
+        position += 1
+    else:
+        length, position = _read_varint(data, position)
+    end = position + length
+    if end > len(data):
+        raise SpanContextCorruptedException("Truncated span context")
+    try:
+        return data[position:end].decode("utf-8"), end
+    except UnicodeDecodeError:
+        raise SpanContextCorruptedException(
+            "Invalid utf-8 string in span context")
+
+
+def _read_id(data, position, raw):
+    if not raw:
+        return _read_string(data, position)
+    end = position + 16
+    if end > len(data):
+        raise SpanContextCorruptedException("Truncated span context")
+    return _uuid_string(data[position:end]), end
 
 
-# TODO build me for IPC purposes (use TextPropagator instead for now)
 class BinaryPropagator(Propagator):
-    """A propagator for Format.BINARY"""
+    """A propagator for Format.BINARY
+
+    The span context is appended to a bytearray carrier in a compact layout:
+    a version byte, a flags byte holding the sampling decision, the trace,
+    span and optional parent id, and the baggage as a varint count of varint
+    length prefixed utf-8 keys and values. Uuid ids, as generated by the
+    default id generator, are stored as their 16 raw bytes. A context
+    without a trace id, which only carries a decision not to sample, is
+    written as the version and flags bytes alone.
+    """
 
     def inject(self, span_context, carrier):
-        pass
+        if not isinstance(carrier, bytearray):
+            raise InvalidCarrierException("Carrier must be a bytearray")
+        if span_context.trace_id is None:
+            # a decision not to sample without a trace, e.g. from b3: 0
+            if span_context.sampled is False:
+                carrier.append(VERSION)
+                carrier.append(_NO_TRACE | _SAMPLED_KNOWN)
+            return
+        out = bytearray()
+        flags = 0
+        if span_context.sampled is not None:
+            flags |= _SAMPLED_KNOWN
+            if span_context.sampled:
+                flags |= _SAMPLED
+        flags |= _write_id(out, span_context.trace_id, _RAW_TRACE_ID)
+        flags |= _write_id(out, span_context.span_id, _RAW_SPAN_ID)
+        if span_context.parent_id is not None:
+            flags |= _HAS_PARENT
+            flags |= _write_id(out, span_context.parent_id, _RAW_PARENT_ID)
+        baggage = span_context.baggage
+        _write_varint(out, len(baggage))
+        for key, value in baggage.items():
+            _write_string(out, key)
+            _write_string(out, str(value))
+        carrier.append(VERSION)
+        carrier.append(flags)
+        carrier += out
 
     def extract(self, carrier):
-        pass
+        if not isinstance(carrier, (bytes, bytearray, memoryview)):
+            raise InvalidCarrierException("Carrier must be bytes-like")
+        if not carrier:
+            return None
+        data = carrier if type(carrier) is bytes else bytes(carrier)
+        if len(data) < 2:
+            raise SpanContextCorruptedException("Truncated span context")
+        version, flags = data[0], data[1]
+        if version != VERSION:
+            raise SpanContextCorruptedException(
+                f"Unsupported span context version {version}")
+        if flags & ~_KNOWN_FLAGS \
+                or flags & _SAMPLED and not flags & _SAMPLED_KNOWN \
+                or flags & _RAW_PARENT_ID and not flags & _HAS_PARENT:
+            raise SpanContextCorruptedException(
+                f"Invalid span context flags {flags:#x}")
+        if flags & _NO_TRACE:
+            if flags != _NO_TRACE | _SAMPLED_KNOWN or len(data) != 2:
+                raise SpanContextCorruptedException(
+                    "Invalid span context without a trace")
+            return SpanContext(sampled=False)
+
+        trace_id, position = _read_id(data, 2, flags & _RAW_TRACE_ID)
+        span_id, position = _read_id(data, position, flags & _RAW_SPAN_ID)
+        parent_id = None
+        if flags & _HAS_PARENT:
+            parent_id, position = _read_id(data, position,
+                                           flags & _RAW_PARENT_ID)
+        count, position = _read_varint(data, position)
+        baggage = {}
+        for _ in range(count):
+            key, position = _read_string(data, position)
+            baggage[key], position = _read_string(data, position)
+        if position != len(data):
+            raise SpanContextCorruptedException(
+                "Trailing bytes after span context")
+
+        sampled = bool(flags & _SAMPLED) if flags & _SAMPLED_KNOWN else None
+        return SpanContext(trace_id=trace_id,
+                           span_id=span_id,
+                           parent_id=parent_id,
+                           baggage=baggage,
+                           sampled=sampled)
@@ -0,0 +1,44 @@
+"""
+Span timestamps in integer nanoseconds.
+
+Start times are taken from a per-process wall clock anchor plus the offset of
+the monotonic clock since the anchor, so they don't step backwards when NTP
+steps the system clock, and durations are measured on the monotonic clock
+alone. The anchor is renewed every CLOCK_ANCHOR_INTERVAL_NS, so timestamps
+follow corrections of the wall clock without affecting durations.
+"""
+import time
+from .constants import (
+    CLOCK_ANCHOR_INTERVAL_NS,
+    SECONDS_TO_MICRO,
+    MICROS_TO_NANOS,
+)
+
+monotonic_ns = time.perf_counter_ns
+
+# wall clock and monotonic clock readings taken together, replaced as a
+# whole so that threads never see a torn anchor
+_anchor = (time.time_ns(), monotonic_ns())
+
+
+def wall_ns(monotonic):
+    """The wall clock time in nanoseconds of a `monotonic_ns()` reading."""
+    global _anchor
+    anchor_wall, anchor_monotonic = _anchor
+    if monotonic - anchor_monotonic > CLOCK_ANCHOR_INTERVAL_NS:
+        _anchor = anchor_wall, anchor_monotonic = \
+            time.time_ns(), monotonic_ns()
+    return anchor_wall + monotonic - anchor_monotonic
+
+
+def now_ns():
+    """The current wall clock time in nanoseconds."""
+    return wall_ns(monotonic_ns())
+
+
+def seconds_to_ns(seconds):
+    """Convert a unix timestamp or duration in seconds, as passed to the
+    opentracing API, to integer nanoseconds. It is rounded to the
+    microsecond, as the float holds a current timestamp to about a quarter
+    of a microsecond."""
+    return round(seconds * SECONDS_TO_MICRO) * MICROS_TO_NANOS
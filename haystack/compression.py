@@ -0,0 +1,53 @@
+import threading
+import zlib
+from .constants import GZIP, DEFLATE, ZSTD
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# zlib wbits selecting a gzip header and trailer with a 32K window
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def get_compressor(encoding, level=None):
+    """Return a function compressing a payload with `encoding`, the value
+    sent in the Content-Encoding header.
+
+    :param encoding: GZIP, DEFLATE or ZSTD. ZSTD requires the zstandard
+    package: `pip install haystack-client[zstd]`
+    :param level: compression level, None for the codec's default. Lower
+    levels trade bytes on the wire for less CPU.
+    """
+    if encoding == GZIP:
+        gzip_level = 6 if level is None else level
+        return lambda payload: _gzip_compress(payload, gzip_level)
+    if encoding == DEFLATE:
+        # http deflate is the zlib format
+        zlib_level = -1 if level is None else level
+        return lambda payload: zlib.compress(payload, zlib_level)
+    if encoding == ZSTD:
+        if zstandard is None:
+            raise ImportError("zstd compression requires zstandard, install "
+                              "it with `pip install haystack-client[zstd]`")
+        return _ZstdCompressor(3 if level is None else level)
+    raise ValueError(f"Unknown compression {encoding}")
+
+
+def _gzip_compress(payload, level):
+    # zlib writes gzip headers with a zero mtime, keeping the output
+    # reproducible on python 3.7 where gzip.compress has no mtime argument
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+    return compressor.compress(payload) + compressor.flush()
+
+
+class _ZstdCompressor(threading.local):
+    """ZstdCompressor contexts must not be shared between threads, so each
+    thread compresses with its own."""
+
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def __call__(self, payload):
+        return self._compressor.compress(payload)
@@ -10,8 +10,131 @@ PARENT_SPAN_ID = "Parent-ID"
 # Prefix of the HTTP header or Key used to encode Baggage items
 BAGGAGE_PREFIX = "Baggage-"
 
+# Name of the HTTP header or Key used to encode the sampling decision
+SAMPLED = "Sampled"
+
+# Names of the W3C trace context headers
+TRACEPARENT = "traceparent"
+TRACESTATE = "tracestate"
+
+# Name of the single B3 header
+B3 = "b3"
+
+# Names of the multiple B3 headers
+B3_TRACE_ID = "X-B3-TraceId"
+B3_SPAN_ID = "X-B3-SpanId"
+B3_PARENT_SPAN_ID = "X-B3-ParentSpanId"
+B3_SAMPLED = "X-B3-Sampled"
+B3_FLAGS = "X-B3-Flags"
+
 # The number of microseconds in one second
 SECONDS_TO_MICRO = 1000000
 
 # The default HTTP recorder timeout value
 DEFAULT_HTTP_TIMEOUT = 5.0
+
+# The default maximum number of finished spans held in a recorder queue
+DEFAULT_MAX_QUEUE_SIZE = 2048
+
+# The default upper bound of a single batched payload in bytes
+DEFAULT_MAX_BATCH_BYTES = 512 * 1024
+
+# The default time a batch may wait for more spans before being sent
+DEFAULT_LINGER_MS = 200
+
+# Queue drop policy which discards the incoming span when the queue is full
+DROP_NEWEST = "drop_newest"
+
+# Queue drop policy which evicts the oldest queued span when the queue is full
+DROP_OLDEST = "drop_oldest"
+
+# The default timeout of a single dispatch call to the haystack-agent
+DEFAULT_AGENT_TIMEOUT = 5.0
+
+# The default maximum number of unanswered dispatch calls to the haystack-agent
+DEFAULT_MAX_IN_FLIGHT = 64
+
+# The default time to wait for the haystack-agent channel to become ready
+DEFAULT_RECONNECT_TIMEOUT = 5.0
+
+# The default time tracers wait for recorded spans to be reported at exit
+DEFAULT_CLOSE_TIMEOUT = 5.0
+
+# The default upper bound of spans spilled to disk by a SpillQueue in bytes
+DEFAULT_SPILL_MAX_BYTES = 64 * 1024 * 1024
+
+# The default size of a single SpillQueue segment file in bytes
+DEFAULT_SPILL_SEGMENT_BYTES = 4 * 1024 * 1024
+
+# The default time to wait before replaying spilled spans after a failed send
+DEFAULT_SPILL_RETRY_INTERVAL = 5.0
+
+# Content-Encoding of gzip compressed payloads
+GZIP = "gzip"
+
+# Content-Encoding of zlib compressed payloads
+DEFLATE = "deflate"
+
+# Content-Encoding of zstd compressed payloads, requires zstandard
+ZSTD = "zstd"
+
+# The default size from which payloads are compressed, smaller payloads don't
+# gain enough to be worth the CPU
+DEFAULT_COMPRESSION_MIN_BYTES = 1024
+
+# The default time a trace stays buffered by a TailSamplingRecorder after its
+# latest span finished when its local root span does not finish
+DEFAULT_TAIL_DECISION_WAIT_MS = 5000
+
+# The default maximum number of spans buffered by a TailSamplingRecorder
+DEFAULT_TAIL_MAX_SPANS = 10000
+
+# The default number of trace decisions a TailSamplingRecorder remembers for
+# spans finishing after their trace was decided
+DEFAULT_TAIL_MAX_DECIDED_TRACES = 10000
+
+# The default maximum number of metric series a MetricsRecorder aggregates,
+# further operations are aggregated as OTHER_OPERATION
+DEFAULT_METRICS_MAX_SERIES = 2000
+
+# Operation name of the metric series aggregating operations beyond the limit
+OTHER_OPERATION = "__other__"
+
+# The default number of logarithmic histogram buckets per doubling of the
+# span duration, bounding the relative error of a bucket to 2 ** (1 / 8) - 1
+DEFAULT_HISTOGRAM_BUCKETS_PER_DOUBLING = 8
+
+# The default upper bounds in seconds of the exported latency buckets
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                           5.0, 10.0)
+
+# The default capacity in bytes of a SharedMemoryRing
+DEFAULT_RING_BYTES = 16 * 1024 * 1024
+
+# The default time a SharedMemoryRing writer waits for the ring's lock while
+# the process holding it is running
+DEFAULT_RING_LOCK_TIMEOUT = 0.1
+
+# The number of consecutive lock timeouts after which SharedMemoryRing
+# writers stop waiting for the lock, assuming it was abandoned
+DEFAULT_RING_MAX_LOCK_TIMEOUTS = 3
+
+# The default path of the Unix socket haystack-exporter listens on
+DEFAULT_EXPORTER_SOCKET = "/tmp/haystack-exporter.sock"
+
+# The default time a UnixSocketRecorder waits before reconnecting to the
+# exporter
+DEFAULT_SOCKET_RETRY_INTERVAL = 1.0
+
+# The largest span frame haystack-exporter accepts
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+# The number of nanoseconds in one second
+SECONDS_TO_NANOS = 1000000000
+
+# The number of nanoseconds in one microsecond, the unit of span timestamps
+MICROS_TO_NANOS = 1000
+
+# The time after which span timestamps are re-anchored to the wall clock,
+# bounding how far they drift from NTP corrections of the system clock
+CLOCK_ANCHOR_INTERVAL_NS = 60 * SECONDS_TO_NANOS
@@ -0,0 +1,140 @@
+"""
+haystack-exporter: receives the spans of local processes from
+UnixSocketRecorders and forwards them in batches to the haystack collector or
+agent.
+
+    haystack-exporter --socket /tmp/haystack-exporter.sock \\
+        --collector-url http://haystack-collector:8080/span
+"""
+import argparse
+import logging
+import os
+import signal
+import socketserver
+import sys
+import threading
+from .http_recorder import BatchingHttpRecorder
+from .agent_recorder import BatchingAgentRecorder
+from .unix_socket_recorder import FRAME_HEADER
+from .constants import (
+    DEFAULT_EXPORTER_SOCKET,
+    DEFAULT_MAX_QUEUE_SIZE,
+    DEFAULT_MAX_BATCH_BYTES,
+    DEFAULT_LINGER_MS,
+    DEFAULT_CLOSE_TIMEOUT,
+    MAX_FRAME_BYTES,
+    GZIP,
+    DEFLATE,
+    ZSTD,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _FrameHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        read = self.rfile.read
+        while True:
+            header = read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            (length,) = FRAME_HEADER.unpack(header)
+            if length > MAX_FRAME_BYTES:
+                logger.error(f"Closing a connection sending a frame of "
+                             f"{length} bytes")
+                return
+            frame = read(length)
+            if len(frame) < length:
+                return
+            self.server.recorder.record_encoded_span(frame)
+
+
+class SpanSocketServer(socketserver.ThreadingMixIn,
+                       socketserver.UnixStreamServer):
+    """Unix socket server passing the span frames of each connection to a
+    batching recorder."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, recorder):
+        """
+        :param socket_path: path to listen on, a stale socket file left by a
+        previous exporter is replaced
+        :param recorder: a
+        :class:`haystack.background_recorder.BatchingSpanRecorder` sending
+        proto spans
+        """
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.recorder = recorder
+        super().__init__(socket_path, _FrameHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="haystack-exporter",
+        description="Forward spans written to a Unix socket by "
+                    "UnixSocketRecorders to the haystack collector or agent.")
+    parser.add_argument("--socket", default=DEFAULT_EXPORTER_SOCKET,
+                        help="path of the Unix socket to listen on")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--collector-url",
+                        default="http://haystack-collector:8080/span",
+                        help="haystack collector endpoint accepting batches")
+    target.add_argument("--agent", metavar="HOST:PORT",
+                        help="send to a haystack-agent instead")
+    parser.add_argument("--compression", choices=(GZIP, DEFLATE, ZSTD),
+                        help="compression of batches sent to the collector")
+    parser.add_argument("--max-queue-size", type=int,
+                        default=DEFAULT_MAX_QUEUE_SIZE)
+    parser.add_argument("--max-batch-bytes", type=int,
+                        default=DEFAULT_MAX_BATCH_BYTES)
+    parser.add_argument("--linger-ms", type=int, default=DEFAULT_LINGER_MS)
+    return parser.parse_args(argv)
+
+
+def _recorder(args):
+    batching = {"max_queue_size": args.max_queue_size,
+                "max_batch_bytes": args.max_batch_bytes,
+                "linger_ms": args.linger_ms}
+    if args.agent:
+        host, _, port = args.agent.rpartition(":")
+        return BatchingAgentRecorder(agent_host=host,
+                                     agent_port=int(port),
+                                     **batching)
+    return BatchingHttpRecorder(collector_url=args.collector_url,
+                                headers={},
+                                compression=args.compression,
+                                **batching)
+
+
+def main(argv=None):
+    """Entry point of the haystack-exporter console script."""
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    recorder = _recorder(args)
+    server = SpanSocketServer(args.socket, recorder)
+
+    def stop(signum, frame):
+        # shutdown waits for serve_forever, so it can't run on this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    logger.info(f"Exporting spans received on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0 if recorder.close(DEFAULT_CLOSE_TIMEOUT) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import itertools
+import logging
+import os
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# objects owning threads, locks, sockets or files which are unusable or
+# shared with the parent in a forked child, in the order they were created,
+# so that components are re-initialized before the recorders owning them
+_registered = weakref.WeakValueDictionary()
+_sequence = itertools.count()
+_pid = os.getpid()
+
+
+def register(owner):
+    """Have `owner._reinit_after_fork()` called in forked children of this
+    process, before any span is started in the child."""
+    _registered[next(_sequence)] = owner
+
+
+def reinit_if_forked():
+    """Re-initialize the registered objects if the process forked without
+    running the os.register_at_fork hooks, e.g. under uwsgi without
+    `py-call-osafterfork`."""
+    if os.getpid() != _pid:
+        _after_fork_in_child()
+
+
+def _after_fork_in_child():
+    global _pid
+    _pid = os.getpid()
+    for owner in list(_registered.values()):
+        try:
+            owner._reinit_after_fork()
+        except Exception:
+            logger.exception(f"Failed to re-initialize {owner} after fork")
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -1,11 +1,31 @@
 import logging
-import json
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
 from requests import Session
 from requests import RequestException
 from requests_futures.sessions import FuturesSession
-from .recorder import SpanRecorder
-from .util import span_to_proto, span_to_json
-from .constants import DEFAULT_HTTP_TIMEOUT
+from . import fork
+from .recorder import SpanRecorder, PendingCalls
+from .background_recorder import (
+    BatchingSpanRecorder,
+    deadline_after,
+    time_left,
+)
+from .compression import get_compressor
+from .proto_encoder import serialize_span
+from .json_encoder import serialize_span_json
+from .util import (
+    proto_batch_payload,
+    json_batch_payload,
+)
+from .constants import (
+    DEFAULT_HTTP_TIMEOUT,
+    DEFAULT_COMPRESSION_MIN_BYTES,
+    DEFAULT_MAX_QUEUE_SIZE,
+    DEFAULT_MAX_BATCH_BYTES,
+    DEFAULT_LINGER_MS,
+    DROP_NEWEST,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +38,12 @@ def response_hook(response, *args, **kwargs):
                      f"Haystack Response: {response}")
 
 
+def is_delivered(response):
+    """Whether the collector took a payload. Payloads it rejected with a
+    client error are not worth resending."""
+    return response is not None and response.status_code < 500
+
+
 class SyncHttpRecorder(SpanRecorder):
     """Http span recorder which Translates and reports haystack.Spans
     in-process."""
@@ -27,46 +53,89 @@ class SyncHttpRecorder(SpanRecorder):
                  headers={},
                  timeout_seconds=DEFAULT_HTTP_TIMEOUT,
                  use_json_payload=False,
-                 requests_session=None):
+                 requests_session=None,
+                 spill_queue=None,
+                 compression=None,
+                 compression_level=None,
+                 compression_min_bytes=DEFAULT_COMPRESSION_MIN_BYTES):
         """
         :param collector_url: the haystack collector endpoint
         :param timeout_seconds: timeout limit of the requests
         :param use_json_payload: set True to enable json payload format.
+        :param spill_queue: optional :class:`haystack.spill.SpillQueue`
+        keeping spans on disk while the collector is unreachable
+        :param compression: GZIP, DEFLATE or ZSTD to compress payloads,
+        None to send them uncompressed
+        :param compression_level: level of the compression codec, None for
+        its default
+        :param compression_min_bytes: payloads smaller than this are sent
+        uncompressed
         """
         self._collector_url = collector_url
         self._timeout_seconds = timeout_seconds
         self._use_json_payload = use_json_payload
         self._session = requests_session or Session()
+        # posts on the calling thread, also once wrapped by AsyncHttpRecorder
+        self._requests_session = self._session
+        self._spill = spill_queue
+        self._compress = None if compression is None \
+            else get_compressor(compression, compression_level)
+        self._compression_headers = {"Content-Encoding": compression}
+        self._compression_min_bytes = compression_min_bytes
         headers["Content-Type"] = "application/json" if use_json_payload \
             else "application/octet-stream"
         self._session.headers.update(headers)
         self._session.hooks["response"] = response_hook
+        self._closed = False
+        fork.register(self)
+
+    def _reinit_after_fork(self):
+        # pooled connections are shared with the parent, the session opens
+        # new ones on the next request
+        self._requests_session.close()
 
     @staticmethod
     def get_json_payload(span):
-        json_span = span_to_json(span)
-        str_span = json.dumps(
-            json_span,
-            default=lambda o: f"{o.__class__.__name__} is not serializable"
-        )
-        return str_span.encode("utf-8")
+        return serialize_span_json(span)
 
     @staticmethod
     def get_binary_payload(span):
-        proto_span = span_to_proto(span)
-        return proto_span.SerializeToString()
+        return serialize_span(span)
 
     def post_payload(self, payload):
+        if self._spill is None:
+            self.post(payload)
+        else:
+            self._spill.send_or_spill([payload], self._post_spilled)
+
+    def post(self, payload):
+        """Post `payload` on the calling thread.
+
+        :return: the collector response, None if the request failed.
+        """
         try:
             logger.debug(f"Haystack Payload = {payload}")
-            self._session.post(self._collector_url,
-                               data=payload,
-                               timeout=self._timeout_seconds)
+            return self._requests_session.post(self._collector_url,
+                                               **self._request_args(payload))
         except RequestException as e:
             logger.error(f"Failed to submit span to the http collector due "
                          f"to {e}")
+            return None
+
+    def _request_args(self, payload):
+        if self._compress is None or \
+                len(payload) < self._compression_min_bytes:
+            return {"data": payload, "timeout": self._timeout_seconds}
+        return {"data": self._compress(payload),
+                "headers": self._compression_headers,
+                "timeout": self._timeout_seconds}
+
+    def _post_spilled(self, payloads):
+        return all(is_delivered(self.post(payload)) for payload in payloads)
 
     def record_span(self, span):
+        if self._closed:
+            return
         try:
             payload = self.get_json_payload(span) if self._use_json_payload \
                 else self.get_binary_payload(span)
@@ -74,6 +143,20 @@ class SyncHttpRecorder(SpanRecorder):
             logger.exception("failed to convert span")
         self.post_payload(payload)
 
+    def flush(self, timeout=None):
+        """Replay spilled spans, False if the collector is still
+        unreachable or `timeout` expired first."""
+        return self._spill is None or self._spill.replay(
+            self._post_spilled, deadline=deadline_after(timeout))
+
+    def close(self, timeout=None):
+        self._closed = True
+        flushed = self.flush(timeout)
+        self._session.close()
+        if self._spill is not None:
+            self._spill.close()
+        return flushed
+
 
 class ExceptionHandlingRequestsSession(Session):
     """This class is needed to prevent exceptions from being swallowed due to
@@ -81,10 +164,29 @@ class ExceptionHandlingRequestsSession(Session):
     on the future."""
     def send(self, request, **kwargs):
         try:
-            super().send(request, **kwargs)
+            return super().send(request, **kwargs)
         except RequestException as e:
             logger.error(f"Failed to submit span to the http collector due "
                          f"to {e}")
+            return None
+
+
+def _executor_like(executor):
+    """A new executor of the type and with the settings of `executor`, for
+    a forked child in which the executor's workers don't exist."""
+    if isinstance(executor, ThreadPoolExecutor):
+        return type(executor)(max_workers=executor._max_workers,
+                              thread_name_prefix=executor._thread_name_prefix,
+                              initializer=executor._initializer,
+                              initargs=executor._initargs)
+    if isinstance(executor, ProcessPoolExecutor):
+        return type(executor)(max_workers=executor._max_workers,
+                              mp_context=executor._mp_context,
+                              initializer=executor._initializer,
+                              initargs=executor._initargs)
+    logger.warning(f"Cannot recreate a {type(executor).__name__} in the "
+                   f"forked process, using a default thread pool")
+    return None
 
 
 class AsyncHttpRecorder(SyncHttpRecorder):
@@ -97,7 +199,11 @@ class AsyncHttpRecorder(SyncHttpRecorder):
                  headers={},
                  timeout_seconds=DEFAULT_HTTP_TIMEOUT,
                  use_json_payload=False,
-                 executor=None):
+                 executor=None,
+                 spill_queue=None,
+                 compression=None,
+                 compression_level=None,
+                 compression_min_bytes=DEFAULT_COMPRESSION_MIN_BYTES):
         """
         :param collector_url: the haystack collector endpoint
         :param timeout_seconds: timeout limit of the requests (these are
@@ -105,13 +211,155 @@ class AsyncHttpRecorder(SyncHttpRecorder):
         :param use_json_payload: set True to enable json payload format.
         :param executor: Can provide a ProcessExecutor pool or ThreadExecutor
          pool with tuned parameters.
-        Default is a ThreadExecutorPool with max 8 threads
+        Default is a ThreadExecutorPool with max 8 threads. Forked children
+        get a new executor of the same type and settings.
+        :param spill_queue: optional :class:`haystack.spill.SpillQueue`
+        keeping spans on disk instead of in pending requests while the
+        collector is unreachable
+        :param compression: GZIP, DEFLATE or ZSTD to compress payloads,
+        None to send them uncompressed. Payloads are compressed on the
+        thread recording the span.
+        :param compression_level: level of the compression codec, None for
+        its default
+        :param compression_min_bytes: payloads smaller than this are sent
+        uncompressed
         """
         super().__init__(collector_url=collector_url,
                          headers=headers,
                          timeout_seconds=timeout_seconds,
                          use_json_payload=use_json_payload,
-                         requests_session=ExceptionHandlingRequestsSession())
+                         requests_session=ExceptionHandlingRequestsSession(),
+                         spill_queue=spill_queue,
+                         compression=compression,
+                         compression_level=compression_level,
+                         compression_min_bytes=compression_min_bytes)
 
         self._session = FuturesSession(executor=executor,
                                        session=self._session)
+        self._pending = PendingCalls()
+
+    def _reinit_after_fork(self):
+        super()._reinit_after_fork()
+        # the executor's threads do not exist in the child
+        self._session = FuturesSession(
+            executor=_executor_like(self._session.executor),
+            session=self._requests_session)
+
+    def post_payload(self, payload):
+        if self._spill is not None and len(self._spill):
+            # the collector is unreachable, queue behind the spilled spans
+            self._spill.append(payload)
+            if self._spill.retry_due():
+                self._pending.add(
+                    self._session.executor.submit(self._replay_spilled))
+            return
+
+        logger.debug(f"Haystack Payload = {payload}")
+        future = self._session.post(self._collector_url,
+                                    **self._request_args(payload))
+        if self._spill is not None:
+            future.add_done_callback(partial(self._spill_failed, payload))
+        self._pending.add(future)
+
+    def _spill_failed(self, payload, future):
+        if future.exception() is not None or \
+                not is_delivered(future.result()):
+            self._spill.append(payload)
+            self._spill.backoff()
+
+    def _replay_spilled(self):
+        self._spill.replay(self._post_spilled)
+
+    def flush(self, timeout=None):
+        deadline = deadline_after(timeout)
+        return self._pending.wait(timeout) and \
+            super().flush(time_left(deadline))
+
+
+class BatchingHttpRecorder(BatchingSpanRecorder):
+    """Http span recorder which queues finished spans in a bounded in-memory
+    queue and reports them in batches from a single background thread.
+
+    Binary batches are posted as a proto `Batch` message, json batches as a
+    json array of spans.
+    """
+
+    def __init__(self,
+                 collector_url="http://haystack-collector:8080/span",
+                 headers={},
+                 timeout_seconds=DEFAULT_HTTP_TIMEOUT,
+                 use_json_payload=False,
+                 requests_session=None,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE,
+                 max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+                 linger_ms=DEFAULT_LINGER_MS,
+                 drop_policy=DROP_NEWEST,
+                 spill_queue=None,
+                 compression=None,
+                 compression_level=None,
+                 compression_min_bytes=DEFAULT_COMPRESSION_MIN_BYTES):
+        """
+        :param collector_url: the haystack collector endpoint accepting
+        batched payloads
+        :param timeout_seconds: timeout limit of the requests (these are
+         handled on the flusher thread)
+        :param use_json_payload: set True to enable json payload format.
+        :param max_queue_size: maximum number of spans waiting to be sent
+        :param max_batch_bytes: upper bound of a single posted payload
+        :param linger_ms: maximum time a partial batch waits for more spans
+        :param drop_policy: DROP_NEWEST or DROP_OLDEST when the queue is full
+        :param spill_queue: optional :class:`haystack.spill.SpillQueue`
+        keeping spans on disk while the collector is unreachable, replayed
+        in batches once it recovers
+        :param compression: GZIP, DEFLATE or ZSTD to compress each batch,
+        None to send them uncompressed
+        :param compression_level: level of the compression codec, None for
+        its default
+        :param compression_min_bytes: batches smaller than this are sent
+        uncompressed
+        """
+        self._use_json_payload = use_json_payload
+        self._spill = spill_queue
+        self._transport = SyncHttpRecorder(
+            collector_url=collector_url,
+            headers=headers,
+            timeout_seconds=timeout_seconds,
+            use_json_payload=use_json_payload,
+            requests_session=requests_session,
+            compression=compression,
+            compression_level=compression_level,
+            compression_min_bytes=compression_min_bytes)
+        super().__init__(max_queue_size=max_queue_size,
+                         max_batch_bytes=max_batch_bytes,
+                         linger_ms=linger_ms,
+                         drop_policy=drop_policy)
+
+    def encode_span(self, span):
+        if self._use_json_payload:
+            return SyncHttpRecorder.get_json_payload(span)
+        return SyncHttpRecorder.get_binary_payload(span)
+
+    def send_batch(self, encoded_spans):
+        if self._spill is None:
+            self._transport.post(self._batch_payload(encoded_spans))
+        else:
+            self._spill.send_or_spill(encoded_spans, self._post_batch,
+                                      self._max_batch_bytes)
+
+    def _batch_payload(self, encoded_spans):
+        return json_batch_payload(encoded_spans) \
+            if self._use_json_payload else proto_batch_payload(encoded_spans)
+
+    def _post_batch(self, encoded_spans):
+        return is_delivered(
+            self._transport.post(self._batch_payload(encoded_spans)))
+
+    def wait_for_sent(self, timeout=None):
+        return self._spill is None or \
+            self._spill.replay(self._post_batch, self._max_batch_bytes,
+                               deadline_after(timeout))
+
+    def close_transport(self):
+        self._transport.close()
+        if self._spill is not None:
+            self._spill.close()
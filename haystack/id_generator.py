@@ -0,0 +1,64 @@
+import os
+import random
+import uuid
+from abc import ABC, abstractmethod
+from . import fork
+
+
+class IdGenerator(ABC):
+    """Generates the trace and span ids of new spans."""
+
+    @abstractmethod
+    def generate_trace_id(self):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def generate_span_id(self):
+        raise NotImplementedError()
+
+
+class Uuid4IdGenerator(IdGenerator):
+    """Ids from uuid.uuid4(), which reads os.urandom for every id."""
+
+    def generate_trace_id(self):
+        return format(uuid.uuid4())
+
+    def generate_span_id(self):
+        return format(uuid.uuid4())
+
+
+class RandomIdGenerator(IdGenerator):
+    """Default id generator producing random version 4 uuid strings from a
+    PRNG seeded from os.urandom.
+
+    Drawing bits from the PRNG avoids a urandom syscall per id. The generator
+    is reseeded in forked children.
+    """
+
+    # clears the uuid version/variant bits before they are set to 4/RFC 4122
+    _VERSION_MASK = ~(0xf000 << 64) & ~(0xc000 << 48)
+    _VERSION_BITS = (0x4000 << 64) | (0x8000 << 48)
+
+    def __init__(self):
+        self._random = random.Random()
+        self.reseed()
+        # reseeded in forked children so they don't repeat the parent's ids
+        fork.register(self)
+
+    def reseed(self):
+        self._random.seed(os.urandom(16))
+
+    _reinit_after_fork = reseed
+
+    def generate_trace_id(self):
+        return self._uuid4()
+
+    def generate_span_id(self):
+        return self._uuid4()
+
+    def _uuid4(self):
+        bits = (self._random.getrandbits(128) & self._VERSION_MASK) \
+            | self._VERSION_BITS
+        hex_id = "%032x" % bits
+        return f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}-" \
+            f"{hex_id[16:20]}-{hex_id[20:]}"
@@ -0,0 +1,200 @@
+import json
+from json.encoder import encode_basestring_ascii
+from .constants import SECONDS_TO_MICRO, MICROS_TO_NANOS
+from .util import TypeDispatch
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _unserializable(o):
+    return f"{o.__class__.__name__} is not serializable"
+
+
+# encodes values the encoders below do not handle, e.g. dicts
+_fallback_encoder = json.JSONEncoder(default=_unserializable)
+
+
+def _encode_bool(value):
+    return "true" if value else "false"
+
+
+def _encode_float(value):
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "Infinity"
+    if value == float("-inf"):
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def _resolve_value_encoder(value_type):
+    if issubclass(value_type, str):
+        return encode_basestring_ascii
+    if value_type is type(None):
+        return lambda value: "null"
+    if issubclass(value_type, bool):
+        return _encode_bool
+    if issubclass(value_type, int):
+        return int.__repr__
+    if issubclass(value_type, float):
+        return _encode_float
+    return _fallback_encoder.encode
+
+
+# encodes tag keys and values exactly like json.dumps
+_value_encoders = TypeDispatch(_resolve_value_encoder)
+
+
+def _encode_value(value):
+    return _value_encoders[type(value)](value)
+
+
+def _write_fields(parts, key_values):
+    separator = "{\"key\": "
+    for key, value in key_values.items():
+        parts.append(separator)
+        parts.append(_value_encoders[type(key)](key))
+        parts.append(", \"value\": ")
+        parts.append(_value_encoders[type(value)](value))
+        parts.append("}")
+        separator = ", {\"key\": "
+
+
+def _field(key, value):
+    parts = []
+    _write_fields(parts, {key: value})
+    return "".join(parts)
+
+
+class JsonCommonFields(object):
+    """The serviceName and the common tags of a tracer, which are the same on
+    all of its spans and therefore only encoded once."""
+
+    __slots__ = ("service_name", "service_name_json", "tags", "tags_json",
+                 "tag_dicts")
+
+    def __init__(self, service_name, common_tags):
+        """
+        :param service_name: service name of the tracer
+        :param common_tags: common tags of the tracer, which must not change
+        afterwards
+        """
+        self.service_name = service_name
+        self.service_name_json = _encode_value(service_name)
+        # tags entries for orjson, which encodes them along with each span
+        self.tag_dicts = [{"key": key, "value": value}
+                          for key, value in common_tags.items()]
+        try:
+            # tags entries by tag key
+            self.tags = {key: _field(key, value)
+                         for key, value in common_tags.items()}
+        except ValueError:
+            # e.g. a circular reference, reported when spans are encoded
+            self.tags = None
+        self.tags_json = ", ".join(self.tags.values()) \
+            if self.tags is not None else None
+
+
+def _write_tags(parts, span, common_fields):
+    local_tags = span.local_tags
+    common_tags = common_fields.tags
+    if common_tags is None:
+        _write_fields(parts, span.tags)
+    elif local_tags.keys().isdisjoint(common_tags):
+        if common_tags:
+            parts.append(common_fields.tags_json)
+            if local_tags:
+                parts.append(", ")
+        _write_fields(parts, local_tags)
+    else:
+        # overridden common tags keep their position, as in span.tags
+        parts.append(", ".join(_field(key, value) if key in local_tags
+                               else common_tags[key]
+                               for key, value in span.tags.items()))
+
+
+def _tag_dicts(span, common_fields):
+    local_tags = span.local_tags
+    if local_tags.keys().isdisjoint(span.tracer.common_tags):
+        return common_fields.tag_dicts + [
+            {"key": key, "value": value} for key, value in local_tags.items()]
+    return [{"key": key, "value": value} for key, value in span.tags.items()]
+
+
+def _write_span(parts, span):
+    """Append the json encoding of `span` to the list of strings `parts`,
+    matching json.dumps(util.span_to_json(span)) with the recorders'
+    default handler."""
+    context = span.context
+    tracer = span.tracer
+    common_fields = tracer.json_common_fields
+    parts.append("{\"traceId\": ")
+    parts.append(_encode_value(context.trace_id))
+    parts.append(", \"spanId\": ")
+    parts.append(_encode_value(context.span_id))
+    parts.append(", \"parentSpanId\": ")
+    parts.append(_encode_value(context.parent_id))
+    parts.append(", \"serviceName\": ")
+    if tracer.service_name == common_fields.service_name:
+        parts.append(common_fields.service_name_json)
+    else:
+        parts.append(_encode_value(tracer.service_name))
+    parts.append(", \"operationName\": ")
+    parts.append(_encode_value(span.operation_name))
+    parts.append(", \"startTime\": ")
+    parts.append(str(span.start_ns // MICROS_TO_NANOS))
+    parts.append(", \"duration\": ")
+    parts.append(str(span.duration_ns // MICROS_TO_NANOS))
+    parts.append(", \"tags\": [")
+    _write_tags(parts, span, common_fields)
+    parts.append("], \"logs\": [")
+    separator = "{\"timestamp\": "
+    for log_data in span.logs:
+        parts.append(separator)
+        parts.append(str(int(log_data.timestamp * SECONDS_TO_MICRO)))
+        parts.append(", \"fields\": [")
+        _write_fields(parts, log_data.key_values)
+        parts.append("]}")
+        separator = ", {\"timestamp\": "
+    parts.append("]}")
+    return parts
+
+
+def _span_dict(span):
+    context = span.context
+    common_fields = span.tracer.json_common_fields
+    return {
+        "traceId": context.trace_id,
+        "spanId": context.span_id,
+        "parentSpanId": context.parent_id,
+        "serviceName": span.tracer.service_name,
+        "operationName": span.operation_name,
+        "startTime": span.start_ns // MICROS_TO_NANOS,
+        "duration": span.duration_ns // MICROS_TO_NANOS,
+        "tags": _tag_dicts(span, common_fields),
+        "logs": [{"timestamp": int(log_data.timestamp * SECONDS_TO_MICRO),
+                  "fields": [{"key": key, "value": value}
+                             for key, value in log_data.key_values.items()]}
+                 for log_data in span.logs]
+    }
+
+
+def serialize_span_json(span):
+    """Serialize `span` as utf-8 encoded json in the format of
+    util.span_to_json.
+
+    Uses orjson when installed, which writes compact utf-8 json, and
+    otherwise writes the same bytes as json.dumps without building the
+    intermediate dicts and lists.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(_span_dict(span), default=_unserializable)
+        except orjson.JSONEncodeError:
+            # e.g. ints beyond 64 bit or non str dict keys in a tag value
+            pass
+    return "".join(_write_span([], span)).encode("utf-8")
@@ -0,0 +1,276 @@
+import logging
+import math
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from opentracing.ext import tags as ext_tags
+from . import fork
+from .recorder import SpanRecorder
+from .constants import (
+    DEFAULT_METRICS_MAX_SERIES,
+    OTHER_OPERATION,
+    DEFAULT_HISTOGRAM_BUCKETS_PER_DOUBLING,
+    DEFAULT_LATENCY_BUCKETS,
+)
+
+logger = logging.getLogger(__name__)
+
+_PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class LogHistogram(object):
+    """Histogram of durations in logarithmic buckets.
+
+    Bucket i counts values in (2 ** ((i - 1) / k), 2 ** (i / k)] for
+    `buckets_per_doubling` k, so the relative error of a bucket is bounded by
+    2 ** (1 / k) - 1 at any magnitude, while only buckets which were hit are
+    stored. Values of 0 or less are counted in `zero_count`.
+    """
+
+    __slots__ = ("buckets_per_doubling", "counts", "zero_count", "count",
+                 "sum")
+
+    def __init__(self,
+                 buckets_per_doubling=DEFAULT_HISTOGRAM_BUCKETS_PER_DOUBLING):
+        self.buckets_per_doubling = buckets_per_doubling
+        self.counts = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, value):
+        self.count += 1
+        self.sum += value
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log2(value) * self.buckets_per_doubling)
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def upper_bound(self, index):
+        return 2.0 ** (index / self.buckets_per_doubling)
+
+    def percentile(self, percentile):
+        """Upper bound of the bucket holding the given percentile (0-100),
+        None if the histogram is empty."""
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * percentile / 100.0)
+        seen = self.zero_count
+        if seen >= rank:
+            return 0.0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return self.upper_bound(index)
+        return self.upper_bound(max(self.counts))
+
+    def cumulative_counts(self, bounds):
+        """Number of values up to each of the sorted `bounds`. A bucket
+        straddling a bound is counted under the next bound."""
+        counts = [0] * len(bounds)
+        for index, count in self.counts.items():
+            position = bisect_left(bounds, self.upper_bound(index))
+            if position < len(counts):
+                counts[position] += count
+        total = self.zero_count
+        for position, count in enumerate(counts):
+            total += count
+            counts[position] = total
+        return counts
+
+    def copy(self):
+        histogram = LogHistogram(self.buckets_per_doubling)
+        histogram.counts = dict(self.counts)
+        histogram.zero_count = self.zero_count
+        histogram.count = self.count
+        histogram.sum = self.sum
+        return histogram
+
+
+class MetricSnapshot(namedtuple("MetricSnapshot", ["service_name",
+                                                   "operation_name",
+                                                   "kind",
+                                                   "error",
+                                                   "histogram"])):
+    """Totals of one metric series since the recorder was created. The
+    request count is `histogram.count`, the summed duration in seconds
+    `histogram.sum`."""
+    __slots__ = ()
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"") \
+        .replace("\n", "\\n")
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+class MetricsRecorder(SpanRecorder):
+    """Recorder which aggregates rate, errors and duration (RED) metrics of
+    finished spans per service name, operation name, span.kind tag and error
+    tag, then passes each span on to the wrapped recorder.
+
+    Metrics are computed from every span the recorder sees, so wrap a
+    TailSamplingRecorder to keep accurate metrics while reporting few traces.
+    Spans of traces dropped by head sampling never reach a recorder.
+
+    Totals can be pushed to `callback` every `export_interval_seconds`, read
+    with `snapshot()`, rendered with `prometheus_text()` or served to a
+    Prometheus scraper with `serve_prometheus()`.
+    """
+
+    def __init__(self,
+                 recorder,
+                 callback=None,
+                 export_interval_seconds=60.0,
+                 max_series=DEFAULT_METRICS_MAX_SERIES,
+                 buckets_per_doubling=DEFAULT_HISTOGRAM_BUCKETS_PER_DOUBLING,
+                 latency_buckets=DEFAULT_LATENCY_BUCKETS):
+        """
+        :param recorder: the recorder reporting the spans
+        :param callback: optional function called with a list of
+        :class:`MetricSnapshot` every `export_interval_seconds` and on close
+        :param export_interval_seconds: interval of calls to `callback`
+        :param max_series: maximum number of series, further operations of a
+        service are aggregated under OTHER_OPERATION
+        :param buckets_per_doubling: resolution of the duration histograms
+        :param latency_buckets: sorted upper bounds in seconds of the buckets
+        exported to Prometheus
+        """
+        self._recorder = recorder
+        self._callback = callback
+        self._max_series = max_series
+        self._buckets_per_doubling = buckets_per_doubling
+        self._latency_buckets = tuple(latency_buckets)
+        self._export_interval_seconds = export_interval_seconds
+        self._server = None
+        self._closed = False
+        self._reset()
+        fork.register(self)
+
+    def _reset(self):
+        self._series = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._exporter = None
+        if self._callback is not None and not self._closed:
+            self._exporter = threading.Thread(target=self._run,
+                                              name="haystack-metrics",
+                                              daemon=True)
+            self._exporter.start()
+
+    def _reinit_after_fork(self):
+        # the child counts its own spans, and the parent serves its endpoint
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+        self._reset()
+
+    def default_scope_manager(self):
+        return self._recorder.default_scope_manager()
+
+    def record_span(self, span):
+        tags = span.tags
+        key = (span.tracer.service_name,
+               span.operation_name,
+               tags.get(ext_tags.SPAN_KIND, ""),
+               tags.get(ext_tags.ERROR) in (True, "true"))
+        with self._lock:
+            histogram = self._series.get(key)
+            if histogram is None:
+                if len(self._series) >= self._max_series:
+                    key = (key[0], OTHER_OPERATION) + key[2:]
+                histogram = self._series.get(key)
+                if histogram is None:
+                    histogram = self._series[key] = \
+                        LogHistogram(self._buckets_per_doubling)
+            histogram.record(span.duration)
+        self._recorder.record_span(span)
+
+    def snapshot(self):
+        """Totals of all series, as a list of :class:`MetricSnapshot`."""
+        with self._lock:
+            return [MetricSnapshot(*key, histogram.copy())
+                    for key, histogram in self._series.items()]
+
+    def prometheus_text(self):
+        """The totals in the Prometheus text exposition format."""
+        lines = ["# HELP haystack_span_duration_seconds Duration of finished "
+                 "spans by service, operation, span kind and error",
+                 "# TYPE haystack_span_duration_seconds histogram"]
+        for metric in self.snapshot():
+            labels = (f"service=\"{_escape_label(metric.service_name)}\","
+                      f"operation=\"{_escape_label(metric.operation_name)}\","
+                      f"kind=\"{_escape_label(metric.kind)}\","
+                      f"error=\"{'true' if metric.error else 'false'}\"")
+            histogram = metric.histogram
+            counts = histogram.cumulative_counts(self._latency_buckets)
+            for bound, count in zip(self._latency_buckets, counts):
+                lines.append(f"haystack_span_duration_seconds_bucket"
+                             f"{{{labels},le=\"{_format_bound(bound)}\"}} "
+                             f"{count}")
+            lines.append(f"haystack_span_duration_seconds_bucket"
+                         f"{{{labels},le=\"+Inf\"}} {histogram.count}")
+            lines.append(f"haystack_span_duration_seconds_sum{{{labels}}} "
+                         f"{histogram.sum!r}")
+            lines.append(f"haystack_span_duration_seconds_count{{{labels}}} "
+                         f"{histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port, host="127.0.0.1"):
+        """Serve `prometheus_text()` over http on a background thread until
+        the recorder is closed.
+
+        :param port: port to listen on, 0 for any free port
+        :return: the (host, port) the endpoint listens on
+        """
+        recorder = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = recorder.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", _PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever,
+                         name="haystack-metrics-endpoint",
+                         daemon=True).start()
+        return self._server.server_address[:2]
+
+    def flush(self, timeout=None):
+        return self._recorder.flush(timeout)
+
+    def close(self, timeout=None):
+        if self._closed:
+            return True
+        self._closed = True
+        self._stop.set()
+        if self._exporter is not None:
+            self._exporter.join()
+            self._export()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        return self._recorder.close(timeout)
+
+    def _export(self):
+        try:
+            self._callback(self.snapshot())
+        except Exception:
+            logger.exception("Failed to export span metrics")
+
+    def _run(self):
+        while not self._stop.wait(self._export_interval_seconds):
+            self._export()
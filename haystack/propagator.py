@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
 from collections import namedtuple
+from opentracing import SpanContextCorruptedException
 from .constants import (
     TRACE_ID,
     SPAN_ID,
     PARENT_SPAN_ID,
     BAGGAGE_PREFIX,
+    SAMPLED,
 )
 
 
@@ -22,6 +24,119 @@ class Propagator(ABC):
 PropagatorOpts = namedtuple("PropagatorOpts", ["trace_id_key",
                                                "span_id_key",
                                                "parent_id_key",
-                                               "baggage_key_prefix"])
+                                               "baggage_key_prefix",
+                                               "sampled_key"])
 PropagatorOpts.__new__.__defaults__ = (TRACE_ID, SPAN_ID, PARENT_SPAN_ID,
-                                       BAGGAGE_PREFIX)
+                                       BAGGAGE_PREFIX, SAMPLED)
+
+
+# header mappings which look keys up case-insensitively, as (top level
+# package, class name) of the class or one of its bases
+CASE_INSENSITIVE_CARRIERS = {
+    ("requests", "CaseInsensitiveDict"),
+    ("multidict", "CIMultiDict"),
+    ("multidict", "CIMultiDictProxy"),
+    ("werkzeug", "Headers"),
+    ("werkzeug", "EnvironHeaders"),
+    ("django", "CaseInsensitiveMapping"),
+    ("starlette", "Headers"),
+    ("httpx", "Headers"),
+    ("tornado", "HTTPHeaders"),
+    ("email", "Message"),
+}
+
+# carrier type -> whether it is one of the CASE_INSENSITIVE_CARRIERS
+_case_insensitive_types = {}
+
+
+def is_case_insensitive(carrier):
+    """Whether `carrier` is a mapping looking keys up case-insensitively."""
+    carrier_type = type(carrier)
+    case_insensitive = _case_insensitive_types.get(carrier_type)
+    if case_insensitive is None:
+        case_insensitive = _case_insensitive_types[carrier_type] = any(
+            (cls.__module__.partition(".")[0], cls.__name__)
+            in CASE_INSENSITIVE_CARRIERS
+            for cls in carrier_type.__mro__)
+    return case_insensitive
+
+
+def find_keys(carrier, lc_keys):
+    """The values of `lc_keys`, lowercase keys, in `carrier`, with carrier
+    keys matched case-insensitively. Missing keys are None."""
+    if is_case_insensitive(carrier):
+        return [carrier.get(key) for key in lc_keys]
+    values = [None] * len(lc_keys)
+    for key in carrier:
+        lc_key = key.lower()
+        if lc_key in lc_keys:
+            values[lc_keys.index(lc_key)] = carrier[key]
+    return values
+
+
+_HEX_DIGITS = "0123456789abcdef"
+
+
+def hex_id(value, length):
+    """`value`, a uuid or hex id, as `length` lowercase hex digits, keeping
+    the low digits of longer ids and zero padding shorter ones. None if it
+    is not a hex id or all zeros, which W3C and B3 headers don't allow."""
+    digits = str(value).replace("-", "").lower()
+    if not digits or len(digits) > 32 or digits.strip(_HEX_DIGITS) \
+            or not digits.strip("0"):
+        return None
+    return digits[-length:].rjust(length, "0")
+
+
+def parse_hex_id(value, lengths):
+    """`value` as lowercase hex digits if it is a non-zero hex id of one of
+    `lengths` digits, otherwise None."""
+    value = value.strip().lower()
+    if len(value) not in lengths or value.strip(_HEX_DIGITS) \
+            or not value.strip("0"):
+        return None
+    return value
+
+
+def uuid_trace_id(digits):
+    """A 16 or 32 hex digit trace id formatted like the uuid trace ids of
+    the default id generator, so traces crossing W3C or B3 hops keep their
+    id."""
+    digits = digits.lower().rjust(32, "0")
+    return f"{digits[:8]}-{digits[8:12]}-{digits[12:16]}-" \
+        f"{digits[16:20]}-{digits[20:]}"
+
+
+class CompositePropagator(Propagator):
+    """Propagates a span context in several formats at once, e.g. Haystack,
+    W3C and B3 headers.
+
+    inject writes the context with every propagator. extract returns the
+    context found by the first propagator which finds one, so list the
+    preferred format first. It only raises SpanContextCorruptedException if
+    no propagator found a valid context.
+    """
+
+    def __init__(self, propagators):
+        """
+        :param propagators: the propagators, in order of preference
+        """
+        self._propagators = tuple(propagators)
+
+    def inject(self, span_context, carrier):
+        for propagator in self._propagators:
+            propagator.inject(span_context, carrier)
+
+    def extract(self, carrier):
+        error = None
+        for propagator in self._propagators:
+            try:
+                span_context = propagator.extract(carrier)
+            except SpanContextCorruptedException as e:
+                error = error or e
+                continue
+            if span_context is not None:
+                return span_context
+        if error is not None:
+            raise error
+        return None
@@ -0,0 +1,216 @@
+import json
+import logging
+import struct
+import traceback
+from .constants import SECONDS_TO_MICRO, MICROS_TO_NANOS
+from .util import encode_varint, TypeDispatch, resolve_tag_value_type
+
+logger = logging.getLogger(__name__)
+
+# field keys (field number << 3 | wire type) of span.proto
+# Span
+_TRACE_ID = b"\x0a"
+_SPAN_ID = b"\x12"
+_PARENT_SPAN_ID = b"\x1a"
+_SERVICE_NAME = b"\x22"
+_OPERATION_NAME = b"\x2a"
+_START_TIME = b"\x30"
+_DURATION = b"\x38"
+_LOGS = b"\x42"
+_TAGS = b"\x4a"
+# Log
+_LOG_TIMESTAMP = b"\x08"
+_LOG_FIELDS = b"\x12"
+# Tag, the value fields are members of a oneof and written even when empty
+_TAG_KEY = b"\x0a"
+_TAG_STRING = b"\x1a"
+_TAG_DOUBLE = b"\x10\x01\x29"
+_TAG_BOOL = b"\x10\x02\x30"
+_TAG_LONG = b"\x10\x03\x20"
+_TAG_BINARY = b"\x10\x04\x3a"
+
+_DOUBLE = struct.Struct("<d")
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+
+
+def _int64(value):
+    if value < 0:
+        if value < _INT64_MIN:
+            raise ValueError(f"Value out of range: {value}")
+        # negative int64 are encoded as their 64 bit two's complement
+        value += 1 << 64
+    elif value > _INT64_MAX:
+        raise ValueError(f"Value out of range: {value}")
+    return encode_varint(value)
+
+
+def _length_delimited(data):
+    return encode_varint(len(data)) + data
+
+
+def _string_value(key, value):
+    # STRING is the default type and therefore omitted
+    return _TAG_STRING + _length_delimited(value.encode("utf-8"))
+
+
+def _bool_value(key, value):
+    return _TAG_BOOL + (b"\x01" if value else b"\x00")
+
+
+def _long_value(key, value):
+    return _TAG_LONG + _int64(int(value))
+
+
+def _double_value(key, value):
+    return _TAG_DOUBLE + _DOUBLE.pack(value)
+
+
+def _bytes_value(key, value):
+    return _TAG_BINARY + _length_delimited(value)
+
+
+def _dict_value(key, value):
+    return _string_value(key, json.dumps(value))
+
+
+def _type_value(key, value):
+    return _string_value(key, str(value))
+
+
+def _traceback_value(key, value):
+    return _string_value(key, str(traceback.format_tb(value)))
+
+
+def _unsupported_value(key, value):
+    logger.error(f"Dropped tag {key} due to "
+                 f"invalid value type of {type(value)}. "
+                 f"Type must be Int, String, Bool, Float, Dict or Bytes")
+    return _string_value(
+        key, f"Unserializable object type: {str(type(value))}")
+
+
+# the type and value fields of a Tag by value type, mirroring
+# util.set_proto_tag_value
+_tag_value_encoders = TypeDispatch(
+    lambda value_type: resolve_tag_value_type(
+        value_type, (_string_value, _bool_value, _long_value, _double_value,
+                     _bytes_value, _dict_value, _type_value,
+                     _traceback_value, _unsupported_value)))
+
+
+def _tag(key, value):
+    """A serialized Tag message, without its length prefix."""
+    if not isinstance(key, str):
+        raise TypeError(f"Tag key must be a str, got {type(key)}")
+    value_encoding = _tag_value_encoders[type(value)](key, value)
+    if key:
+        return _TAG_KEY + _length_delimited(key.encode("utf-8")) + \
+            value_encoding
+    return value_encoding
+
+
+def _framed_tag(key, value):
+    """A Tag as an entry of the repeated Span.tags field."""
+    tag = _tag(key, value)
+    return _TAGS + encode_varint(len(tag)) + tag
+
+
+def _string_field(out, field_key, value):
+    if value:
+        data = value.encode("utf-8")
+        out += field_key
+        out += encode_varint(len(data))
+        out += data
+    return out
+
+
+def _int64_field(out, field_key, value):
+    if value:
+        out += field_key
+        out += _int64(value)
+
+
+class EncodedCommonFields(object):
+    """The serviceName field and the common tags of a tracer, which are the
+    same on all of its spans and therefore only encoded once."""
+
+    __slots__ = ("service_name", "service_name_field", "tags", "tags_field")
+
+    def __init__(self, service_name, common_tags):
+        """
+        :param service_name: service name of the tracer
+        :param common_tags: common tags of the tracer, which must not change
+        afterwards
+        """
+        self.service_name = service_name
+        self.service_name_field = bytes(
+            _string_field(bytearray(), _SERVICE_NAME, service_name))
+        try:
+            # Span.tags entries by tag key
+            self.tags = {key: _framed_tag(key, value)
+                         for key, value in common_tags.items()}
+        except (TypeError, ValueError):
+            # reported when the spans carrying the tag are encoded
+            self.tags = None
+        self.tags_field = b"".join(self.tags.values()) \
+            if self.tags is not None else None
+
+
+def _write_tags(out, span, common_fields):
+    local_tags = span.local_tags
+    common_tags = common_fields.tags
+    if common_tags is None:
+        for key, value in span.tags.items():
+            out += _framed_tag(key, value)
+    elif local_tags.keys().isdisjoint(common_tags):
+        out += common_fields.tags_field
+        for key, value in local_tags.items():
+            out += _framed_tag(key, value)
+    else:
+        # overridden common tags keep their position, as in span.tags
+        for key, value in span.tags.items():
+            out += _framed_tag(key, value) if key in local_tags \
+                else common_tags[key]
+
+
+def write_span(out, span):
+    """Append the protobuf encoding of `span` to the bytearray `out`.
+
+    Writes the same bytes as util.span_to_proto(span).SerializeToString()
+    without building the message objects.
+    """
+    context = span.context
+    tracer = span.tracer
+    common_fields = tracer.encoded_common_fields
+    _string_field(out, _TRACE_ID, context.trace_id)
+    _string_field(out, _SPAN_ID, context.span_id)
+    _string_field(out, _PARENT_SPAN_ID, context.parent_id)
+    if tracer.service_name == common_fields.service_name:
+        out += common_fields.service_name_field
+    else:
+        _string_field(out, _SERVICE_NAME, tracer.service_name)
+    _string_field(out, _OPERATION_NAME, span.operation_name)
+    _int64_field(out, _START_TIME, span.start_ns // MICROS_TO_NANOS)
+    _int64_field(out, _DURATION, span.duration_ns // MICROS_TO_NANOS)
+
+    for log_data in span.logs:
+        log = bytearray()
+        _int64_field(log, _LOG_TIMESTAMP,
+                     int(log_data.timestamp * SECONDS_TO_MICRO))
+        for key, value in log_data.key_values.items():
+            field = _tag(key, value)
+            log += _LOG_FIELDS
+            log += encode_varint(len(field))
+            log += field
+        out += _LOGS
+        out += encode_varint(len(log))
+        out += log
+
+    _write_tags(out, span, common_fields)
+    return out
+
+
+def serialize_span(span):
+    """Serialize `span` as a haystack proto Span message."""
+    return bytes(write_span(bytearray(), span))
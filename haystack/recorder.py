@@ -1,5 +1,8 @@
 import logging
+import threading
 from abc import ABC, abstractmethod
+from opentracing.scope_managers import ThreadLocalScopeManager
+from . import fork
 from .util import span_to_string
 
 logger = logging.getLogger(__name__)
@@ -17,6 +20,65 @@ class SpanRecorder(ABC):
         """
         raise NotImplementedError()
 
+    def default_scope_manager(self):
+        """The ScopeManager a HaystackTracer pairs with this recorder when
+        none is given explicitly."""
+        return ThreadLocalScopeManager()
+
+    def flush(self, timeout=None):
+        """Block until every span recorded so far has been reported.
+
+        :param timeout: maximum number of seconds to wait, None to wait
+        until done.
+        :return: True if all spans were reported before the timeout.
+        """
+        return True
+
+    def close(self, timeout=None):
+        """Flush recorded spans and release the resources of this recorder.
+
+        Spans recorded after close are dropped.
+
+        :param timeout: maximum number of seconds to wait for the flush.
+        :return: True if all spans were reported before the timeout.
+        """
+        return self.flush(timeout)
+
+
+class PendingCalls(object):
+    """Counts asynchronous transport calls (concurrent.futures or grpc
+    futures) which have not completed yet, so recorders can wait for them.
+    """
+
+    def __init__(self):
+        self._count = 0
+        self._condition = threading.Condition()
+        fork.register(self)
+
+    def _reinit_after_fork(self):
+        # calls of the parent never complete in the child
+        self._count = 0
+        self._condition = threading.Condition()
+
+    def add(self, future):
+        with self._condition:
+            self._count += 1
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._condition:
+            self._count -= 1
+            if self._count == 0:
+                self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Wait until all calls completed, False if `timeout` elapsed."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._count == 0, timeout)
+
+    def __len__(self):
+        return self._count
+
 
 class NoopRecorder(SpanRecorder):
     def record_span(self, span):
@@ -0,0 +1,281 @@
+import logging
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+from .recorder import SpanRecorder
+from .proto_encoder import serialize_span
+from .json_encoder import serialize_span_json
+from .background_recorder import deadline_after, time_left
+from .constants import (
+    DEFAULT_RING_BYTES,
+    DEFAULT_RING_LOCK_TIMEOUT,
+    DEFAULT_RING_MAX_LOCK_TIMEOUTS,
+    DEFAULT_LINGER_MS,
+    DEFAULT_CLOSE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# read position, write position and dropped records. Positions count bytes
+# written since the ring was created, their offset in the ring is the
+# position modulo the capacity.
+_HEADER = struct.Struct("=QQQ")
+# pid of the process holding the ring's lock, 0 if unknown
+_HOLDER = struct.Struct("=Q")
+# offset of the records in the shared memory
+_RECORDS_OFFSET = _HEADER.size + _HOLDER.size
+# records are prefixed with their length
+_RECORD_HEADER = struct.Struct("=I")
+# marks the unused end of the ring when a record wraps to its start
+_WRAP = 0xffffffff
+# interval at which writers waiting for the lock check that its holder runs
+_LOCK_POLL_SECONDS = 0.0005
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMemoryRing(object):
+    """Bounded ring buffer of encoded spans in anonymous shared memory.
+
+    Created before the workers of a pre-fork server are forked, it lets the
+    workers hand their spans to a single :class:`RingBufferExporter` process,
+    so that only the exporter holds connections to the collector or agent.
+    Records which don't fit are dropped and counted in `dropped`.
+
+    The ring's lock is only held to move its positions and to copy a single
+    record in. Writers wait for it while its holder is running, at most
+    `lock_timeout`. A process killed while holding the lock never releases
+    it, so once a writer finds the holder gone, or after `max_lock_timeouts`
+    consecutive timeouts, it stops waiting and drops its records unless the
+    lock is free, until it gets the lock again.
+    """
+
+    def __init__(self,
+                 capacity_bytes=DEFAULT_RING_BYTES,
+                 lock_timeout=DEFAULT_RING_LOCK_TIMEOUT,
+                 max_lock_timeouts=DEFAULT_RING_MAX_LOCK_TIMEOUTS):
+        """
+        :param capacity_bytes: size of the shared memory for records
+        :param lock_timeout: maximum time in seconds a writer waits for the
+        ring's lock while its holder is running
+        :param max_lock_timeouts: consecutive lock timeouts after which a
+        writer no longer waits for the lock
+        """
+        self._capacity = capacity_bytes
+        self._memory = mmap.mmap(-1, _RECORDS_OFFSET + capacity_bytes)
+        self._lock = multiprocessing.get_context("fork").Lock()
+        self._lock_timeout = lock_timeout
+        self._max_lock_timeouts = max_lock_timeouts
+        # consecutive lock timeouts of this process' writers
+        self._lock_timeouts = 0
+
+    @property
+    def dropped(self):
+        """Number of records dropped as the ring was full."""
+        return _HEADER.unpack_from(self._memory, 0)[2]
+
+    def __len__(self):
+        """Number of bytes in the ring, including record headers."""
+        head, tail, _ = _HEADER.unpack_from(self._memory, 0)
+        return tail - head
+
+    def put(self, record):
+        """Append `record` unless the ring is full or its lock stays held.
+
+        :return: True if `record` was appended
+        """
+        size = _RECORD_HEADER.size + len(record)
+        if not self._acquire_for_put():
+            return False
+        try:
+            head, tail, dropped = _HEADER.unpack_from(self._memory, 0)
+            offset = tail % self._capacity
+            contiguous = self._capacity - offset
+            padding = contiguous if contiguous < size else 0
+            if tail + padding + size - head > self._capacity:
+                _HEADER.pack_into(self._memory, 0, head, tail, dropped + 1)
+                return False
+            if padding:
+                if contiguous >= _RECORD_HEADER.size:
+                    _RECORD_HEADER.pack_into(self._memory,
+                                             _RECORDS_OFFSET + offset, _WRAP)
+                tail += padding
+                offset = 0
+            start = _RECORDS_OFFSET + offset
+            _RECORD_HEADER.pack_into(self._memory, start, len(record))
+            start += _RECORD_HEADER.size
+            self._memory[start:start + len(record)] = record
+            _HEADER.pack_into(self._memory, 0, head, tail + size, dropped)
+            return True
+        finally:
+            self._release()
+
+    def _acquire_for_put(self):
+        if self._lock_timeouts < self._max_lock_timeouts:
+            deadline = time.monotonic() + self._lock_timeout
+            while not self._lock.acquire(timeout=_LOCK_POLL_SECONDS):
+                (holder,) = _HOLDER.unpack_from(self._memory, _HEADER.size)
+                if holder and not _is_running(holder):
+                    # killed while holding the lock, which stays held
+                    self._lock_timeouts = self._max_lock_timeouts
+                    return False
+                if time.monotonic() >= deadline:
+                    self._lock_timeouts += 1
+                    return False
+        elif not self._lock.acquire(block=False):
+            return False
+        self._lock_timeouts = 0
+        _HOLDER.pack_into(self._memory, _HEADER.size, os.getpid())
+        return True
+
+    def _acquire(self):
+        self._lock.acquire()
+        _HOLDER.pack_into(self._memory, _HEADER.size, os.getpid())
+
+    def _release(self):
+        _HOLDER.pack_into(self._memory, _HEADER.size, 0)
+        self._lock.release()
+
+    def take_all(self):
+        """Remove and return all records in the ring, oldest first.
+
+        Writers never touch the bytes between the read and write position,
+        so the records are copied without holding the lock. Must only be
+        called by a single reader.
+        """
+        self._acquire()
+        try:
+            head, tail, _ = _HEADER.unpack_from(self._memory, 0)
+        finally:
+            self._release()
+        records = []
+        while head < tail:
+            offset = head % self._capacity
+            contiguous = self._capacity - offset
+            if contiguous < _RECORD_HEADER.size:
+                head += contiguous
+                continue
+            start = _RECORDS_OFFSET + offset
+            (length,) = _RECORD_HEADER.unpack_from(self._memory, start)
+            if length == _WRAP:
+                head += contiguous
+                continue
+            start += _RECORD_HEADER.size
+            records.append(self._memory[start:start + length])
+            head += _RECORD_HEADER.size + length
+        self._acquire()
+        try:
+            _, tail, dropped = _HEADER.unpack_from(self._memory, 0)
+            _HEADER.pack_into(self._memory, 0, head, tail, dropped)
+        finally:
+            self._release()
+        return records
+
+
+class RingBufferRecorder(SpanRecorder):
+    """Recorder for the workers of a pre-fork server which encodes finished
+    spans and appends them to a :class:`SharedMemoryRing`, leaving the
+    transport to the :class:`RingBufferExporter` draining the ring.
+
+    record_span never waits for the network, and for the ring's lock only
+    while another running process holds it. Spans which don't fit the ring
+    or don't get its lock are dropped and counted in `dropped_spans`.
+    """
+
+    def __init__(self, ring, use_json_payload=False):
+        """
+        :param ring: the ring shared with the exporter process
+        :param use_json_payload: set True if the exporter's recorder sends
+        json payloads
+        """
+        self._ring = ring
+        self._use_json_payload = use_json_payload
+        self.dropped_spans = 0
+
+    def record_span(self, span):
+        try:
+            encoded = serialize_span_json(span) if self._use_json_payload \
+                else serialize_span(span)
+        except Exception:
+            logger.exception("failed to convert span")
+            return
+        if not self._ring.put(encoded):
+            self.dropped_spans += 1
+
+    def flush(self, timeout=None):
+        """Wait until the exporter took the spans recorded so far from the
+        ring."""
+        deadline = deadline_after(timeout)
+        while len(self._ring):
+            remaining = time_left(deadline)
+            if remaining == 0.0:
+                return False
+            time.sleep(0.01 if remaining is None else min(0.01, remaining))
+        return True
+
+
+class RingBufferExporter(object):
+    """Process draining a :class:`SharedMemoryRing` into a batching recorder,
+    e.g. a BatchingHttpRecorder or BatchingAgentRecorder.
+
+    The recorder is created by `recorder_factory` in the exporter process, so
+    its threads and connections belong to that process. It must encode spans
+    like the RingBufferRecorders writing to the ring. The exporter stops when
+    stop() is called or when its parent process exits.
+    """
+
+    def __init__(self,
+                 ring,
+                 recorder_factory,
+                 poll_interval_ms=DEFAULT_LINGER_MS):
+        """
+        :param ring: the ring shared with the workers
+        :param recorder_factory: function returning a
+        :class:`haystack.background_recorder.BatchingSpanRecorder`
+        :param poll_interval_ms: time between draining the ring
+        """
+        context = multiprocessing.get_context("fork")
+        self._ring = ring
+        self._recorder_factory = recorder_factory
+        self._poll_interval_seconds = poll_interval_ms / 1000.0
+        self._stop = context.Event()
+        self._process = context.Process(target=self._run,
+                                        name="haystack-exporter",
+                                        daemon=True)
+
+    def start(self):
+        self._process.start()
+
+    def stop(self, timeout=DEFAULT_CLOSE_TIMEOUT):
+        """Stop the exporter after it reported the spans in the ring.
+
+        :return: True if the exporter stopped within `timeout`.
+        """
+        self._stop.set()
+        self._process.join(timeout)
+        return not self._process.is_alive()
+
+    def _run(self):
+        parent = os.getppid()
+        recorder = self._recorder_factory()
+        while not self._stop.wait(self._poll_interval_seconds):
+            self._drain(recorder)
+            if os.getppid() != parent:
+                logger.warning("Parent process exited, stopping the exporter")
+                break
+        self._drain(recorder)
+        recorder.close(DEFAULT_CLOSE_TIMEOUT)
+
+    def _drain(self, recorder):
+        for record in self._ring.take_all():
+            recorder.record_encoded_span(record)
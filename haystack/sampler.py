@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class Sampler(ABC):
+    """Makes the head-based sampling decision for new root spans.
+
+    The decision is stored in the :class:`SpanContext`, inherited by child
+    spans and propagated downstream, so a sampler is only consulted when no
+    upstream decision exists.
+    """
+
+    @abstractmethod
+    def is_sampled(self, trace_id, operation_name):
+        """
+        :param trace_id: the trace id of the new span
+        :param operation_name: the operation name of the new span
+        :return: True if the trace should be recorded
+        """
+        raise NotImplementedError()
+
+
+class ConstSampler(Sampler):
+    """Samples either all (default) or no traces."""
+
+    def __init__(self, decision=True):
+        self.decision = decision
+
+    def is_sampled(self, trace_id, operation_name):
+        return self.decision
+
+
+class ProbabilisticSampler(Sampler):
+    """Samples traces at random with the given probability."""
+
+    def __init__(self, rate):
+        """
+        :param rate: probability of sampling a trace, between 0.0 and 1.0
+        """
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"Sampling rate must be between 0.0 and 1.0, "
+                             f"got {rate}")
+        self.rate = rate
+
+    def is_sampled(self, trace_id, operation_name):
+        return random.random() < self.rate
+
+
+class RateLimitingSampler(Sampler):
+    """Samples at most `max_traces_per_second` traces per operation name
+    using a token bucket per operation.
+
+    Once `max_operations` distinct operations are tracked, any further
+    operations share a single bucket so memory stays bounded.
+    """
+
+    def __init__(self, max_traces_per_second, max_operations=2000):
+        """
+        :param max_traces_per_second: sampled traces per second allowed for
+        each operation, with bursts up to the same amount but at least one
+        trace, so rates below one trace per second still sample.
+        :param max_operations: maximum number of per operation buckets.
+        """
+        self.max_traces_per_second = float(max_traces_per_second)
+        # a bucket must hold a whole token to ever sample
+        self._capacity = max(1.0, self.max_traces_per_second)
+        self._max_operations = max_operations
+        self._buckets = {}
+        self._overflow_bucket = self._new_bucket()
+        self._lock = threading.Lock()
+
+    def _new_bucket(self):
+        # [available tokens, last refill time]
+        return [self._capacity, time.monotonic()]
+
+    def is_sampled(self, trace_id, operation_name):
+        with self._lock:
+            bucket = self._buckets.get(operation_name)
+            if bucket is None:
+                if len(self._buckets) < self._max_operations:
+                    bucket = self._buckets[operation_name] = \
+                        self._new_bucket()
+                else:
+                    bucket = self._overflow_bucket
+
+            now = time.monotonic()
+            tokens = min(self._capacity,
+                         bucket[0] + (now - bucket[1]) *
+                         self.max_traces_per_second)
+            bucket[1] = now
+            if tokens < 1.0:
+                bucket[0] = tokens
+                return False
+            bucket[0] = tokens - 1.0
+            return True
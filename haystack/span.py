@@ -1,39 +1,144 @@
 import opentracing
-import time
+from collections import namedtuple
 from threading import Lock
+from types import MappingProxyType
+from .clock import monotonic_ns, wall_ns, now_ns, seconds_to_ns
+from .constants import SECONDS_TO_NANOS
+
+# Returned by Span.tags until the first tag is set. Read-only so that writes
+# go through set_tag instead of being silently lost.
+EMPTY_TAGS = MappingProxyType({})
+
+
+class Baggage(dict):
+    """Read-only dict of baggage items, shared by a span context and its
+    children until one of them sets an item."""
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Baggage is read-only, use Span.set_baggage_item")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return Baggage, (dict(self),)
+
+    def copy(self):
+        """A mutable copy of the items."""
+        return dict(self)
+
+    def with_item(self, key, value):
+        """A copy with `key` set to `value`, or removed if `value` is None."""
+        baggage = Baggage(self)
+        if value is not None:
+            dict.__setitem__(baggage, key, value)
+        else:
+            dict.pop(baggage, key, None)
+        return baggage
+
+
+# Baggage of contexts without baggage items
+EMPTY_BAGGAGE = Baggage()
+
+
+def _start_times(start_time):
+    """Wall clock start in nanoseconds and monotonic start, if measured, of
+    a span started at `start_time` seconds, or now if it is None."""
+    if start_time is not None:
+        return seconds_to_ns(start_time), None
+    start_monotonic_ns = monotonic_ns()
+    return wall_ns(start_monotonic_ns), start_monotonic_ns
+
+
+def _duration_ns(span, finish_time):
+    """Duration of a span finishing at `finish_time` seconds, or now if it
+    is None. Spans started and finished now are timed on the monotonic
+    clock."""
+    if finish_time is not None:
+        return seconds_to_ns(finish_time) - span.start_ns
+    if span._start_monotonic_ns is not None:
+        return monotonic_ns() - span._start_monotonic_ns
+    return now_ns() - span.start_ns
+
+
+def _merge_tags(common_tags, local_tags):
+    """The tags of a span: the common tags of its tracer, overridden by the
+    tags set on the span itself, always a read-only mapping."""
+    if not common_tags:
+        return local_tags
+    if not local_tags:
+        return MappingProxyType(dict(common_tags))
+    return MappingProxyType({**common_tags, **local_tags})
 
 
 class SpanContext(opentracing.SpanContext):
-    """Implements opentracing.SpanContext"""
+    """Implements opentracing.SpanContext
+
+    The baggage is a read-only :class:`Baggage` dict, so child contexts share
+    their parent's baggage instead of copying it. with_baggage_item copies it
+    into a new context, leaving the baggage of other contexts unchanged.
+    """
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "sampled", "trace_state",
+                 "_baggage")
 
     def __init__(self,
                  trace_id=None,
                  span_id=None,
                  parent_id=None,
-                 baggage=None):
+                 baggage=None,
+                 sampled=None,
+                 trace_state=None):
+        """
+        :param baggage: an optional dict of baggage items.
+        :param sampled: the head-based sampling decision of the trace, None
+        if no decision has been made yet.
+        :param trace_state: the W3C tracestate header received with the
+        trace, passed on unchanged to downstream services.
+        """
         self.trace_id = trace_id
         self.span_id = span_id
         self.parent_id = parent_id
-        self._baggage = baggage or opentracing.SpanContext.EMPTY_BAGGAGE
+        self.sampled = sampled
+        self.trace_state = trace_state
+        self._baggage = EMPTY_BAGGAGE if not baggage \
+            else baggage if type(baggage) is Baggage else Baggage(baggage)
 
     @property
     def baggage(self):
-        return self._baggage or opentracing.SpanContext.EMPTY_BAGGAGE
+        return self._baggage
 
     def with_baggage_item(self, key, value):
-        baggage = dict(self._baggage)
-        if value is not None:
-            baggage[key] = value
-        else:
-            baggage.pop(key, None)
         return SpanContext(trace_id=self.trace_id,
                            span_id=self.span_id,
                            parent_id=self.parent_id,
-                           baggage=baggage)
+                           baggage=self._baggage.with_item(key, value),
+                           sampled=self.sampled,
+                           trace_state=self.trace_state)
 
 
 class Span(opentracing.Span):
-    """Implements opentracing.Span"""
+    """Implements opentracing.Span
+
+    The tags dict and the logs list are only allocated once the first tag or
+    log is added. The span only holds the tags set on it, the common tags of
+    the tracer are kept (and encoded) once by the tracer.
+
+    Start and duration are kept in integer nanoseconds, see
+    :mod:`haystack.clock`. `start_time` and `duration` give them in seconds.
+    """
+
+    # opentracing.Span declares no __slots__, so spans still have a __dict__.
+    # It stays empty as long as every attribute is a slot, which saves more
+    # on python < 3.11 than on later versions storing attributes inline.
+    __slots__ = ("_tracer", "_context", "_mutex", "operation_name",
+                 "start_ns", "_start_monotonic_ns", "duration_ns", "_tags",
+                 "_logs")
+
+    # whether each span guards its mutations with its own lock
+    _synchronized = True
 
     def __init__(
             self,
@@ -43,13 +148,43 @@ class Span(opentracing.Span):
             tags=None,
             start_time=None):
         super().__init__(tracer, context)
-        self._tracer = tracer
-        self._mutex = Lock()
+        self._mutex = Lock() if self._synchronized else None
         self.operation_name = operation_name
-        self.start_time = start_time
-        self.tags = tags if tags is not None else {}
-        self.duration = -1
-        self.logs = []
+        self.start_ns, self._start_monotonic_ns = _start_times(start_time)
+        # copied, set_tag must not write into the caller's dict
+        self._tags = dict(tags) if tags else None
+        self.duration_ns = -1
+        self._logs = None
+
+    @property
+    def start_time(self):
+        """Unix timestamp in seconds of the start of the span."""
+        return self.start_ns / SECONDS_TO_NANOS
+
+    @property
+    def duration(self):
+        """Duration of the span in seconds, negative until it finished."""
+        return self.duration_ns / SECONDS_TO_NANOS
+
+    @property
+    def local_tags(self):
+        """Read-only mapping of the tags set on this span, use set_tag to add
+        a tag."""
+        if self._tags is None:
+            return EMPTY_TAGS
+        return MappingProxyType(self._tags)
+
+    @property
+    def tags(self):
+        """Read-only mapping of the tags of this span including the common
+        tags of the tracer, use set_tag to add a tag."""
+        return _merge_tags(self._tracer.common_tags, self.local_tags)
+
+    @property
+    def logs(self):
+        """Tuple of the :class:`LogData` of this span, use log_kv to add
+        one."""
+        return tuple(self._logs) if self._logs is not None else ()
 
     def set_operation_name(self, operation_name):
         with self._mutex:
@@ -77,9 +212,9 @@ class Span(opentracing.Span):
         :return: the :class:`Span` itself, for call chaining.
         """
         with self._mutex:
-            if self.tags is None:
-                self.tags = {}
-            self.tags[key] = value
+            if self._tags is None:
+                self._tags = {}
+            self._tags[key] = value
         return self
 
     def log_kv(self, key_values, timestamp=None):
@@ -103,15 +238,35 @@ class Span(opentracing.Span):
         :rtype: Span
         :return: the :class:`Span` itself, for call chaining.
         """
+        log_data = LogData(key_values, timestamp)
         with self._mutex:
-            self.logs.append(LogData(key_values, timestamp))
+            if self._logs is None:
+                self._logs = []
+            self._logs.append(log_data)
         return self
 
     def finish(self, finish_time=None):
+        duration_ns = _duration_ns(self, finish_time)
+        with self._mutex:
+            self.duration_ns = duration_ns
+        self._tracer.record(self)
+
+    def snapshot(self):
+        """Capture an immutable view of this span for deferred recording.
+
+        Tags are captured by reference rather than copied, so they must not
+        be modified once the span is finished.
+
+        :rtype: SpanSnapshot
+        """
         with self._mutex:
-            finish = time.time() if finish_time is None else finish_time
-            self.duration = finish - self.start_time
-            self._tracer.record(self)
+            return SpanSnapshot(tracer=self._tracer,
+                                context=self.context,
+                                operation_name=self.operation_name,
+                                start_ns=self.start_ns,
+                                duration_ns=self.duration_ns,
+                                local_tags=self.local_tags,
+                                logs=self.logs)
 
     def set_baggage_item(self, key, value):
         """Stores a Baggage item in the :class:`Span` as a key/value pair.
@@ -148,9 +303,107 @@ class Span(opentracing.Span):
             return self.context.baggage.get(key)
 
 
-class LogData(object):
-    def __init__(self,
-                 key_values,
-                 timestamp=None):
-        self.key_values = key_values
-        self.timestamp = time.time() if timestamp is None else timestamp
+class UnsynchronizedSpan(Span):
+    """Span without a per-span lock, for spans only mutated by the thread
+    which started them.
+
+    Mutations are single attribute assignments, dict item assignments and
+    list appends, which are atomic under the GIL, so concurrent use does not
+    corrupt the span but may interleave (e.g. a tag set concurrently with
+    finish() may or may not be recorded).
+    """
+
+    __slots__ = ()
+
+    _synchronized = False
+
+    def set_operation_name(self, operation_name):
+        self.operation_name = operation_name
+        return self
+
+    def set_tag(self, key, value):
+        if self._tags is None:
+            self._tags = {}
+        self._tags[key] = value
+        return self
+
+    def log_kv(self, key_values, timestamp=None):
+        if self._logs is None:
+            self._logs = []
+        self._logs.append(LogData(key_values, timestamp))
+        return self
+
+    def finish(self, finish_time=None):
+        self.duration_ns = _duration_ns(self, finish_time)
+        self._tracer.record(self)
+
+    def snapshot(self):
+        return SpanSnapshot(tracer=self._tracer,
+                            context=self._context,
+                            operation_name=self.operation_name,
+                            start_ns=self.start_ns,
+                            duration_ns=self.duration_ns,
+                            local_tags=self.local_tags,
+                            logs=self.logs)
+
+    def set_baggage_item(self, key, value):
+        self._context = self._context.with_baggage_item(key=key, value=value)
+        return self
+
+    def get_baggage_item(self, key):
+        return self._context.baggage.get(key)
+
+
+class NonRecordingSpan(opentracing.Span):
+    """Span of a trace which is not sampled.
+
+    It keeps its :class:`SpanContext`, so the trace and its baggage still
+    propagate to children and downstream services, but tags, logs and the
+    operation name are discarded and it is never passed to the recorder.
+    """
+
+    __slots__ = ("_tracer", "_context")
+
+    def set_baggage_item(self, key, value):
+        self._context = self._context.with_baggage_item(key=key, value=value)
+        return self
+
+    def get_baggage_item(self, key):
+        return self._context.baggage.get(key)
+
+
+class SpanSnapshot(namedtuple("SpanSnapshot", ["tracer",
+                                               "context",
+                                               "operation_name",
+                                               "start_ns",
+                                               "duration_ns",
+                                               "local_tags",
+                                               "logs"])):
+    """Read-only record of a finished :class:`Span`, accepted by the span
+    translators in haystack.util in place of the span itself."""
+    __slots__ = ()
+
+    @property
+    def tags(self):
+        return _merge_tags(self.tracer.common_tags, self.local_tags)
+
+    @property
+    def start_time(self):
+        return self.start_ns / SECONDS_TO_NANOS
+
+    @property
+    def duration(self):
+        return self.duration_ns / SECONDS_TO_NANOS
+
+    def snapshot(self):
+        return self
+
+
+class LogData(namedtuple("LogData", ["key_values", "timestamp"])):
+    """A timestamped log record of a :class:`Span`."""
+    __slots__ = ()
+
+    def __new__(cls, key_values, timestamp=None):
+        return super().__new__(cls, key_values,
+                               now_ns() / SECONDS_TO_NANOS
+                               if timestamp is None else timestamp)
@@ -0,0 +1,269 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from . import fork
+from .constants import (
+    DEFAULT_SPILL_MAX_BYTES,
+    DEFAULT_SPILL_SEGMENT_BYTES,
+    DEFAULT_SPILL_RETRY_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# records are prefixed with their length as a big endian unsigned int
+_RECORD_HEADER = struct.Struct(">I")
+_SEGMENT_SUFFIX = ".spill"
+
+
+class _Segment(object):
+    __slots__ = ("path", "size", "records")
+
+    def __init__(self, path, size=0, records=0):
+        self.path = path
+        self.size = size
+        self.records = records
+
+
+class SpillQueue(object):
+    """Disk-backed FIFO of encoded spans which recorders write to while the
+    haystack-collector or haystack-agent is unreachable, and replay from once
+    it recovers.
+
+    Records are length-prefixed and appended to segment files of up to
+    `segment_bytes` in `directory`. Replay memory-maps the oldest segment and
+    deletes it once all of its records were sent. When more than `max_bytes`
+    are spilled, the oldest segments are evicted.
+
+    Segments left in `directory` by a previous process are picked up and
+    replayed. Delivery is at-least-once: records of a segment which was
+    partially replayed when the process exited are sent again.
+
+    A forked child starts an empty queue in the `pid-<pid>` subdirectory of
+    `directory`, leaving the spilled records to the parent.
+    """
+
+    def __init__(self,
+                 directory,
+                 max_bytes=DEFAULT_SPILL_MAX_BYTES,
+                 segment_bytes=DEFAULT_SPILL_SEGMENT_BYTES,
+                 retry_interval_seconds=DEFAULT_SPILL_RETRY_INTERVAL):
+        """
+        :param directory: directory holding the segment files, created if
+        missing. It must not be shared with other processes.
+        :param max_bytes: upper bound of spilled records on disk
+        :param segment_bytes: size at which a new segment file is started,
+        at most a quarter of `max_bytes`
+        :param retry_interval_seconds: time to wait after a failed send
+        before the spilled records are replayed again
+        """
+        self._max_bytes = max_bytes
+        self._segment_bytes = max(1, min(segment_bytes, max_bytes // 4))
+        self._retry_interval_seconds = retry_interval_seconds
+        self._open(directory)
+        fork.register(self)
+
+    def _open(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._replaying = threading.Lock()
+        self._segments = []
+        self._writer = None
+        self._read_offset = 0
+        self._read_records = 0
+        self._size = 0
+        self._records = 0
+        self._next_retry = 0.0
+        self._sequence = 0
+        self.evicted = 0
+
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(_SEGMENT_SUFFIX):
+                self._segments.append(
+                    self._recover(os.path.join(directory, name)))
+                self._sequence = int(name[:-len(_SEGMENT_SUFFIX)]) + 1
+        self._size = sum(segment.size for segment in self._segments)
+        self._records = sum(segment.records for segment in self._segments)
+
+    def _reinit_after_fork(self):
+        # the parent keeps its segments. The inherited writer is kept
+        # referenced, closing it would flush the parent's buffered bytes.
+        self._inherited_writer = self._writer
+        self._open(os.path.join(self._directory, f"pid-{os.getpid()}"))
+
+    @staticmethod
+    def _recover(path):
+        """Scan a segment written by a previous process, truncating a record
+        torn by a crash."""
+        segment = _Segment(path)
+        file_size = os.path.getsize(path)
+        if file_size:
+            with open(path, "rb") as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                while segment.size + _RECORD_HEADER.size <= file_size:
+                    (length,) = _RECORD_HEADER.unpack_from(view, segment.size)
+                    end = segment.size + _RECORD_HEADER.size + length
+                    if end > file_size:
+                        break
+                    segment.size = end
+                    segment.records += 1
+        if segment.size != file_size:
+            logger.warning(f"Truncating torn record in spill segment {path}")
+            os.truncate(path, segment.size)
+        return segment
+
+    def __len__(self):
+        """Number of spilled records which were not replayed yet."""
+        return self._records - self._read_records
+
+    def retry_due(self):
+        """Whether the retry interval elapsed since the last failed send."""
+        return time.monotonic() >= self._next_retry
+
+    def backoff(self):
+        """Postpone the next replay by the retry interval."""
+        self._next_retry = time.monotonic() + self._retry_interval_seconds
+
+    def append(self, record):
+        self.append_all((record,))
+
+    def append_all(self, records):
+        """Append encoded spans behind the already spilled ones."""
+        with self._lock:
+            for record in records:
+                if self._writer is None or \
+                        self._segments[-1].size >= self._segment_bytes:
+                    self._roll()
+                segment = self._segments[-1]
+                self._writer.write(_RECORD_HEADER.pack(len(record)))
+                self._writer.write(record)
+                record_size = _RECORD_HEADER.size + len(record)
+                segment.size += record_size
+                segment.records += 1
+                self._size += record_size
+                self._records += 1
+            if self._writer is not None:
+                self._writer.flush()
+            self._evict()
+
+    def send_or_spill(self, records, send, max_batch_bytes=0):
+        """Send `records` right away unless records are spilled already, in
+        which case they are appended behind them and the spilled records are
+        replayed once the retry interval elapsed.
+
+        :param send: called with a list of records, returns False if they
+        could not be sent
+        :return: True if `records` were sent
+        """
+        if not len(self):
+            if send(list(records)):
+                return True
+            self.append_all(records)
+            self.backoff()
+            return False
+        self.append_all(records)
+        return self.retry_due() and self.replay(send, max_batch_bytes)
+
+    def replay(self, send, max_batch_bytes=0, deadline=None):
+        """Send spilled records oldest first until all were sent, `send`
+        fails or `deadline` passed. Returns False right away if another
+        thread is replaying.
+
+        :param send: called with a list of records, returns False if they
+        could not be sent
+        :param max_batch_bytes: records are passed to `send` in lists of up
+        to this many bytes, 0 to pass them one at a time
+        :param deadline: time.monotonic() after which no further list is
+        sent, None to replay until done
+        :return: True if no spilled records are left
+        """
+        if not self._replaying.acquire(blocking=False):
+            return False
+        try:
+            while True:
+                with self._lock:
+                    if not len(self):
+                        while self._segments:
+                            self._release_head()
+                        return True
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return False
+                    segment = self._segments[0]
+                    batch, end = self._read(segment, max_batch_bytes)
+
+                if batch and not send(batch):
+                    self.backoff()
+                    return False
+
+                with self._lock:
+                    # the segment may have been evicted while sending
+                    if self._segments and self._segments[0] is segment:
+                        self._read_offset = end
+                        self._read_records += len(batch)
+                        if end == segment.size:
+                            self._release_head()
+        finally:
+            self._replaying.release()
+
+    def close(self):
+        """Close the open segment, keeping spilled records for the next
+        process using `directory`."""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def _read(self, segment, max_batch_bytes):
+        """Read records following the read offset of `segment`."""
+        batch = []
+        batch_bytes = 0
+        offset = self._read_offset
+        if offset == segment.size:
+            return batch, offset
+        with open(segment.path, "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            while offset < segment.size:
+                (length,) = _RECORD_HEADER.unpack_from(view, offset)
+                if batch and batch_bytes + length > max_batch_bytes:
+                    break
+                start = offset + _RECORD_HEADER.size
+                batch.append(view[start:start + length])
+                batch_bytes += length
+                offset = start + length
+        return batch, offset
+
+    def _roll(self):
+        if self._writer is not None:
+            self._writer.close()
+        path = os.path.join(self._directory,
+                            f"{self._sequence:020d}{_SEGMENT_SUFFIX}")
+        self._sequence += 1
+        self._writer = open(path, "ab")
+        self._segments.append(_Segment(path))
+
+    def _release_head(self):
+        """Delete the oldest segment once all of its records were read."""
+        if not self._segments:
+            return
+        segment = self._segments.pop(0)
+        if not self._segments and self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        os.remove(segment.path)
+        self._size -= segment.size
+        self._records -= segment.records
+        self._read_records = 0
+        self._read_offset = 0
+
+    def _evict(self):
+        evicted = 0
+        while self._size > self._max_bytes and len(self._segments) > 1:
+            evicted += self._segments[0].records - self._read_records
+            self._release_head()
+        if evicted:
+            self.evicted += evicted
+            logger.warning(f"Evicted {evicted} spilled spans exceeding the "
+                           f"spill limit of {self._max_bytes} bytes")
@@ -0,0 +1,240 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from opentracing.ext import tags as ext_tags
+from . import fork
+from .recorder import SpanRecorder
+from .constants import (
+    DEFAULT_TAIL_DECISION_WAIT_MS,
+    DEFAULT_TAIL_MAX_SPANS,
+    DEFAULT_TAIL_MAX_DECIDED_TRACES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TailSamplingPolicy(ABC):
+    """Decides whether a trace is reported once its spans finished."""
+
+    @abstractmethod
+    def should_sample(self, spans):
+        """
+        :param spans: the finished spans of a trace recorded in this process,
+        in the order they finished.
+        :return: True if the trace should be reported
+        """
+        raise NotImplementedError()
+
+
+class ErrorPolicy(TailSamplingPolicy):
+    """Samples traces with a span tagged as an error."""
+
+    def should_sample(self, spans):
+        return any(span.tags.get(ext_tags.ERROR) in (True, "true")
+                   for span in spans)
+
+
+class LatencyPolicy(TailSamplingPolicy):
+    """Samples traces whose local root span took at least `threshold_ms`."""
+
+    def __init__(self, threshold_ms):
+        self.threshold_seconds = threshold_ms / 1000.0
+
+    def should_sample(self, spans):
+        span_ids = {span.context.span_id for span in spans}
+        return any(span.duration >= self.threshold_seconds
+                   for span in spans
+                   if span.context.parent_id not in span_ids)
+
+
+class OperationNamePolicy(TailSamplingPolicy):
+    """Samples traces with a span of one of the given operations."""
+
+    def __init__(self, operation_names):
+        self.operation_names = frozenset(operation_names)
+
+    def should_sample(self, spans):
+        return any(span.operation_name in self.operation_names
+                   for span in spans)
+
+
+class _BufferedTrace(object):
+    __slots__ = ("spans", "deadline")
+
+    def __init__(self):
+        self.spans = []
+        self.deadline = 0.0
+
+
+class TailSamplingRecorder(SpanRecorder):
+    """Recorder which buffers finished spans by trace id and passes the
+    spans of a trace on to the wrapped recorder only if one of the policies
+    samples the trace.
+
+    A trace is decided when its root span finishes, or once none of its spans
+    finished for `decision_wait_ms`, e.g. when its root span was started by
+    another service. Spans finishing after their trace was decided follow the
+    decision.
+
+    Beyond `max_spans` buffered spans the least recently updated traces are
+    evicted and decided on the spans recorded so far, so memory stays bounded
+    under high traffic.
+    """
+
+    def __init__(self,
+                 recorder,
+                 policies,
+                 decision_wait_ms=DEFAULT_TAIL_DECISION_WAIT_MS,
+                 max_spans=DEFAULT_TAIL_MAX_SPANS,
+                 max_decided_traces=DEFAULT_TAIL_MAX_DECIDED_TRACES):
+        """
+        :param recorder: the recorder reporting the spans of sampled traces
+        :param policies: list of :class:`TailSamplingPolicy`, a trace is
+        sampled if any of them samples it
+        :param decision_wait_ms: time a trace stays buffered after its latest
+        span finished when its root span does not finish in this process
+        :param max_spans: maximum number of buffered spans
+        :param max_decided_traces: number of decisions remembered for spans
+        finishing after their trace was decided
+        """
+        if not policies:
+            raise ValueError("At least one tail sampling policy is required")
+        self._recorder = recorder
+        self._policies = tuple(policies)
+        self._decision_wait_seconds = decision_wait_ms / 1000.0
+        self._max_spans = max_spans
+        self._max_decided_traces = max_decided_traces
+        self._closed = False
+        self._reset()
+        fork.register(self)
+
+    def _reset(self):
+        # least recently updated first, hence also ordered by deadline
+        self._traces = OrderedDict()
+        self._decisions = OrderedDict()
+        self._buffered_spans = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.sampled_traces = 0
+        self.dropped_traces = 0
+        self.evicted_traces = 0
+        self._expirer = threading.Thread(target=self._run,
+                                         name="haystack-tail-sampler",
+                                         daemon=True)
+        if not self._closed:
+            self._expirer.start()
+
+    def _reinit_after_fork(self):
+        # traces buffered by the parent are decided by the parent
+        self._reset()
+
+    def default_scope_manager(self):
+        return self._recorder.default_scope_manager()
+
+    @property
+    def buffered_spans(self):
+        """Number of spans of traces which were not decided yet."""
+        return self._buffered_spans
+
+    def record_span(self, span):
+        if self._closed:
+            return
+        span = span.snapshot()
+        with self._lock:
+            sampled = self._buffer(span)
+        self._forward(sampled)
+
+    def flush(self, timeout=None):
+        """Decide all buffered traces on the spans recorded so far and flush
+        the wrapped recorder."""
+        self._forward(self._decide_all())
+        return self._recorder.flush(timeout)
+
+    def close(self, timeout=None):
+        if self._closed:
+            return True
+        self._closed = True
+        self._stop.set()
+        self._expirer.join()
+        self._forward(self._decide_all())
+        return self._recorder.close(timeout)
+
+    def _buffer(self, span):
+        """Buffer `span` and return the spans to be reported."""
+        trace_id = span.context.trace_id
+        decision = self._decisions.get(trace_id)
+        if decision is not None:
+            return [span] if decision else []
+
+        trace = self._traces.pop(trace_id, None)
+        if trace is None:
+            trace = _BufferedTrace()
+        trace.spans.append(span)
+        self._buffered_spans += 1
+        if span.context.parent_id is None:
+            # children finish before their root, the trace is complete
+            return self._decide(trace_id, trace)
+
+        trace.deadline = time.monotonic() + self._decision_wait_seconds
+        self._traces[trace_id] = trace
+        sampled = []
+        while self._buffered_spans > self._max_spans:
+            trace_id, trace = self._traces.popitem(last=False)
+            self.evicted_traces += 1
+            sampled += self._decide(trace_id, trace)
+        return sampled
+
+    def _decide(self, trace_id, trace):
+        """Decide a trace taken off the buffer, returning its spans if it is
+        sampled."""
+        self._buffered_spans -= len(trace.spans)
+        sampled = False
+        for policy in self._policies:
+            try:
+                sampled = policy.should_sample(trace.spans)
+            except Exception:
+                logger.exception(f"Tail sampling policy {policy} failed")
+            if sampled:
+                break
+
+        self._decisions[trace_id] = sampled
+        if len(self._decisions) > self._max_decided_traces:
+            self._decisions.popitem(last=False)
+        if sampled:
+            self.sampled_traces += 1
+            return trace.spans
+        self.dropped_traces += 1
+        return []
+
+    def _decide_all(self):
+        sampled = []
+        with self._lock:
+            while self._traces:
+                sampled += self._decide(*self._traces.popitem(last=False))
+        return sampled
+
+    def _expire(self):
+        sampled = []
+        now = time.monotonic()
+        with self._lock:
+            while self._traces:
+                trace_id, trace = next(iter(self._traces.items()))
+                if trace.deadline > now:
+                    break
+                del self._traces[trace_id]
+                sampled += self._decide(trace_id, trace)
+        return sampled
+
+    def _forward(self, spans):
+        for span in spans:
+            try:
+                self._recorder.record_span(span)
+            except Exception:
+                logger.exception("Failed to record span")
+
+    def _run(self):
+        interval = max(0.01, self._decision_wait_seconds / 4)
+        while not self._stop.wait(interval):
+            self._forward(self._expire())
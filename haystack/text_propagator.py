@@ -1,10 +1,19 @@
-from .propagator import Propagator, PropagatorOpts
+from .propagator import Propagator, PropagatorOpts, is_case_insensitive
 from .span import SpanContext
 from opentracing import SpanContextCorruptedException
 
 
+# positions of the extracted fields
+_TRACE_ID, _SPAN_ID, _PARENT_ID, _SAMPLED = range(4)
+
+
 class TextPropagator(Propagator):
-    """A propagator for Format.TEXT_MAP and Format.HTTP_HEADERS"""
+    """A propagator for Format.TEXT_MAP and Format.HTTP_HEADERS
+
+    Keys are matched case-insensitively. Case-insensitive header mappings
+    (see CASE_INSENSITIVE_CARRIERS) are looked up directly and only scanned
+    for baggage items, other carriers are scanned once.
+    """
 
     def __init__(self, propagator_opts=None):
         """
@@ -13,45 +22,88 @@ class TextPropagator(Propagator):
         to inject and extract :class:SpanContext from the carrier.
         """
         self._propagator_opts = propagator_opts or PropagatorOpts()
+        opts = self._propagator_opts
+        self._lc_baggage_prefix = opts.baggage_key_prefix.lower()
+        # lowercased key -> position in the extracted fields
+        self._lc_keys = {opts.trace_id_key.lower(): _TRACE_ID,
+                         opts.span_id_key.lower(): _SPAN_ID,
+                         opts.parent_id_key.lower(): _PARENT_ID,
+                         opts.sampled_key.lower(): _SAMPLED}
+        self._keys = (opts.trace_id_key, opts.span_id_key,
+                      opts.parent_id_key, opts.sampled_key)
 
     def inject(self, span_context, carrier):
+        if span_context.trace_id is None:
+            # a sampling decision without a trace, e.g. extracted from b3: 0
+            if span_context.sampled is not None:
+                carrier[self._propagator_opts.sampled_key] = \
+                    "1" if span_context.sampled else "0"
+            return
         carrier[self._propagator_opts.trace_id_key] = span_context.trace_id
         carrier[self._propagator_opts.span_id_key] = span_context.span_id
         carrier[self._propagator_opts.parent_id_key] = span_context.parent_id
+        if span_context.sampled is not None:
+            carrier[self._propagator_opts.sampled_key] = \
+                "1" if span_context.sampled else "0"
         if span_context.baggage is not None:
             for item in span_context.baggage:
                 carrier[self._propagator_opts.baggage_key_prefix + item] = \
                     span_context.baggage[item]
 
     def extract(self, carrier):
-        count = 0
-        baggage = {}
-        parent_id = None
+        if is_case_insensitive(carrier):
+            fields = [carrier.get(key) for key in self._keys]
+            baggage = self._extract_baggage(carrier.keys(), carrier)
+        else:
+            fields, baggage = self._scan(carrier)
+        trace_id, span_id, parent_id, sampled = fields
 
-        for key in carrier:
-            lc_key = key.lower()
-            value = carrier[key]
-            if lc_key == self._propagator_opts.span_id_key.lower():
-                span_id = value
-                count += 1
-            elif lc_key == self._propagator_opts.trace_id_key.lower():
-                trace_id = value
-                count += 1
-            elif lc_key.startswith(
-                    self._propagator_opts.baggage_key_prefix.lower()):
-                baggage[
-                    key[len(self._propagator_opts.baggage_key_prefix):]] = \
-                    value
-            elif lc_key == self._propagator_opts.parent_id_key.lower():
-                parent_id = value
-
-        if count == 0:
+        if trace_id is None and span_id is None:
+            # an upstream decision not to sample, without a trace
+            if sampled is not None and parse_sampled(sampled) is False:
+                return SpanContext(sampled=False)
             return None
-        elif count != 2:
+        elif trace_id is None or span_id is None:
             raise SpanContextCorruptedException(
                 "Both SpanID and TraceID are required")
 
         return SpanContext(span_id=span_id,
                            trace_id=trace_id,
                            parent_id=parent_id,
-                           baggage=baggage)
+                           baggage=baggage,
+                           sampled=None if sampled is None
+                           else parse_sampled(sampled))
+
+    def _scan(self, carrier):
+        fields = [None, None, None, None]
+        baggage = {}
+        lc_keys = self._lc_keys
+        lc_prefix = self._lc_baggage_prefix
+        prefix_length = len(lc_prefix)
+        for key in carrier:
+            lc_key = key.lower()
+            position = lc_keys.get(lc_key)
+            if position is not None:
+                fields[position] = carrier[key]
+            elif lc_key.startswith(lc_prefix):
+                baggage[key[prefix_length:]] = carrier[key]
+        return fields, baggage
+
+    def _extract_baggage(self, keys, carrier):
+        baggage = {}
+        lc_prefix = self._lc_baggage_prefix
+        prefix_length = len(lc_prefix)
+        for key in keys:
+            if key[:prefix_length].lower() == lc_prefix:
+                baggage[key[prefix_length:]] = carrier[key]
+        return baggage
+
+
+def parse_sampled(value):
+    """Parse a propagated sampling decision, None if it is unrecognized."""
+    value = str(value).lower()
+    if value in ("1", "true"):
+        return True
+    if value in ("0", "false"):
+        return False
+    return None
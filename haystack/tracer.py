@@ -1,9 +1,25 @@
-import time
-import uuid
+import atexit
+import logging
+import weakref
+from types import MappingProxyType
 from opentracing import Format, Tracer, UnsupportedFormatException
 from opentracing.scope_managers import ThreadLocalScopeManager
+from . import fork
 from .text_propagator import TextPropagator
-from .span import Span, SpanContext
+from .binary_propagator import BinaryPropagator
+from .recorder import SpanRecorder
+from .span import Span, SpanContext, NonRecordingSpan, UnsynchronizedSpan
+from .id_generator import RandomIdGenerator
+from .sampler import ConstSampler
+from .proto_encoder import EncodedCommonFields
+from .json_encoder import JsonCommonFields
+from .constants import DEFAULT_CLOSE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# tracers still open, closed by an atexit hook so that spans queued by
+# background recorders are reported before the interpreter exits
+_open_tracers = weakref.WeakSet()
 
 
 class HaystackTracer(Tracer):
@@ -13,31 +29,65 @@ class HaystackTracer(Tracer):
                  recorder,
                  scope_manager=None,
                  common_tags=None,
-                 use_shared_spans=False):
+                 use_shared_spans=False,
+                 id_generator=None,
+                 sampler=None,
+                 thread_safe_spans=True,
+                 propagators=None):
         """
         Initialize a Haystack Tracer instance.
         :param service_name: The service name to which all spans will belong.
         :param recorder: The recorder (dispatcher) implementation which handles
         finished spans.
         :param scope_manager: An optional parameter to override the default
-        ThreadLocal scope manager.
+        scope manager of the recorder, ThreadLocal for all but asyncio
+        recorders.
         :param common_tags: An optional dictionary of tags which should be
-        applied to all created spans for this service
+        applied to all created spans for this service. They are copied and
+        encoded once, so later changes to the dictionary are not applied.
         :param use_shared_spans: A boolean indicating whether or not to use
         shared spans. This is when client/server spans share the same span id.
         Default is to use unique span ids.
+        :param id_generator: An optional IdGenerator to override the default
+        generation of random uuid4 trace and span ids.
+        :param sampler: An optional Sampler deciding whether new traces are
+        recorded. Default is to record all traces.
+        :param thread_safe_spans: A boolean indicating whether spans guard
+        their mutations with a per-span lock. Set False when each span is only
+        used by the thread which started it to skip the locking overhead.
+        :param propagators: An optional dictionary of Format to Propagator
+        replacing the default propagators of those formats, e.g. a
+        CompositePropagator of Haystack, W3C and B3 headers for
+        Format.HTTP_HEADERS.
         """
 
-        scope_manager = ThreadLocalScopeManager() if scope_manager is None \
-            else scope_manager
+        if scope_manager is None:
+            scope_manager = recorder.default_scope_manager() \
+                if isinstance(recorder, SpanRecorder) \
+                else ThreadLocalScopeManager()
         super().__init__(scope_manager)
         self._propagators = {}
-        self._common_tags = {} if common_tags is None else common_tags
+        # spans only hold their own tags, the common tags are merged in when
+        # reading span.tags and written from these encodings when serializing
+        self.common_tags = MappingProxyType(dict(common_tags or {}))
+        self.encoded_common_fields = EncodedCommonFields(service_name,
+                                                         self.common_tags)
+        self.json_common_fields = JsonCommonFields(service_name,
+                                                   self.common_tags)
         self.service_name = service_name
         self.recorder = recorder
         self.use_shared_spans = use_shared_spans
+        self.id_generator = RandomIdGenerator() if id_generator is None \
+            else id_generator
+        self.sampler = ConstSampler(True) if sampler is None else sampler
+        self._span_class = Span if thread_safe_spans else UnsynchronizedSpan
         self.register_propagator(Format.TEXT_MAP, TextPropagator())
         self.register_propagator(Format.HTTP_HEADERS, TextPropagator())
+        self.register_propagator(Format.BINARY, BinaryPropagator())
+        for format, propagator in (propagators or {}).items():
+            self.register_propagator(format, propagator)
+        self._closed = False
+        _open_tracers.add(self)
 
     def register_propagator(self, format, propagator):
         """Register a propagator with this Tracer.
@@ -74,7 +124,7 @@ class HaystackTracer(Tracer):
                    start_time=None,
                    ignore_active_span=False):
 
-        start_time = time.time() if start_time is None else start_time
+        fork.reinit_if_forked()
 
         # Check for an existing ctx in `references`
         parent_ctx = None
@@ -90,29 +140,38 @@ class HaystackTracer(Tracer):
             if scope is not None:
                 parent_ctx = scope.span.context
 
-        new_ctx = SpanContext(span_id=format(uuid.uuid4()))
+        if parent_ctx is not None and parent_ctx.sampled is False:
+            # spans of unsampled traces are never reported, so they only need
+            # their parent's context to carry the trace downstream
+            return NonRecordingSpan(self, parent_ctx)
+
+        new_ctx = SpanContext(span_id=self.id_generator.generate_span_id())
         if parent_ctx is not None:
             new_ctx.trace_id = parent_ctx.trace_id
-            if parent_ctx.baggage is not None:
-                new_ctx._baggage = parent_ctx.baggage.copy()
+            new_ctx.sampled = parent_ctx.sampled
+            new_ctx.trace_state = parent_ctx.trace_state
+            # baggage is read-only, so the child shares it until it sets
+            # an item
+            new_ctx._baggage = parent_ctx._baggage
             if self.use_shared_spans:
                 new_ctx.span_id = parent_ctx.span_id
                 new_ctx.parent_id = parent_ctx.parent_id
             else:
                 new_ctx.parent_id = parent_ctx.span_id
         else:
-            new_ctx.trace_id = format(uuid.uuid4())
+            new_ctx.trace_id = self.id_generator.generate_trace_id()
 
-        # Set common tags
-        if self._common_tags:
-            tags = {**self._common_tags, **tags} if tags else \
-                self._common_tags.copy()
+        if new_ctx.sampled is None:
+            new_ctx.sampled = self.sampler.is_sampled(new_ctx.trace_id,
+                                                      operation_name)
+        if not new_ctx.sampled:
+            return NonRecordingSpan(self, new_ctx)
 
-        return Span(self,
-                    operation_name=operation_name,
-                    context=new_ctx,
-                    tags=tags,
-                    start_time=start_time)
+        return self._span_class(self,
+                                operation_name=operation_name,
+                                context=new_ctx,
+                                tags=tags,
+                                start_time=start_time)
 
     def inject(self, span_context, format, carrier):
         if format in self._propagators:
@@ -127,10 +186,45 @@ class HaystackTracer(Tracer):
             raise UnsupportedFormatException()
 
     def record(self, span):
-        self.recorder.record_span(span)
+        if span.context.sampled is not False:
+            self.recorder.record_span(span)
+
+    def flush(self, timeout=None):
+        """Block until the recorder reported every span finished so far.
+
+        :param timeout: maximum number of seconds to wait, None to wait
+        until done.
+        :return: True if all spans were reported before the timeout.
+        """
+        return self.recorder.flush(timeout)
+
+    def close(self, timeout=None):
+        """Flush and close the recorder. Called at interpreter exit, close
+        it explicitly only if no other tracer shares the recorder.
+
+        :param timeout: maximum number of seconds to wait for the flush.
+        :return: True if all spans were reported before the timeout.
+        """
+        if self._closed:
+            return True
+        self._closed = True
+        _open_tracers.discard(self)
+        return self.recorder.close(timeout)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        # the recorder may be shared with other tracers, so it is only
+        # flushed here and closed at interpreter exit
+        self.flush(DEFAULT_CLOSE_TIMEOUT)
+
+
+@atexit.register
+def _close_open_tracers():
+    for tracer in list(_open_tracers):
+        try:
+            tracer.close(DEFAULT_CLOSE_TIMEOUT)
+        except Exception:
+            logger.exception(f"Failed to close the tracer of "
+                             f"{tracer.service_name}")
@@ -0,0 +1,158 @@
+import logging
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from . import fork
+from .recorder import SpanRecorder
+from .proto_encoder import serialize_span
+from .background_recorder import deadline_after, time_left
+from .constants import (
+    DEFAULT_EXPORTER_SOCKET,
+    DEFAULT_SOCKET_RETRY_INTERVAL,
+    DEFAULT_MAX_BATCH_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+# span frames are prefixed with their length as a big endian unsigned int
+FRAME_HEADER = struct.Struct(">I")
+
+
+class UnixSocketRecorder(SpanRecorder):
+    """Recorder writing length-prefixed proto Span frames to the Unix socket
+    of a local haystack-exporter, which batches the spans of all processes
+    on the host and forwards them to the collector or agent.
+
+    Writes never block: frames the socket does not take right away wait in a
+    buffer of up to `max_buffer_bytes`, beyond which spans are dropped and
+    counted in `dropped_spans`. While the exporter is unreachable the
+    recorder reconnects at most every `reconnect_interval_seconds`.
+    """
+
+    def __init__(self,
+                 socket_path=DEFAULT_EXPORTER_SOCKET,
+                 max_buffer_bytes=DEFAULT_MAX_BATCH_BYTES,
+                 reconnect_interval_seconds=DEFAULT_SOCKET_RETRY_INTERVAL):
+        """
+        :param socket_path: path of the exporter's Unix socket
+        :param max_buffer_bytes: upper bound of frames waiting for the socket
+        :param reconnect_interval_seconds: time between connection attempts
+        """
+        self._socket_path = socket_path
+        self._max_buffer_bytes = max_buffer_bytes
+        self._reconnect_interval_seconds = reconnect_interval_seconds
+        self._closed = False
+        self.dropped_spans = 0
+        self._reset()
+        fork.register(self)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._socket = None
+        self._next_connect = 0.0
+        self._buffer = bytearray()
+        # sizes of the frames in the buffer, and bytes sent of the first one
+        self._frame_sizes = deque()
+        self._head_sent = 0
+
+    def _reinit_after_fork(self):
+        # the parent keeps its connection and sends its buffered frames
+        self._reset()
+
+    def record_span(self, span):
+        if self._closed:
+            return
+        try:
+            encoded = serialize_span(span)
+        except Exception:
+            logger.exception("failed to convert span")
+            return
+        frame_size = FRAME_HEADER.size + len(encoded)
+        with self._lock:
+            if len(self._buffer) + frame_size > self._max_buffer_bytes:
+                self.dropped_spans += 1
+            else:
+                self._buffer += FRAME_HEADER.pack(len(encoded))
+                self._buffer += encoded
+                self._frame_sizes.append(frame_size)
+            self._send()
+
+    def flush(self, timeout=None):
+        """Wait until the buffered frames were written to the socket.
+
+        :return: False if the exporter did not take them within `timeout`.
+        """
+        deadline = deadline_after(timeout)
+        while True:
+            with self._lock:
+                if self._send():
+                    return True
+            remaining = time_left(deadline)
+            if remaining == 0.0:
+                return False
+            time.sleep(0.01 if remaining is None else min(0.01, remaining))
+
+    def close(self, timeout=None):
+        self._closed = True
+        flushed = self.flush(timeout)
+        with self._lock:
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+        return flushed
+
+    def _connect(self):
+        now = time.monotonic()
+        if now < self._next_connect:
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            sock.connect(self._socket_path)
+        except OSError as e:
+            sock.close()
+            self._next_connect = now + self._reconnect_interval_seconds
+            logger.warning(f"Failed to connect to the exporter at "
+                           f"{self._socket_path} due to {e}")
+            return False
+        self._socket = sock
+        return True
+
+    def _disconnect(self):
+        self._socket.close()
+        self._socket = None
+        self._next_connect = time.monotonic() + \
+            self._reconnect_interval_seconds
+        if self._head_sent:
+            # the rest of a partially sent frame would corrupt the next
+            # connection's stream
+            del self._buffer[:self._frame_sizes.popleft() - self._head_sent]
+            self._head_sent = 0
+            self.dropped_spans += 1
+
+    def _send(self):
+        """Write as much of the buffer as the socket takes without blocking.
+
+        :return: True if the buffer is empty.
+        """
+        if not self._buffer:
+            return True
+        if self._socket is None and not self._connect():
+            return False
+        try:
+            sent = self._socket.send(self._buffer)
+        except BlockingIOError:
+            return False
+        except OSError as e:
+            logger.warning(f"Lost the connection to the exporter at "
+                           f"{self._socket_path} due to {e}")
+            self._disconnect()
+            return False
+
+        del self._buffer[:sent]
+        self._head_sent += sent
+        while self._frame_sizes and self._head_sent >= self._frame_sizes[0]:
+            self._head_sent -= self._frame_sizes.popleft()
+        return not self._buffer
@@ -1,5 +1,5 @@
 from .span_pb2 import Span, Tag
-from .constants import SECONDS_TO_MICRO
+from .constants import SECONDS_TO_MICRO, MICROS_TO_NANOS
 from types import TracebackType
 import numbers
 import logging
@@ -28,37 +28,106 @@ def logs_as_list(logs):
     return log_list
 
 
+class TypeDispatch(dict):
+    """Maps the exact type of a value to its handler.
+
+    `resolve(value_type)` walks the isinstance chain (including slow ABC
+    checks such as numbers.Integral) only the first time a type is seen;
+    later lookups are a single dict access. At most `max_types` types are
+    cached so dynamically created classes don't grow it without bound.
+    """
+
+    max_types = 256
+
+    def __init__(self, resolve):
+        super().__init__()
+        self._resolve = resolve
+
+    def __missing__(self, value_type):
+        handler = self._resolve(value_type)
+        if len(self) < self.max_types:
+            self[value_type] = handler
+        return handler
+
+
+def _set_string(tag, value):
+    tag.vStr = value
+    tag.type = Tag.STRING
+
+
+def _set_bool(tag, value):
+    tag.vBool = value
+    tag.type = Tag.BOOL
+
+
+def _set_long(tag, value):
+    tag.vLong = value
+    tag.type = Tag.LONG
+
+
+def _set_double(tag, value):
+    tag.vDouble = value
+    tag.type = Tag.DOUBLE
+
+
+def _set_bytes(tag, value):
+    tag.vBytes = value
+    tag.type = Tag.BINARY
+
+
+def _set_dict(tag, value):
+    _set_string(tag, json.dumps(value))
+
+
+def _set_type(tag, value):
+    _set_string(tag, str(value))
+
+
+def _set_traceback(tag, value):
+    _set_string(tag, str(traceback.format_tb(value)))
+
+
+def _set_unsupported(tag, value):
+    logger.error(f"Dropped tag {tag.key} due to "
+                 f"invalid value type of {type(value)}. "
+                 f"Type must be Int, String, Bool, Float, Dict or Bytes")
+    _set_string(tag, f"Unserializable object type: {str(type(value))}")
+
+
+def resolve_tag_value_type(value_type, handlers):
+    """Pick the handler for tag values of `value_type` from `handlers`, a
+    tuple of the string, bool, long, double, bytes, dict, type, traceback
+    and unsupported value handlers, in this order."""
+    string, boolean, long, double, binary, dictionary, class_type, \
+        traceback_type, unsupported = handlers
+    if issubclass(value_type, str):
+        return string
+    if issubclass(value_type, bool):
+        return boolean
+    if issubclass(value_type, numbers.Integral):
+        return long
+    if issubclass(value_type, float):
+        return double
+    if issubclass(value_type, bytes):
+        return binary
+    if issubclass(value_type, dict):
+        return dictionary
+    if issubclass(value_type, type):
+        return class_type
+    if issubclass(value_type, TracebackType):
+        return traceback_type
+    return unsupported
+
+
+_proto_tag_setters = TypeDispatch(
+    lambda value_type: resolve_tag_value_type(
+        value_type, (_set_string, _set_bool, _set_long, _set_double,
+                     _set_bytes, _set_dict, _set_type, _set_traceback,
+                     _set_unsupported)))
+
+
 def set_proto_tag_value(tag, value):
-    if isinstance(value, str):
-        tag.vStr = value
-        tag.type = Tag.STRING
-    elif isinstance(value, bool):
-        tag.vBool = value
-        tag.type = Tag.BOOL
-    elif isinstance(value, numbers.Integral):
-        tag.vLong = value
-        tag.type = Tag.LONG
-    elif isinstance(value, float):
-        tag.vDouble = value
-        tag.type = Tag.DOUBLE
-    elif isinstance(value, bytes):
-        tag.vBytes = value
-        tag.type = Tag.BINARY
-    elif isinstance(value, dict):
-        tag.vStr = json.dumps(value)
-        tag.type = Tag.STRING
-    elif isinstance(value, type):
-        tag.vStr = str(value)
-        tag.type = Tag.STRING
-    elif isinstance(value, TracebackType):
-        tag.vStr = str(traceback.format_tb(value))
-        tag.type = Tag.STRING
-    else:
-        logger.error(f"Dropped tag {tag.key} due to "
-                     f"invalid value type of {type(value)}. "
-                     f"Type must be Int, String, Bool, Float, Dict or Bytes")
-        tag.vStr = f"Unserializable object type: {str(type(value))}"
-        tag.type = Tag.STRING
+    _proto_tag_setters[type(value)](tag, value)
 
 
 def add_proto_tags(span_record, tags):
@@ -84,8 +153,8 @@ def span_to_proto(span):
                        parentSpanId=span.context.parent_id,
                        serviceName=span.tracer.service_name,
                        operationName=span.operation_name,
-                       startTime=int(span.start_time * SECONDS_TO_MICRO),
-                       duration=int(span.duration * SECONDS_TO_MICRO))
+                       startTime=span.start_ns // MICROS_TO_NANOS,
+                       duration=span.duration_ns // MICROS_TO_NANOS)
 
     add_proto_tags(span_record, span.tags)
     add_proto_logs(span_record, span.logs)
@@ -99,13 +168,48 @@ def span_to_json(span):
         "parentSpanId": span.context.parent_id,
         "serviceName": span.tracer.service_name,
         "operationName": span.operation_name,
-        "startTime": int(span.start_time * SECONDS_TO_MICRO),
-        "duration": int(span.duration * SECONDS_TO_MICRO),
+        "startTime": span.start_ns // MICROS_TO_NANOS,
+        "duration": span.duration_ns // MICROS_TO_NANOS,
         "tags": tags_as_list(span.tags),
         "logs": logs_as_list(span.logs)
     }
 
 
+# single byte varints, the common case for lengths and small ints
+_SMALL_VARINTS = tuple(bytes((i,)) for i in range(0x80))
+
+
+def encode_varint(value):
+    """Encode a non-negative int as a protobuf base 128 varint."""
+    if value < 0x80:
+        return _SMALL_VARINTS[value]
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def proto_batch_payload(encoded_spans):
+    """Frame serialized spans as the repeated `spans` field of a Batch.
+
+    Equivalent to Batch(spans=...).SerializeToString() without parsing the
+    spans back into messages.
+    """
+    payload = bytearray()
+    for encoded_span in encoded_spans:
+        payload += b"\x0a"
+        payload += encode_varint(len(encoded_span))
+        payload += encoded_span
+    return bytes(payload)
+
+
+def json_batch_payload(encoded_spans):
+    """Join utf-8 encoded json spans into a single json array."""
+    return b"[" + b",".join(encoded_spans) + b"]"
+
+
 def span_to_string(span):
     record = "Operation="
     record += span.operation_name
@@ -128,8 +232,8 @@ def span_to_string(span):
         record += ", Logs=" + str(logs_as_list(span.logs))
 
     record += ", StartTime="
-    record += str(int(span.start_time * SECONDS_TO_MICRO))
+    record += str(span.start_ns // MICROS_TO_NANOS)
     record += ", Duration="
-    record += str(int(span.duration * SECONDS_TO_MICRO))
+    record += str(span.duration_ns // MICROS_TO_NANOS)
 
     return record
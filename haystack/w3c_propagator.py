@@ -0,0 +1,103 @@
+from opentracing import SpanContextCorruptedException
+from .propagator import (
+    Propagator,
+    find_keys,
+    hex_id,
+    parse_hex_id,
+    uuid_trace_id,
+)
+from .span import SpanContext
+from .constants import TRACEPARENT, TRACESTATE
+
+# traceparent headers have a version, a trace id, a parent (span) id and
+# flags, e.g. 00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01
+_VERSION = "00"
+_TRACEPARENT_LENGTH = 55
+_SAMPLED_FLAG = 0x01
+
+
+def _hex_byte(value):
+    """The value of two hex digits, None if `value` isn't two hex digits."""
+    if len(value) != 2:
+        return None
+    try:
+        return bytes.fromhex(value)[0]
+    except ValueError:
+        return None
+
+
+def _parse_traceparent(traceparent):
+    """The trace id, span id and flags of a traceparent header, None if it
+    is malformed."""
+    fields = traceparent[:_TRACEPARENT_LENGTH].split("-")
+    if len(fields) != 4:
+        return None
+    version, trace_id, span_id, flags = fields
+    if _hex_byte(version) in (None, 0xff):
+        return None
+    # later versions may append fields, which are ignored
+    if len(traceparent) != _TRACEPARENT_LENGTH and (
+            version == _VERSION or traceparent[_TRACEPARENT_LENGTH] != "-"):
+        return None
+    trace_id = parse_hex_id(trace_id, (32,))
+    span_id = parse_hex_id(span_id, (16,))
+    flags = _hex_byte(flags)
+    if trace_id is None or span_id is None or flags is None:
+        return None
+    return trace_id, span_id, flags
+
+
+class W3CPropagator(Propagator):
+    """A propagator for the W3C trace context `traceparent` and `tracestate`
+    headers, as sent by Envoy, Istio and OpenTelemetry instrumented services.
+
+    Trace ids are 32 hex digits on the wire and formatted like uuids in the
+    extracted context, so a trace started by a Haystack service keeps its id.
+    W3C span ids only have 64 bits: the low 16 hex digits of a uuid span id
+    are sent, so list TextPropagator first in a CompositePropagator for
+    Haystack services to link their spans with the full ids. The tracestate
+    header is passed on unchanged in `SpanContext.trace_state`.
+
+    The sampled flag of an extracted traceparent is honored by default, so
+    a trace sampled out upstream, e.g. by a service mesh sampling a small
+    share of requests, is not recorded by Haystack either. Set
+    `ignore_sampled_flag` to leave the decision to the tracer's sampler.
+    """
+
+    _lc_keys = (TRACEPARENT, TRACESTATE)
+
+    def __init__(self, ignore_sampled_flag=False):
+        """
+        :param ignore_sampled_flag: extract contexts without a sampling
+        decision, so the tracer's sampler decides instead of the upstream
+        sampled flag
+        """
+        self._ignore_sampled_flag = ignore_sampled_flag
+
+    def inject(self, span_context, carrier):
+        trace_id = hex_id(span_context.trace_id, 32)
+        span_id = hex_id(span_context.span_id, 16)
+        if trace_id is None or span_id is None:
+            # ids from custom generators that don't fit the header
+            return
+        flags = "01" if span_context.sampled else "00"
+        carrier[TRACEPARENT] = f"{_VERSION}-{trace_id}-{span_id}-{flags}"
+        if span_context.trace_state:
+            carrier[TRACESTATE] = span_context.trace_state
+
+    def extract(self, carrier):
+        traceparent, trace_state = find_keys(carrier, self._lc_keys)
+        if traceparent is None:
+            return None
+        fields = _parse_traceparent(traceparent.strip())
+        if fields is None:
+            raise SpanContextCorruptedException(
+                f"Invalid traceparent header {traceparent!r}")
+        trace_id, span_id, flags = fields
+        sampled = None if self._ignore_sampled_flag \
+            else bool(flags & _SAMPLED_FLAG)
+
+        return SpanContext(trace_id=uuid_trace_id(trace_id),
+                           span_id=span_id,
+                           sampled=sampled,
+                           trace_state=trace_state or None)
@@ -17,20 +17,27 @@ setup(
                       "requests-futures>=0.9.9,<1.0",
                       "protobuf>=3.11.2,<4.0",
                       "grpcio>=1.26.0,<2.0"],
+    extras_require={"asyncio": ["aiohttp>=3.6,<4.0"],
+                    "zstd": ["zstandard>=0.15,<1.0"],
+                    "json": ["orjson>=3.0,<4.0"]},
     tests_require=["mock",
+                   "aiohttp",
+                   "zstandard",
+                   "orjson",
                    "nose",
                    "pytest",
                    "coverage",],
     test_suite="nose.collector",
     classifiers=[
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
         "Operating System :: OS Independent",
         "License :: OSI Approved :: Apache Software License",
     ],
-    python_requires=">=3.5",
+    python_requires=">=3.7",
     keywords=["opentracing", "haystack", "tracing", "microservices", "distributed"],
-    packages=find_packages()
+    packages=find_packages(),
+    entry_points={"console_scripts": [
+        "haystack-exporter = haystack.exporter:main",
+    ]}
 )
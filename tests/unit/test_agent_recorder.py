@@ -0,0 +1,129 @@
+import shutil
+import tempfile
+import unittest
+import threading
+from concurrent import futures
+import grpc
+from haystack import HaystackTracer
+from haystack import BatchingAgentRecorder
+from haystack import HaystackAgentRecorder
+from haystack.agent import spanAgent_pb2, spanAgent_pb2_grpc
+from haystack.spill import SpillQueue
+
+
+class CollectingServicer(spanAgent_pb2_grpc.SpanAgentServicer):
+
+    def __init__(self, expected_spans):
+        self.spans = []
+        self._expected_spans = expected_spans
+        self.done = threading.Event()
+
+    def dispatch(self, request, context):
+        self.spans.append(request)
+        if len(self.spans) >= self._expected_spans:
+            self.done.set()
+        return spanAgent_pb2.DispatchResult(
+            code=spanAgent_pb2.DispatchResult.SUCCESS)
+
+
+def start_agent(servicer, port=0):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    spanAgent_pb2_grpc.add_SpanAgentServicer_to_server(servicer, server)
+    port = server.add_insecure_port(f"localhost:{port}")
+    server.start()
+    return server, port
+
+
+class HaystackAgentRecorderTest(unittest.TestCase):
+
+    def test_span_is_dispatched_to_agent(self):
+        servicer = CollectingServicer(1)
+        server, port = start_agent(servicer)
+        self.addCleanup(server.stop, None)
+        tracer = HaystackTracer("any_service",
+                                HaystackAgentRecorder("localhost", port))
+
+        span = tracer.start_span("any_operation", tags={"count": 3})
+        span.log_kv({"event": "done"})
+        span.finish()
+        self.assertTrue(tracer.close(timeout=5))
+
+        self.assertTrue(servicer.done.is_set())
+        dispatched = servicer.spans[0]
+        self.assertEqual(dispatched.operationName, "any_operation")
+        self.assertEqual(dispatched.tags[0].vLong, 3)
+        self.assertEqual(dispatched.logs[0].fields[0].vStr, "done")
+
+
+class BatchingAgentRecorderTest(unittest.TestCase):
+
+    def test_spans_are_dispatched_to_agent(self):
+        servicer = CollectingServicer(3)
+        server, port = start_agent(servicer)
+        self.addCleanup(server.stop, None)
+        recorder = BatchingAgentRecorder("localhost", port, linger_ms=20)
+        tracer = HaystackTracer("any_service", recorder)
+
+        for i in range(3):
+            tracer.start_span(f"operation-{i}", tags={"i": i}).finish()
+
+        self.assertTrue(servicer.done.wait(5))
+        self.assertEqual(sorted(span.operationName for span in servicer.spans),
+                         ["operation-0", "operation-1", "operation-2"])
+        self.assertEqual(servicer.spans[0].serviceName, "any_service")
+
+    def test_recorder_reconnects_once_agent_is_back(self):
+        unavailable = CollectingServicer(1)
+        server, port = start_agent(unavailable)
+        server.stop(None).wait()
+        recorder = BatchingAgentRecorder("localhost", port,
+                                         timeout_seconds=1,
+                                         reconnect_timeout_seconds=0.5,
+                                         linger_ms=20)
+        tracer = HaystackTracer("any_service", recorder)
+
+        tracer.start_span("before-restart").finish()
+        servicer = CollectingServicer(1)
+        server, _ = start_agent(servicer, port)
+        self.addCleanup(server.stop, None)
+        for _ in range(50):
+            tracer.start_span("after-restart").finish()
+            if servicer.done.wait(0.2):
+                break
+
+        self.assertTrue(servicer.done.is_set())
+
+    def test_spans_spilled_while_agent_is_down_are_replayed(self):
+        unavailable = CollectingServicer(1)
+        server, port = start_agent(unavailable)
+        server.stop(None).wait()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        spill = SpillQueue(directory)
+        recorder = BatchingAgentRecorder("localhost", port,
+                                         timeout_seconds=1,
+                                         reconnect_timeout_seconds=0.2,
+                                         linger_ms=10,
+                                         spill_queue=spill)
+        tracer = HaystackTracer("any_service", recorder)
+
+        tracer.start_span("first").finish()
+        tracer.start_span("second").finish()
+        self.assertFalse(tracer.flush())
+        self.assertEqual(len(spill), 2)
+
+        servicer = CollectingServicer(2)
+        server, _ = start_agent(servicer, port)
+        self.addCleanup(server.stop, None)
+        for _ in range(50):
+            if tracer.flush():
+                break
+
+        self.assertEqual(sorted(span.operationName
+                                for span in servicer.spans),
+                         ["first", "second"])
+        tracer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
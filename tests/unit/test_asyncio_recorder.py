@@ -0,0 +1,150 @@
+import asyncio
+import gzip
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from opentracing.scope_managers.contextvars import ContextVarsScopeManager
+from haystack import HaystackTracer
+from haystack import AsyncioHttpRecorder
+from haystack.asyncio_recorder import _SpanQueue
+from haystack.constants import GZIP, DROP_OLDEST
+
+
+class CollectorStandIn(object):
+    """Local http server standing in for the haystack collector"""
+
+    def __init__(self):
+        self.payloads = []
+        self.encodings = []
+        self.received = threading.Event()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                stand_in.payloads.append(self.rfile.read(length))
+                stand_in.encodings.append(self.headers["Content-Encoding"])
+                stand_in.received.set()
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("localhost", 0), Handler)
+        self.url = f"http://localhost:{self._server.server_port}/span"
+        threading.Thread(target=self._server.serve_forever,
+                         args=(0.05,),
+                         daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class AsyncioHttpRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collector = CollectorStandIn()
+        self.addCleanup(self.collector.stop)
+
+    def test_tracer_pairs_recorder_with_contextvars_scope_manager(self):
+        tracer = HaystackTracer("any_service",
+                                AsyncioHttpRecorder(self.collector.url))
+
+        self.assertIsInstance(tracer.scope_manager, ContextVarsScopeManager)
+
+    def test_spans_finished_in_coroutines_are_posted_in_a_batch(self):
+        recorder = AsyncioHttpRecorder(self.collector.url,
+                                       use_json_payload=True,
+                                       linger_ms=20)
+        tracer = HaystackTracer("any_service", recorder)
+
+        async def handle_request(name):
+            with tracer.start_active_span(name) as scope:
+                await asyncio.sleep(0.01)
+                with tracer.start_active_span(f"{name}-child"):
+                    await asyncio.sleep(0.01)
+                return scope.span.context.span_id
+
+        async def main():
+            ids = await asyncio.gather(handle_request("a"),
+                                       handle_request("b"))
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.collector.received.wait, 5)
+            return ids
+
+        root_ids = asyncio.run(main())
+
+        spans = json.loads(self.collector.payloads[0])
+        parents = {span["operationName"]: span["parentSpanId"]
+                   for span in spans}
+        self.assertEqual(len(spans), 4)
+        self.assertEqual(parents["a-child"], root_ids[0])
+        self.assertEqual(parents["b-child"], root_ids[1])
+
+    def test_aflush_posts_spans_without_waiting_for_linger(self):
+        recorder = AsyncioHttpRecorder(self.collector.url, linger_ms=60000)
+        tracer = HaystackTracer("any_service", recorder)
+
+        async def main():
+            tracer.start_span("any_operation").finish()
+            await recorder.aflush()
+            await recorder.aclose()
+
+        asyncio.run(main())
+
+        self.assertEqual(len(self.collector.payloads), 1)
+
+    def test_drop_oldest_never_evicts_flush_markers(self):
+        recorder = AsyncioHttpRecorder(self.collector.url,
+                                       max_queue_size=2,
+                                       drop_policy=DROP_OLDEST)
+
+        async def main():
+            recorder._queue = _SpanQueue(maxsize=2)
+            marker = asyncio.Event()
+            recorder._queue.put_nowait(marker)
+            for span in ("a", "b", "c"):
+                recorder._enqueue(span)
+            return marker, [recorder._queue.get_nowait(),
+                            recorder._queue.get_nowait()]
+
+        marker, queued = asyncio.run(main())
+
+        self.assertEqual(queued, [marker, "c"])
+        self.assertEqual(recorder.dropped_spans, 2)
+
+    def test_close_posts_spans_left_on_a_stopped_event_loop(self):
+        recorder = AsyncioHttpRecorder(self.collector.url, linger_ms=60000)
+        tracer = HaystackTracer("any_service", recorder)
+
+        async def main():
+            tracer.start_span("any_operation").finish()
+
+        asyncio.run(main())
+        self.assertTrue(tracer.close(timeout=5))
+
+        self.assertEqual(len(self.collector.payloads), 1)
+
+    def test_batches_are_compressed_above_threshold(self):
+        recorder = AsyncioHttpRecorder(self.collector.url,
+                                       use_json_payload=True,
+                                       compression=GZIP,
+                                       compression_min_bytes=0)
+        tracer = HaystackTracer("any_service", recorder)
+
+        async def main():
+            tracer.start_span("any_operation").finish()
+            await recorder.aclose()
+
+        asyncio.run(main())
+
+        self.assertEqual(self.collector.encodings, [GZIP])
+        spans = json.loads(gzip.decompress(self.collector.payloads[0]))
+        self.assertEqual(spans[0]["operationName"], "any_operation")
+
+
+if __name__ == "__main__":
+    unittest.main()
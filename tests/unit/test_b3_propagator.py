@@ -0,0 +1,135 @@
+import unittest
+from opentracing import SpanContextCorruptedException
+from haystack.b3_propagator import B3Propagator
+from haystack.span import SpanContext
+from haystack.constants import (
+    B3,
+    B3_TRACE_ID,
+    B3_SPAN_ID,
+    B3_PARENT_SPAN_ID,
+    B3_SAMPLED,
+    B3_FLAGS,
+)
+
+UUID_CONTEXT = SpanContext(trace_id="9c5a3b52-2f9e-4bb0-9a53-1e47ca1b6a10",
+                           span_id="0d4b8e6c-42c0-4d0e-8f7c-3c2d25d0a4c1",
+                           parent_id="6f1e0d36-0f52-4c55-b5d6-8d2f6f7f0a3e",
+                           sampled=True)
+
+
+class B3PropagatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.propagator = B3Propagator()
+
+    def test_multiple_headers_are_injected_and_extracted(self):
+        carrier = {}
+
+        self.propagator.inject(UUID_CONTEXT, carrier)
+        ctx = self.propagator.extract(carrier)
+
+        self.assertEqual(carrier, {
+            B3_TRACE_ID: "9c5a3b522f9e4bb09a531e47ca1b6a10",
+            B3_SPAN_ID: "8f7c3c2d25d0a4c1",
+            B3_PARENT_SPAN_ID: "b5d68d2f6f7f0a3e",
+            B3_SAMPLED: "1",
+        })
+        self.assertEqual(ctx.trace_id, UUID_CONTEXT.trace_id)
+        self.assertEqual(ctx.span_id, "8f7c3c2d25d0a4c1")
+        self.assertEqual(ctx.parent_id, "b5d68d2f6f7f0a3e")
+        self.assertTrue(ctx.sampled)
+
+    def test_single_header_is_injected_and_extracted(self):
+        propagator = B3Propagator(single_header=True)
+        carrier = {}
+
+        propagator.inject(UUID_CONTEXT, carrier)
+        ctx = propagator.extract(carrier)
+
+        self.assertEqual(carrier, {B3: "9c5a3b522f9e4bb09a531e47ca1b6a10-"
+                                       "8f7c3c2d25d0a4c1-1-b5d68d2f6f7f0a3e"})
+        self.assertEqual(ctx.trace_id, UUID_CONTEXT.trace_id)
+        self.assertEqual(ctx.parent_id, "b5d68d2f6f7f0a3e")
+        self.assertTrue(ctx.sampled)
+
+    def test_64_bit_trace_ids_are_padded(self):
+        carrier = {B3: "80f198ee56343ba8-e457b5a2e4d86bd1-d"}
+
+        ctx = self.propagator.extract(carrier)
+
+        self.assertEqual(ctx.trace_id, "00000000-0000-0000-80f1-98ee56343ba8")
+        self.assertEqual(ctx.span_id, "e457b5a2e4d86bd1")
+        self.assertTrue(ctx.sampled)
+
+    def test_single_header_takes_precedence(self):
+        carrier = {B3: "80f198ee56343ba8-e457b5a2e4d86bd1",
+                   B3_TRACE_ID: "0000000000000001",
+                   B3_SPAN_ID: "0000000000000002"}
+
+        ctx = self.propagator.extract(carrier)
+
+        self.assertEqual(ctx.span_id, "e457b5a2e4d86bd1")
+        self.assertIsNone(ctx.sampled)
+
+    def test_debug_flag_samples_the_trace(self):
+        carrier = {"x-b3-traceid": "80f198ee56343ba8",
+                   "x-b3-spanid": "e457b5a2e4d86bd1",
+                   "x-b3-sampled": "0",
+                   B3_FLAGS.lower(): "1"}
+
+        self.assertTrue(self.propagator.extract(carrier).sampled)
+
+    def test_deny_without_ids_returns_unsampled_context(self):
+        for carrier in ({B3: "0"}, {B3_SAMPLED: "0"}):
+            with self.subTest(carrier=carrier):
+                ctx = self.propagator.extract(carrier)
+
+                self.assertIs(ctx.sampled, False)
+                self.assertIsNone(ctx.trace_id)
+                self.assertIsNone(ctx.span_id)
+
+    def test_accept_without_ids_returns_none(self):
+        self.assertIsNone(self.propagator.extract({B3: "1"}))
+        self.assertIsNone(self.propagator.extract({B3_SAMPLED: "1"}))
+
+    def test_deny_without_ids_is_injected(self):
+        ctx = self.propagator.extract({B3: "0"})
+        multiple = {}
+        single = {}
+
+        self.propagator.inject(ctx, multiple)
+        B3Propagator(single_header=True).inject(ctx, single)
+
+        self.assertEqual(multiple, {B3_SAMPLED: "0"})
+        self.assertEqual(single, {B3: "0"})
+
+    def test_sampled_flags_can_be_ignored(self):
+        propagator = B3Propagator(ignore_sampled_flag=True)
+
+        for carrier in ({B3: "80f198ee56343ba8-e457b5a2e4d86bd1-0"},
+                        {B3_TRACE_ID: "80f198ee56343ba8",
+                         B3_SPAN_ID: "e457b5a2e4d86bd1", B3_SAMPLED: "0"},
+                        {B3_TRACE_ID: "80f198ee56343ba8",
+                         B3_SPAN_ID: "e457b5a2e4d86bd1", B3_FLAGS: "1"}):
+            with self.subTest(carrier=carrier):
+                ctx = propagator.extract(carrier)
+
+                self.assertEqual(ctx.span_id, "e457b5a2e4d86bd1")
+                self.assertIsNone(ctx.sampled)
+        self.assertIsNone(propagator.extract({B3: "0"}))
+
+    def test_malformed_headers_throw_exception(self):
+        for carrier in ({B3_TRACE_ID: "80f198ee56343ba8"},
+                        {B3_TRACE_ID: "80f198ee5634", B3_SPAN_ID: "e457b5a2e4d86bd1"},
+                        {B3_TRACE_ID: "80f198ee56343ba8", B3_SPAN_ID: "e457b5a2e4d86bd1",
+                         B3_PARENT_SPAN_ID: "not-hex"},
+                        {B3: "80f198ee56343ba8-e457b5a2e4d86bd1-x"},
+                        {B3: "80f198ee56343ba8-0000000000000000-1"},
+                        {B3: "80f198ee56343ba8-e457b5a2e4d86bd1-1-a-b"}):
+            with self.subTest(carrier=carrier):
+                self.assertRaises(SpanContextCorruptedException,
+                                  self.propagator.extract, carrier)
+
+
+if __name__ == "__main__":
+    unittest.main()
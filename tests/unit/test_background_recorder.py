@@ -0,0 +1,241 @@
+import unittest
+import threading
+from unittest import mock
+from haystack import HaystackTracer
+from haystack.background_recorder import (
+    BoundedSpanQueue,
+    BatchingSpanRecorder,
+    DeferredRecorder,
+    FlushMarker,
+)
+from haystack.recorder import SpanRecorder, NoopRecorder
+from haystack.span import SpanSnapshot
+from haystack.constants import DROP_NEWEST, DROP_OLDEST
+
+
+class FakeSpan(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def snapshot(self):
+        return self.name
+
+
+class ThreadCapturingRecorder(SpanRecorder):
+
+    def __init__(self):
+        self.spans = []
+        self.threads = []
+        self.recorded = threading.Event()
+
+    def record_span(self, span):
+        self.spans.append(span)
+        self.threads.append(threading.current_thread())
+        self.recorded.set()
+
+
+class CollectingRecorder(BatchingSpanRecorder):
+
+    def __init__(self, expected_spans, **kwargs):
+        self.batches = []
+        self._expected_spans = expected_spans
+        self._received = 0
+        self.done = threading.Event()
+        super().__init__(**kwargs)
+
+    def encode_span(self, span):
+        return span.encode("utf-8")
+
+    def send_batch(self, encoded_spans):
+        self.batches.append(encoded_spans)
+        self._received += len(encoded_spans)
+        if self._received >= self._expected_spans:
+            self.done.set()
+
+
+class BoundedSpanQueueTest(unittest.TestCase):
+
+    def test_drop_newest_discards_incoming_item_when_full(self):
+        q = BoundedSpanQueue(max_size=2, drop_policy=DROP_NEWEST)
+
+        self.assertTrue(q.put("a"))
+        self.assertTrue(q.put("b"))
+        self.assertFalse(q.put("c"))
+
+        self.assertEqual(q.dropped, 1)
+        self.assertEqual([q.get(), q.get()], ["a", "b"])
+
+    def test_drop_oldest_evicts_head_when_full(self):
+        q = BoundedSpanQueue(max_size=2, drop_policy=DROP_OLDEST)
+
+        q.put("a")
+        q.put("b")
+        self.assertTrue(q.put("c"))
+
+        self.assertEqual(q.dropped, 1)
+        self.assertEqual([q.get(), q.get()], ["b", "c"])
+
+    def test_drop_oldest_never_evicts_flush_markers(self):
+        q = BoundedSpanQueue(max_size=2, drop_policy=DROP_OLDEST)
+        marker = FlushMarker()
+
+        q.put(marker)
+        q.put("a")
+        self.assertTrue(q.put("b"))
+        self.assertEqual([q.get(), q.get()], [marker, "b"])
+
+        q.put(marker)
+        q.put(marker)
+        self.assertFalse(q.put("c"))
+        self.assertEqual(q.dropped, 2)
+
+    def test_unknown_drop_policy_is_rejected(self):
+        self.assertRaises(ValueError, BoundedSpanQueue, 1, "drop_everything")
+
+
+class BatchingSpanRecorderTest(unittest.TestCase):
+
+    def test_spans_are_sent_in_order_once_linger_expires(self):
+        recorder = CollectingRecorder(3, linger_ms=50)
+
+        for span in ("a", "b", "c"):
+            recorder.record_span(FakeSpan(span))
+
+        self.assertTrue(recorder.done.wait(5))
+        sent = [span for batch in recorder.batches for span in batch]
+        self.assertEqual(sent, [b"a", b"b", b"c"])
+
+    def test_batches_are_split_by_max_batch_bytes(self):
+        recorder = CollectingRecorder(4, max_batch_bytes=4, linger_ms=50)
+
+        for span in ("aa", "bb", "cc", "dd"):
+            recorder.record_span(FakeSpan(span))
+
+        self.assertTrue(recorder.done.wait(5))
+        for batch in recorder.batches:
+            self.assertLessEqual(sum(len(span) for span in batch), 4)
+
+    def test_flush_sends_pending_batch_without_waiting_for_linger(self):
+        recorder = CollectingRecorder(2, linger_ms=60000)
+
+        recorder.record_span(FakeSpan("a"))
+        recorder.record_span(FakeSpan("b"))
+
+        self.assertTrue(recorder.flush(timeout=5))
+        self.assertEqual(recorder.batches, [[b"a", b"b"]])
+
+    def test_close_stops_flusher_and_drops_later_spans(self):
+        recorder = CollectingRecorder(1, linger_ms=60000)
+        recorder.record_span(FakeSpan("a"))
+
+        self.assertTrue(recorder.close(timeout=5))
+        recorder.record_span(FakeSpan("b"))
+
+        self.assertFalse(recorder._flusher.is_alive())
+        self.assertEqual(recorder.batches, [[b"a"]])
+        self.assertTrue(recorder.close(timeout=5))
+
+    def test_flush_returns_when_queue_overflows_behind_its_marker(self):
+        sending = threading.Event()
+        release = threading.Event()
+
+        class BusyRecorder(CollectingRecorder):
+            def send_batch(self, encoded_spans):
+                sending.set()
+                release.wait(5)
+                super().send_batch(encoded_spans)
+
+        recorder = BusyRecorder(2, max_queue_size=2, linger_ms=0,
+                                drop_policy=DROP_OLDEST)
+        recorder.record_span(FakeSpan("a"))
+        self.assertTrue(sending.wait(5))
+
+        flush = threading.Thread(target=recorder.flush)
+        flush.start()
+        while not len(recorder._queue):
+            flush.join(0.001)
+        for span in ("b", "c", "d"):
+            recorder.record_span(FakeSpan(span))
+        release.set()
+
+        flush.join(5)
+        self.assertFalse(flush.is_alive())
+        self.assertEqual(recorder.dropped_spans, 2)
+        self.assertTrue(recorder.close(timeout=5))
+        self.assertEqual(recorder.batches, [[b"a"], [b"d"]])
+
+    def test_flush_after_close_returns_at_once(self):
+        recorder = CollectingRecorder(1, linger_ms=60000)
+        self.assertTrue(recorder.close(timeout=5))
+
+        self.assertTrue(recorder.flush())
+
+    def test_unencodable_spans_are_skipped(self):
+        recorder = CollectingRecorder(1, linger_ms=50)
+
+        recorder.record_span(FakeSpan(None))
+        recorder.record_span(FakeSpan("a"))
+
+        self.assertTrue(recorder.done.wait(5))
+        self.assertEqual(recorder.batches, [[b"a"]])
+
+
+class DeferredRecorderTest(unittest.TestCase):
+
+    def test_snapshot_is_recorded_on_background_worker(self):
+        delegate = ThreadCapturingRecorder()
+        tracer = HaystackTracer("any_service", DeferredRecorder(delegate))
+
+        span = tracer.start_span("any_operation", tags={"a": "tag"})
+        span.finish()
+
+        self.assertTrue(delegate.recorded.wait(5))
+        snapshot = delegate.spans[0]
+        self.assertIsInstance(snapshot, SpanSnapshot)
+        self.assertEqual(snapshot.operation_name, "any_operation")
+        self.assertEqual(snapshot.tags, span.tags)
+        self.assertEqual(snapshot.duration, span.duration)
+        self.assertIsNot(delegate.threads[0], threading.current_thread())
+
+    def test_flush_and_close_drain_worker_then_delegate(self):
+        delegate = mock.Mock(spec=SpanRecorder)
+        delegate.flush.return_value = True
+        delegate.close.return_value = True
+        recorder = DeferredRecorder(delegate)
+        tracer = HaystackTracer("any_service", recorder)
+
+        tracer.start_span("any_operation").finish()
+        self.assertTrue(recorder.flush(timeout=5))
+        delegate.record_span.assert_called_once()
+        delegate.flush.assert_called_once()
+
+        self.assertTrue(tracer.close(timeout=5))
+        delegate.close.assert_called_once()
+
+    def test_flush_after_close_returns_at_once(self):
+        recorder = DeferredRecorder(NoopRecorder())
+        tracer = HaystackTracer("any_service", recorder)
+        self.assertTrue(tracer.close(timeout=5))
+
+        self.assertTrue(recorder.flush())
+        with tracer:
+            pass
+
+    def test_finish_records_without_holding_the_span_lock(self):
+        class ReentrantRecorder(SpanRecorder):
+            def record_span(self, span):
+                span.get_baggage_item("any")
+
+        tracer = HaystackTracer("any_service", ReentrantRecorder())
+        finisher = threading.Thread(
+            target=lambda: tracer.start_span("any_operation").finish())
+
+        finisher.start()
+        finisher.join(5)
+
+        self.assertFalse(finisher.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
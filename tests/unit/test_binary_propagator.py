@@ -0,0 +1,156 @@
+import random
+import unittest
+from opentracing import (
+    Format,
+    InvalidCarrierException,
+    SpanContextCorruptedException,
+)
+from haystack import HaystackTracer
+from haystack.binary_propagator import BinaryPropagator
+from haystack.recorder import NoopRecorder
+from haystack.span import SpanContext
+
+
+class BinaryPropagatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.propagator = BinaryPropagator()
+
+    def round_trip(self, span_context):
+        carrier = bytearray()
+        self.propagator.inject(span_context, carrier)
+        return carrier, self.propagator.extract(carrier)
+
+    def test_context_is_injected_and_extracted(self):
+        span_context = SpanContext(
+            trace_id="9c5a3b52-2f9e-4bb0-9a53-1e47ca1b6a10",
+            span_id="0d4b8e6c-42c0-4d0e-8f7c-3c2d25d0a4c1",
+            parent_id="6f1e0d36-0f52-4c55-b5d6-8d2f6f7f0a3e",
+            baggage={"Item1": "Value1", "ünïcode": "välue"},
+            sampled=True)
+
+        carrier, ctx = self.round_trip(span_context)
+
+        self.assertEqual(ctx.trace_id, span_context.trace_id)
+        self.assertEqual(ctx.span_id, span_context.span_id)
+        self.assertEqual(ctx.parent_id, span_context.parent_id)
+        self.assertDictEqual(ctx.baggage, span_context.baggage)
+        self.assertTrue(ctx.sampled)
+
+    def test_uuid_ids_are_stored_as_raw_bytes(self):
+        span_context = SpanContext(
+            trace_id="9c5a3b52-2f9e-4bb0-9a53-1e47ca1b6a10",
+            span_id="12345678-1234-1234-1234-123456789012")
+
+        carrier, _ = self.round_trip(span_context)
+
+        # version, flags, two raw ids and the baggage count
+        self.assertEqual(len(carrier), 2 + 16 + 16 + 1)
+
+    def test_other_ids_are_extracted_unchanged(self):
+        for trace_id in ("1212", "9C5A3B52-2F9E-4BB0-9A53-1E47CA1B6A10",
+                         "not-a-uuid-but-36-characters-long!!!"):
+            _, ctx = self.round_trip(SpanContext(trace_id=trace_id,
+                                                 span_id="1234"))
+
+            self.assertEqual(ctx.trace_id, trace_id)
+            self.assertEqual(ctx.span_id, "1234")
+            self.assertIsNone(ctx.parent_id)
+            self.assertIsNone(ctx.sampled)
+
+    def test_sampling_decision_is_injected_and_extracted(self):
+        for sampled in (True, False, None):
+            _, ctx = self.round_trip(SpanContext(trace_id="1212",
+                                                 span_id="1234",
+                                                 sampled=sampled))
+
+            self.assertIs(ctx.sampled, sampled)
+
+    def test_decision_not_to_sample_without_trace_round_trips(self):
+        carrier, ctx = self.round_trip(SpanContext(sampled=False))
+
+        self.assertEqual(len(carrier), 2)
+        self.assertIs(ctx.sampled, False)
+        self.assertIsNone(ctx.trace_id)
+        self.assertIsNone(ctx.span_id)
+        self.assertRaises(SpanContextCorruptedException,
+                          self.propagator.extract, carrier + b"\x00")
+        self.assertEqual(self.round_trip(SpanContext())[0], bytearray())
+
+    def test_empty_carrier_returns_none(self):
+        self.assertIsNone(self.propagator.extract(bytearray()))
+
+    def test_carrier_must_be_a_bytearray(self):
+        self.assertRaises(InvalidCarrierException, self.propagator.inject,
+                          SpanContext(trace_id="1212", span_id="1234"), {})
+        self.assertRaises(InvalidCarrierException, self.propagator.extract,
+                          "not bytes")
+
+    def test_unknown_version_throws_exception(self):
+        carrier, _ = self.round_trip(SpanContext(trace_id="1212",
+                                                 span_id="1234"))
+        carrier[0] = 2
+
+        self.assertRaises(SpanContextCorruptedException,
+                          self.propagator.extract, carrier)
+
+    def test_truncated_context_throws_exception(self):
+        carrier, _ = self.round_trip(SpanContext(
+            trace_id="9c5a3b52-2f9e-4bb0-9a53-1e47ca1b6a10",
+            span_id="1234",
+            parent_id="4321",
+            baggage={"Item1": "Value1"}))
+
+        for length in range(1, len(carrier)):
+            with self.subTest(length=length):
+                self.assertRaises(SpanContextCorruptedException,
+                                  self.propagator.extract, carrier[:length])
+        self.assertRaises(SpanContextCorruptedException,
+                          self.propagator.extract, carrier + b"\x00")
+
+    def test_corrupted_context_is_extracted_or_rejected(self):
+        carrier, _ = self.round_trip(SpanContext(
+            trace_id="9c5a3b52-2f9e-4bb0-9a53-1e47ca1b6a10",
+            span_id="1234",
+            parent_id="4321",
+            baggage={"Item1": "Value1", "Item2": "Value2"},
+            sampled=True))
+        rng = random.Random(42)
+
+        for _ in range(5000):
+            corrupted = bytearray(carrier)
+            for _ in range(rng.randint(1, 4)):
+                corrupted[rng.randrange(len(corrupted))] = rng.randrange(256)
+            try:
+                ctx = self.propagator.extract(corrupted)
+            except SpanContextCorruptedException:
+                continue
+            self.assertIsInstance(ctx, SpanContext)
+
+    def test_random_bytes_are_extracted_or_rejected(self):
+        rng = random.Random(7)
+
+        for _ in range(5000):
+            data = bytes([1]) + bytes(rng.randrange(256)
+                                      for _ in range(rng.randint(0, 40)))
+            try:
+                self.propagator.extract(data)
+            except SpanContextCorruptedException:
+                pass
+
+    def test_tracer_propagates_binary_format(self):
+        tracer = HaystackTracer("any_service", NoopRecorder())
+        span = tracer.start_span("any_operation")
+        span.set_baggage_item("user", "42")
+        carrier = bytearray()
+
+        tracer.inject(span.context, Format.BINARY, carrier)
+        ctx = tracer.extract(Format.BINARY, carrier)
+
+        self.assertEqual(ctx.trace_id, span.context.trace_id)
+        self.assertEqual(ctx.span_id, span.context.span_id)
+        self.assertEqual(ctx.baggage, {"user": "42"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import time
+import unittest
+from unittest import mock
+from haystack import HaystackTracer
+from haystack import clock
+from haystack.recorder import NoopRecorder
+from haystack.constants import CLOCK_ANCHOR_INTERVAL_NS
+from haystack.util import span_to_proto
+
+
+class ClockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = HaystackTracer("any_service", NoopRecorder())
+
+    def test_start_time_is_close_to_wall_clock(self):
+        span = self.tracer.start_span("any_operation")
+
+        self.assertIsInstance(span.start_ns, int)
+        self.assertAlmostEqual(span.start_time, time.time(), delta=1.0)
+
+    def test_duration_is_measured_on_monotonic_clock(self):
+        readings = iter([5000, 7500])
+        with mock.patch.object(clock, "_anchor", (10 ** 18, 5000)), \
+                mock.patch("haystack.span.monotonic_ns",
+                           lambda: next(readings)), \
+                mock.patch.object(time, "time_ns", return_value=0):
+            span = self.tracer.start_span("any_operation")
+            span.finish()
+
+        self.assertEqual(span.start_ns, 10 ** 18)
+        self.assertEqual(span.duration_ns, 2500)
+
+    def test_anchor_is_renewed_after_interval(self):
+        anchor = (10 ** 18, 0)
+        later = CLOCK_ANCHOR_INTERVAL_NS + 1
+        with mock.patch.object(clock, "_anchor", anchor), \
+                mock.patch.object(clock, "monotonic_ns",
+                                  return_value=later), \
+                mock.patch.object(time, "time_ns", return_value=42):
+            self.assertEqual(clock.wall_ns(CLOCK_ANCHOR_INTERVAL_NS), anchor[0]
+                             + CLOCK_ANCHOR_INTERVAL_NS)
+            self.assertEqual(clock.wall_ns(later), 42)
+            self.assertEqual(clock.wall_ns(later + 8), 50)
+
+    def test_explicit_times_are_converted_exactly(self):
+        span = self.tracer.start_span("any_operation",
+                                      start_time=1600000000.000125)
+        span.finish(finish_time=1600000000.000375)
+
+        self.assertEqual(span.duration_ns, 250000)
+        self.assertEqual(span_to_proto(span).startTime, 1600000000000125)
+        self.assertEqual(span_to_proto(span).duration, 250)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import gzip
+import unittest
+import zlib
+from haystack.compression import get_compressor
+from haystack.constants import GZIP, DEFLATE, ZSTD
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PAYLOAD = b'{"operationName": "any_operation", "tags": []}' * 20
+
+
+class GetCompressorTest(unittest.TestCase):
+
+    def test_gzip_payload_round_trips(self):
+        compressed = get_compressor(GZIP)(PAYLOAD)
+
+        self.assertLess(len(compressed), len(PAYLOAD))
+        self.assertEqual(gzip.decompress(compressed), PAYLOAD)
+
+    def test_gzip_payload_is_reproducible(self):
+        compressor = get_compressor(GZIP, level=1)
+        compressed = compressor(PAYLOAD)
+
+        self.assertEqual(compressed[4:8], b"\x00\x00\x00\x00")
+        self.assertEqual(compressor(PAYLOAD), compressed)
+        self.assertEqual(gzip.decompress(compressed), PAYLOAD)
+
+    def test_deflate_payload_is_zlib_format(self):
+        compressed = get_compressor(DEFLATE, level=1)(PAYLOAD)
+
+        self.assertEqual(zlib.decompress(compressed), PAYLOAD)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_payload_round_trips(self):
+        compressed = get_compressor(ZSTD)(PAYLOAD)
+
+        self.assertEqual(zstandard.ZstdDecompressor().decompress(compressed),
+                         PAYLOAD)
+
+    def test_unknown_compression_is_rejected(self):
+        with self.assertRaises(ValueError):
+            get_compressor("br")
+
+
+if __name__ == "__main__":
+    unittest.main()
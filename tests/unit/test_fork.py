@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+from haystack import HaystackTracer
+from haystack import BatchingHttpRecorder
+from haystack import fork
+from haystack.ring_buffer import (
+    SharedMemoryRing,
+    RingBufferRecorder,
+    RingBufferExporter,
+)
+from tests.unit.test_asyncio_recorder import CollectorStandIn
+
+
+def run_in_child(function):
+    """Run `function` in a forked child, returning its exit status."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os._exit(0 if function() else 1)
+        except BaseException:
+            os._exit(2)
+    return os.WEXITSTATUS(os.waitpid(pid, 0)[1])
+
+
+class ForkRegistryTest(unittest.TestCase):
+
+    def test_objects_are_reinitialized_in_creation_order(self):
+        calls = []
+
+        class Component(object):
+            def __init__(self, name):
+                self.name = name
+                fork.register(self)
+
+            def _reinit_after_fork(self):
+                calls.append(self.name)
+
+        with mock.patch.object(fork, "_registered", {}), \
+                mock.patch.object(fork, "_pid", -1):
+            components = [Component("queue"), Component("recorder")]
+            fork.reinit_if_forked()
+            fork.reinit_if_forked()
+
+        self.assertEqual(calls, ["queue", "recorder"])
+        self.assertEqual(len(components), 2)
+
+
+class ForkedRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collector = CollectorStandIn()
+        self.addCleanup(self.collector.stop)
+
+    def test_batching_recorder_reports_spans_of_forked_child(self):
+        recorder = BatchingHttpRecorder(self.collector.url,
+                                        headers={},
+                                        use_json_payload=True,
+                                        linger_ms=10)
+        tracer = HaystackTracer("any_service", recorder)
+        self.addCleanup(tracer.close)
+
+        def child():
+            tracer.start_span("in_child").finish()
+            return tracer.flush(timeout=5)
+
+        self.assertEqual(run_in_child(child), 0)
+        spans = json.loads(self.collector.payloads[0])
+        self.assertEqual(spans[0]["operationName"], "in_child")
+
+    def test_workers_hand_spans_to_exporter_process(self):
+        ring = SharedMemoryRing(64 * 1024)
+        exporter = RingBufferExporter(
+            ring,
+            lambda: BatchingHttpRecorder(self.collector.url,
+                                         headers={},
+                                         use_json_payload=True,
+                                         linger_ms=10),
+            poll_interval_ms=10)
+        exporter.start()
+
+        def worker():
+            tracer = HaystackTracer("any_service",
+                                    RingBufferRecorder(ring,
+                                                       use_json_payload=True))
+            tracer.start_span(f"worker-{os.getpid()}").finish()
+            return tracer.close(timeout=5)
+
+        self.assertEqual([run_in_child(worker) for _ in range(3)], [0] * 3)
+        self.assertTrue(exporter.stop(timeout=10))
+
+        names = [span["operationName"]
+                 for payload in self.collector.payloads
+                 for span in json.loads(payload)]
+        self.assertEqual(len(names), 3)
+        self.assertTrue(all(name.startswith("worker-") for name in names))
+
+
+class SharedMemoryRingTest(unittest.TestCase):
+
+    def test_records_wrap_around_the_ring(self):
+        ring = SharedMemoryRing(64)
+        taken = []
+        for i in range(20):
+            self.assertTrue(ring.put(bytes([i]) * (i % 7 + 1)))
+            if i % 3 == 2:
+                taken += ring.take_all()
+        taken += ring.take_all()
+
+        self.assertEqual(taken, [bytes([i]) * (i % 7 + 1) for i in range(20)])
+        self.assertEqual(len(ring), 0)
+
+    def test_records_beyond_capacity_are_dropped(self):
+        ring = SharedMemoryRing(32)
+
+        self.assertTrue(ring.put(b"x" * 20))
+        self.assertFalse(ring.put(b"y" * 20))
+        self.assertFalse(ring.put(b"z" * 40))
+
+        self.assertEqual(ring.dropped, 2)
+        self.assertEqual(ring.take_all(), [b"x" * 20])
+
+    def test_records_of_forked_writers_are_shared(self):
+        ring = SharedMemoryRing(1024)
+
+        def writer():
+            return ring.put(f"from-{os.getpid()}".encode())
+
+        statuses = [run_in_child(writer) for _ in range(3)]
+
+        self.assertEqual(statuses, [0, 0, 0])
+        self.assertEqual(len(ring.take_all()), 3)
+
+    def test_concurrent_writers_drop_nothing_while_the_ring_has_space(self):
+        ring = SharedMemoryRing(1024 * 1024)
+        records = 2000
+
+        def writer(name):
+            return all([ring.put(f"{name}-{i}".encode())
+                        for i in range(records)])
+
+        pids = []
+        for child in range(4):
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if writer(f"process{child}") else 1)
+            pids.append(pid)
+        results = []
+        threads = [threading.Thread(
+            target=lambda name=f"thread{i}": results.append(writer(name)))
+            for i in range(2)]
+        for thread in threads:
+            thread.start()
+        taken = []
+        while any(thread.is_alive() for thread in threads):
+            taken += ring.take_all()
+        for thread in threads:
+            thread.join()
+        statuses = [os.WEXITSTATUS(os.waitpid(pid, 0)[1]) for pid in pids]
+        taken += ring.take_all()
+
+        self.assertEqual(statuses, [0, 0, 0, 0])
+        self.assertEqual(results, [True, True])
+        self.assertEqual(len(taken), 6 * records)
+        self.assertEqual(ring.dropped, 0)
+
+    def test_writers_stop_waiting_once_the_lock_holder_died(self):
+        ring = SharedMemoryRing(1024, lock_timeout=60)
+
+        # the child exits while holding the lock, as if it was killed
+        self.assertEqual(run_in_child(lambda: ring._acquire() or True), 0)
+
+        start = time.monotonic()
+        for _ in range(5):
+            self.assertFalse(ring.put(b"x"))
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(len(ring), 0)
+
+    def test_writers_stop_waiting_after_repeated_lock_timeouts(self):
+        ring = SharedMemoryRing(1024, lock_timeout=0.2, max_lock_timeouts=2)
+
+        # held without a known holder
+        self.assertEqual(run_in_child(lambda: ring._lock.acquire()), 0)
+
+        start = time.monotonic()
+        self.assertFalse(ring.put(b"x"))
+        self.assertFalse(ring.put(b"x"))
+        waited = time.monotonic() - start
+        start = time.monotonic()
+        for _ in range(5):
+            self.assertFalse(ring.put(b"x"))
+
+        self.assertGreaterEqual(waited, 0.35)
+        self.assertLess(time.monotonic() - start, 0.15)
+
+    def test_recorder_counts_spans_not_fitting_the_ring(self):
+        recorder = RingBufferRecorder(SharedMemoryRing(16))
+        tracer = HaystackTracer("any_service", recorder)
+
+        tracer.start_span("any_operation").finish()
+
+        self.assertEqual(recorder.dropped_spans, 1)
+        self.assertTrue(recorder.flush(timeout=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
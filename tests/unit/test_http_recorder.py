@@ -1,9 +1,56 @@
 import unittest
+import gzip
 import json
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import mock
+from haystack import HaystackTracer
 from haystack import AsyncHttpRecorder
 from haystack import SyncHttpRecorder
-from haystack.constants import DEFAULT_HTTP_TIMEOUT
+from haystack import BatchingHttpRecorder
+from haystack.span_pb2 import Batch
+from haystack.spill import SpillQueue
+from haystack.constants import DEFAULT_HTTP_TIMEOUT, GZIP
+
+
+class RestartableCollector(object):
+    """Local http server standing in for the haystack collector, which can
+    be stopped and started again on the same port"""
+
+    def __init__(self):
+        self.payloads = []
+        self._server = None
+        self.port = 0
+        self.start()
+        self.url = f"http://localhost:{self.port}/span"
+
+    def start(self):
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                collector.payloads.append(self.rfile.read(length))
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("localhost", self.port), Handler)
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever,
+                         args=(0.05,),
+                         daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
 
 
 class AsyncHttpRecorderTest(unittest.TestCase):
@@ -11,33 +58,33 @@ class AsyncHttpRecorderTest(unittest.TestCase):
     def setUp(self):
         self.a_url = "http://fake.collector.url"
 
-    @mock.patch("haystack.http_recorder.span_to_json")
+    @mock.patch("haystack.http_recorder.serialize_span_json")
     @mock.patch("haystack.http_recorder.FuturesSession")
     def test_async_recorder_with_json_payload_and_custom_timeout(self,
                                                                  mock_futures_session,
-                                                                 mock_span_to_json):
+                                                                 mock_serialize_span_json):
         test_timeout = 1.0
         recorder = AsyncHttpRecorder(self.a_url,
                                      timeout_seconds=test_timeout,
                                      use_json_payload=True)
-        span_as_json = {"fake": "span"}
-        mock_span_to_json.return_value = span_as_json
+        span_as_json = b'{"fake": "span"}'
+        mock_serialize_span_json.return_value = span_as_json
 
         recorder.record_span(mock.Mock())
 
-        expected_payload = json.dumps(span_as_json).encode("utf-8")
+        expected_payload = span_as_json
         mock_futures_session.return_value.post.assert_called_once_with(self.a_url,
                                                                        data=expected_payload,
                                                                        timeout=test_timeout)
 
-    @mock.patch("haystack.http_recorder.span_to_proto")
+    @mock.patch("haystack.http_recorder.serialize_span")
     @mock.patch("haystack.http_recorder.FuturesSession")
     def test_async_recorder_defaults_to_proto_with_default_timeout(self,
                                                                    mock_futures_session,
-                                                                   mock_span_to_proto):
+                                                                   mock_serialize_span):
         recorder = AsyncHttpRecorder(self.a_url, )
         proto_string = "a protospan string"
-        mock_span_to_proto.return_value.SerializeToString.return_value = proto_string
+        mock_serialize_span.return_value = proto_string
 
         recorder.record_span(mock.Mock())
 
@@ -45,39 +92,74 @@ class AsyncHttpRecorderTest(unittest.TestCase):
                                                                        data=proto_string,
                                                                        timeout=DEFAULT_HTTP_TIMEOUT)
 
+    @mock.patch("haystack.http_recorder.serialize_span")
+    @mock.patch("haystack.http_recorder.FuturesSession")
+    def test_flush_waits_for_in_flight_posts(self,
+                                             mock_futures_session,
+                                             mock_serialize_span):
+        in_flight = Future()
+        mock_futures_session.return_value.post.return_value = in_flight
+        recorder = AsyncHttpRecorder(self.a_url)
+        recorder.record_span(mock.Mock())
+
+        self.assertFalse(recorder.flush(timeout=0.01))
+        in_flight.set_result(None)
+        self.assertTrue(recorder.close(timeout=0.01))
+        mock_futures_session.return_value.close.assert_called_once_with()
+
+    def test_forked_children_get_an_executor_of_the_same_type_and_settings(
+            self):
+        executors = [ThreadPoolExecutor(max_workers=3,
+                                        thread_name_prefix="spans"),
+                     ProcessPoolExecutor(max_workers=2)]
+        for executor in executors:
+            with self.subTest(type(executor).__name__):
+                recorder = AsyncHttpRecorder(self.a_url, executor=executor)
+                recorder._reinit_after_fork()
+                child_executor = recorder._session.executor
+                self.assertIsNot(child_executor, executor)
+                self.assertIs(type(child_executor), type(executor))
+                self.assertEqual(child_executor._max_workers,
+                                 executor._max_workers)
+                if isinstance(executor, ThreadPoolExecutor):
+                    self.assertEqual(child_executor._thread_name_prefix,
+                                     "spans")
+                recorder.close()
+                executor.shutdown()
+
 
 class SyncHttpRecorderTest(unittest.TestCase):
 
     def setUp(self):
         self.a_url = "http://fake.collector.url"
 
-    @mock.patch("haystack.http_recorder.span_to_json")
+    @mock.patch("haystack.http_recorder.serialize_span_json")
     @mock.patch("haystack.http_recorder.Session")
     def test_sync_recorder_with_json_payload_and_custom_timeout(self,
                                                                 mock_session,
-                                                                mock_span_to_json):
+                                                                mock_serialize_span_json):
         test_timeout = 1.0
         recorder = SyncHttpRecorder(self.a_url,
                                     timeout_seconds=test_timeout,
                                     use_json_payload=True)
-        span_as_json = {"fake": "span"}
-        mock_span_to_json.return_value = span_as_json
+        span_as_json = b'{"fake": "span"}'
+        mock_serialize_span_json.return_value = span_as_json
 
         recorder.record_span(mock.Mock())
 
-        expected_payload = json.dumps(span_as_json).encode("utf-8")
+        expected_payload = span_as_json
         mock_session.return_value.post.assert_called_once_with(self.a_url,
                                                                data=expected_payload,
                                                                timeout=test_timeout)
 
-    @mock.patch("haystack.http_recorder.span_to_proto")
+    @mock.patch("haystack.http_recorder.serialize_span")
     @mock.patch("haystack.http_recorder.Session")
     def test_sync_recorder_defaults_to_proto_with_default_timeout(self,
                                                                   mock_session,
-                                                                  mock_span_to_proto):
+                                                                  mock_serialize_span):
         recorder = SyncHttpRecorder(self.a_url, )
         proto_string = "a protospan string"
-        mock_span_to_proto.return_value.SerializeToString.return_value = proto_string
+        mock_serialize_span.return_value = proto_string
 
         recorder.record_span(mock.Mock())
 
@@ -85,6 +167,154 @@ class SyncHttpRecorderTest(unittest.TestCase):
                                                                data=proto_string,
                                                                timeout=DEFAULT_HTTP_TIMEOUT)
 
+    @mock.patch("haystack.http_recorder.serialize_span")
+    @mock.patch("haystack.http_recorder.Session")
+    def test_sync_recorder_compresses_payloads_above_threshold(self,
+                                                               mock_session,
+                                                               mock_serialize_span):
+        recorder = SyncHttpRecorder(self.a_url,
+                                    headers={},
+                                    compression=GZIP,
+                                    compression_min_bytes=100)
+
+        mock_serialize_span.return_value = b"small"
+        recorder.record_span(mock.Mock())
+        mock_serialize_span.return_value = b"large" * 100
+        recorder.record_span(mock.Mock())
+
+        small_call, large_call = mock_session.return_value.post.call_args_list
+        self.assertEqual(small_call[1]["data"], b"small")
+        self.assertNotIn("headers", small_call[1])
+        self.assertEqual(gzip.decompress(large_call[1]["data"]), b"large" * 100)
+        self.assertEqual(large_call[1]["headers"], {"Content-Encoding": GZIP})
+
+
+class BatchingHttpRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.a_url = "http://fake.collector.url"
+        self.posted = threading.Event()
+        self.session = mock.Mock()
+        self.session.headers = {}
+        self.session.hooks = {}
+        self.session.post.side_effect = lambda *args, **kwargs: \
+            self.posted.set()
+
+    @mock.patch("haystack.http_recorder.serialize_span_json")
+    def test_json_spans_are_posted_as_one_array(self, mock_serialize_span_json):
+        mock_serialize_span_json.side_effect = [b'{"span": 1}',
+                                                b'{"span": 2}']
+        recorder = BatchingHttpRecorder(self.a_url,
+                                        use_json_payload=True,
+                                        requests_session=self.session,
+                                        linger_ms=50)
+
+        recorder.record_span(mock.Mock())
+        recorder.record_span(mock.Mock())
+
+        self.assertTrue(self.posted.wait(5))
+        payload = self.session.post.call_args[1]["data"]
+        self.assertEqual(json.loads(payload), [{"span": 1}, {"span": 2}])
+
+    @mock.patch("haystack.http_recorder.serialize_span")
+    def test_binary_spans_are_posted_as_proto_batch(self, mock_serialize_span):
+        mock_serialize_span.return_value = b"\x0a\x03abc"
+        recorder = BatchingHttpRecorder(self.a_url,
+                                        requests_session=self.session,
+                                        linger_ms=50)
+
+        recorder.record_span(mock.Mock())
+
+        self.assertTrue(self.posted.wait(5))
+        batch = Batch()
+        batch.ParseFromString(self.session.post.call_args[1]["data"])
+        self.assertEqual([span.traceId for span in batch.spans], ["abc"])
+
+    @mock.patch("haystack.http_recorder.serialize_span_json")
+    def test_batches_are_compressed_as_a_whole(self, mock_serialize_span_json):
+        mock_serialize_span_json.side_effect = [b'{"span": 1}',
+                                                b'{"span": 2}']
+        recorder = BatchingHttpRecorder(self.a_url,
+                                        headers={},
+                                        use_json_payload=True,
+                                        requests_session=self.session,
+                                        linger_ms=50,
+                                        compression=GZIP,
+                                        compression_min_bytes=0)
+
+        recorder.record_span(mock.Mock())
+        recorder.record_span(mock.Mock())
+
+        self.assertTrue(self.posted.wait(5))
+        post_args = self.session.post.call_args[1]
+        self.assertEqual(post_args["headers"], {"Content-Encoding": GZIP})
+        self.assertEqual(json.loads(gzip.decompress(post_args["data"])),
+                         [{"span": 1}, {"span": 2}])
+
+
+class SpillingRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.collector = RestartableCollector()
+        self.addCleanup(self.collector.stop)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.spill = SpillQueue(directory, retry_interval_seconds=60)
+
+    def record_during_outage(self, recorder, count):
+        tracer = HaystackTracer("any_service", recorder)
+        self.collector.stop()
+        for i in range(count):
+            tracer.start_span(f"operation-{i}").finish()
+        return tracer
+
+    def test_sync_recorder_replays_spilled_spans_once_collector_is_back(self):
+        recorder = SyncHttpRecorder(self.collector.url,
+                                    headers={},
+                                    use_json_payload=True,
+                                    spill_queue=self.spill)
+        tracer = self.record_during_outage(recorder, 3)
+
+        self.assertEqual(len(self.spill), 3)
+        self.assertFalse(tracer.flush())
+        self.collector.start()
+        self.assertTrue(tracer.flush())
+
+        self.assertEqual([json.loads(payload)["operationName"]
+                          for payload in self.collector.payloads],
+                         ["operation-0", "operation-1", "operation-2"])
+        self.assertEqual(len(self.spill), 0)
+
+    def test_async_recorder_spills_failed_posts(self):
+        recorder = AsyncHttpRecorder(self.collector.url,
+                                     headers={},
+                                     use_json_payload=True,
+                                     spill_queue=self.spill)
+        tracer = self.record_during_outage(recorder, 2)
+
+        self.assertFalse(tracer.flush())
+        self.assertEqual(len(self.spill), 2)
+        self.collector.start()
+        self.assertTrue(tracer.close())
+
+        self.assertEqual(len(self.collector.payloads), 2)
+
+    def test_batching_recorder_replays_spilled_spans_as_a_batch(self):
+        recorder = BatchingHttpRecorder(self.collector.url,
+                                        headers={},
+                                        linger_ms=10,
+                                        spill_queue=self.spill)
+        tracer = self.record_during_outage(recorder, 3)
+
+        self.assertFalse(tracer.flush())
+        self.collector.start()
+        self.assertTrue(tracer.close())
+
+        batch = Batch()
+        batch.ParseFromString(self.collector.payloads[-1])
+        self.assertEqual([span.operationName for span in batch.spans],
+                         ["operation-0", "operation-1", "operation-2"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,50 @@
+import os
+import unittest
+import uuid
+from haystack.id_generator import RandomIdGenerator
+
+
+class RandomIdGeneratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.generator = RandomIdGenerator()
+
+    def test_ids_are_version_4_uuid_strings(self):
+        for _ in range(100):
+            span_id = self.generator.generate_span_id()
+            parsed = uuid.UUID(span_id)
+            self.assertEqual(str(parsed), span_id)
+            self.assertEqual(parsed.version, 4)
+            self.assertEqual(parsed.variant, uuid.RFC_4122)
+
+    def test_ids_are_unique(self):
+        ids = {self.generator.generate_trace_id() for _ in range(10000)}
+
+        self.assertEqual(len(ids), 10000)
+
+    def test_generators_do_not_share_a_sequence(self):
+        other = RandomIdGenerator()
+
+        self.assertNotEqual(self.generator.generate_span_id(),
+                            other.generate_span_id())
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_forked_child_does_not_repeat_parent_ids(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.write(write_fd, self.generator.generate_span_id().encode())
+            os._exit(0)
+
+        os.close(write_fd)
+        parent_id = self.generator.generate_span_id()
+        with os.fdopen(read_fd) as child_output:
+            child_id = child_output.read()
+        os.waitpid(pid, 0)
+
+        self.assertNotEqual(parent_id, child_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import math
+import unittest
+from unittest import mock
+from haystack import HaystackTracer
+from haystack.recorder import NoopRecorder
+from haystack.json_encoder import serialize_span_json
+from haystack.util import span_to_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_span(span):
+    """The json encoding of recorders before serialize_span_json"""
+    return json.dumps(
+        span_to_json(span),
+        default=lambda o: f"{o.__class__.__name__} is not serializable"
+    ).encode("utf-8")
+
+
+class SerializeSpanJsonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = HaystackTracer("any_service", NoopRecorder())
+
+    def make_span(self):
+        parent = self.tracer.start_span("parent")
+        span = self.tracer.start_span("chïld ✓", child_of=parent)
+        span.set_tag("string", "välue \"quoted\"\n")
+        span.set_tag("bool", False)
+        span.set_tag("long", 2 ** 40)
+        span.set_tag("double", 0.1)
+        span.set_tag("none", None)
+        span.set_tag("dict", {"nested": [1, 2.5, "x"]})
+        span.set_tag("bytes", b"\x00")
+        span.log_kv({"event": "error", "attempt": 3})
+        span.log_kv({}, timestamp=1.5)
+        span.finish()
+        return span
+
+    @mock.patch("haystack.json_encoder.orjson", None)
+    def test_stdlib_path_writes_the_bytes_of_json_dumps(self):
+        span = self.make_span()
+
+        self.assertEqual(serialize_span_json(span), dumps_span(span))
+
+    @mock.patch("haystack.json_encoder.orjson", None)
+    def test_stdlib_path_matches_json_dumps_for_special_floats(self):
+        span = self.tracer.start_span("any_operation")
+        span.set_tag("nan", math.nan)
+        span.set_tag("inf", math.inf)
+        span.set_tag("-inf", -math.inf)
+        span.set_tag("huge", 2 ** 80)
+        span.finish()
+
+        self.assertEqual(serialize_span_json(span), dumps_span(span))
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_path_encodes_the_same_json(self):
+        span = self.make_span()
+
+        self.assertEqual(json.loads(serialize_span_json(span)),
+                         json.loads(dumps_span(span)))
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_path_falls_back_for_values_it_cannot_encode(self):
+        span = self.tracer.start_span("any_operation")
+        span.set_tag("huge", 2 ** 80)
+        span.set_tag("int_keys", {1: "one"})
+        span.finish()
+
+        self.assertEqual(serialize_span_json(span), dumps_span(span))
+
+
+class CommonTagsJsonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = HaystackTracer("any_service", NoopRecorder(),
+                                     common_tags={"env": "prod",
+                                                  "version": 3,
+                                                  "config": {"a": 1}})
+
+    def make_spans(self):
+        spans = [self.tracer.start_span("common"),
+                 self.tracer.start_span("local", tags={"local": True}),
+                 self.tracer.start_span("overridden",
+                                        tags={"version": 4, "local": 1})]
+        for span in spans:
+            span.finish()
+        return spans
+
+    @mock.patch("haystack.json_encoder.orjson", None)
+    def test_stdlib_path_writes_common_tags_like_json_dumps(self):
+        for span in self.make_spans():
+            self.assertEqual(serialize_span_json(span), dumps_span(span))
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_path_writes_common_tags(self):
+        for span in self.make_spans():
+            self.assertEqual(json.loads(serialize_span_json(span)),
+                             json.loads(dumps_span(span)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import threading
+import unittest
+import urllib.request
+from unittest import mock
+from opentracing.scope_managers import ThreadLocalScopeManager
+from haystack import HaystackTracer
+from haystack import MetricsRecorder
+from haystack.constants import OTHER_OPERATION
+from haystack.metrics import LogHistogram
+from haystack.recorder import NoopRecorder, SpanRecorder
+
+
+class LogHistogramTest(unittest.TestCase):
+
+    def test_percentiles_are_within_one_bucket(self):
+        histogram = LogHistogram(buckets_per_doubling=8)
+        for millis in range(1, 1001):
+            histogram.record(millis / 1000.0)
+
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.sum, 500.5)
+        for percentile, exact in ((50, 0.5), (99, 0.99), (100, 1.0)):
+            value = histogram.percentile(percentile)
+            self.assertGreaterEqual(value, exact)
+            self.assertLessEqual(value, exact * 2 ** (1 / 8))
+
+    def test_cumulative_counts_include_zero_durations(self):
+        histogram = LogHistogram()
+        for value in (0.0, 0.003, 0.02, 0.02, 7.0):
+            histogram.record(value)
+
+        self.assertEqual(histogram.cumulative_counts((0.005, 0.05, 1.0)),
+                         [2, 4, 4])
+
+
+class MetricsRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.delegate = mock.Mock(spec=SpanRecorder)
+        self.delegate.close.return_value = True
+
+    def make_tracer(self, recorder):
+        self.addCleanup(recorder.close)
+        return HaystackTracer("any_service", recorder,
+                              scope_manager=ThreadLocalScopeManager())
+
+    def finish(self, tracer, name, duration, **tags):
+        span = tracer.start_span(name, tags=tags, start_time=0.0)
+        span.finish(finish_time=duration)
+        return span
+
+    def test_spans_are_aggregated_and_passed_on(self):
+        recorder = MetricsRecorder(self.delegate)
+        tracer = self.make_tracer(recorder)
+
+        self.finish(tracer, "get", 0.1, **{"span.kind": "server"})
+        self.finish(tracer, "get", 0.3, **{"span.kind": "server"})
+        failed = self.finish(tracer, "get", 0.2,
+                             **{"span.kind": "server", "error": True})
+
+        series = {(m.operation_name, m.kind, m.error): m.histogram
+                  for m in recorder.snapshot()}
+        self.assertEqual(series[("get", "server", False)].count, 2)
+        self.assertAlmostEqual(series[("get", "server", False)].sum, 0.4)
+        self.assertEqual(series[("get", "server", True)].count, 1)
+        self.assertEqual(self.delegate.record_span.call_count, 3)
+        self.delegate.record_span.assert_called_with(failed)
+
+    def test_operations_beyond_max_series_are_aggregated(self):
+        recorder = MetricsRecorder(self.delegate, max_series=2)
+        tracer = self.make_tracer(recorder)
+
+        for name in ("a", "b", "c", "d"):
+            self.finish(tracer, name, 0.1)
+
+        counts = {m.operation_name: m.histogram.count
+                  for m in recorder.snapshot()}
+        self.assertEqual(counts, {"a": 1, "b": 1, OTHER_OPERATION: 2})
+
+    def test_prometheus_text_exposition(self):
+        recorder = MetricsRecorder(self.delegate,
+                                   latency_buckets=(0.05, 0.5))
+        tracer = self.make_tracer(recorder)
+
+        self.finish(tracer, "say \"hi\"", 0.01)
+        self.finish(tracer, "say \"hi\"", 0.25)
+
+        labels = ("service=\"any_service\",operation=\"say \\\"hi\\\"\","
+                  "kind=\"\",error=\"false\"")
+        self.assertEqual(recorder.prometheus_text().splitlines()[2:], [
+            f"haystack_span_duration_seconds_bucket{{{labels},le=\"0.05\"}} 1",
+            f"haystack_span_duration_seconds_bucket{{{labels},le=\"0.5\"}} 2",
+            f"haystack_span_duration_seconds_bucket{{{labels},le=\"+Inf\"}} 2",
+            f"haystack_span_duration_seconds_sum{{{labels}}} 0.26",
+            f"haystack_span_duration_seconds_count{{{labels}}} 2",
+        ])
+
+    def test_snapshots_are_exported_periodically_and_on_close(self):
+        exported = []
+        called = threading.Event()
+
+        def callback(snapshot):
+            exported.append(snapshot)
+            called.set()
+
+        recorder = MetricsRecorder(NoopRecorder(), callback=callback,
+                                   export_interval_seconds=0.01)
+        tracer = HaystackTracer("any_service", recorder)
+        self.finish(tracer, "any_operation", 0.1)
+
+        self.assertTrue(called.wait(5))
+        self.assertTrue(recorder.close())
+        self.assertEqual(exported[-1][0].histogram.count, 1)
+
+    def test_endpoint_serves_prometheus_text(self):
+        recorder = MetricsRecorder(self.delegate)
+        tracer = self.make_tracer(recorder)
+        self.finish(tracer, "any_operation", 0.1)
+
+        host, port = recorder.serve_prometheus(0)
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics",
+                                    timeout=5) as response:
+            body = response.read().decode("utf-8")
+
+        self.assertEqual(body, recorder.prometheus_text())
+        self.assertIn("haystack_span_duration_seconds_count", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
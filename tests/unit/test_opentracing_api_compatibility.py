@@ -2,28 +2,9 @@ import unittest
 from haystack.tracer import HaystackTracer
 from haystack.recorder import NoopRecorder
 from opentracing.harness.api_check import APICompatibilityCheckMixin
-from opentracing import Format
 
 
-class ModifiedAPICompatibilityCheckMixin(APICompatibilityCheckMixin):
-    # TODO implement binary propagator and remove this hack!
-    def test_binary_propagation(self):
-        pass
-
-    def test_mandatory_formats(self):
-        formats = [
-            (Format.TEXT_MAP, {}),
-            (Format.HTTP_HEADERS, {}),
-            # (Format.BINARY, bytearray()),
-        ]
-        with self.tracer().start_span(operation_name='Bender') as span:
-            for fmt, carrier in formats:
-                # expecting no exceptions
-                span.tracer.inject(span.context, fmt, carrier)
-                span.tracer.extract(fmt, carrier)
-
-
-class HaystackTracerCompatibility(unittest.TestCase, ModifiedAPICompatibilityCheckMixin):
+class HaystackTracerCompatibility(unittest.TestCase, APICompatibilityCheckMixin):
 
     def setUp(self):
         self._tracer = HaystackTracer("TestTracer", NoopRecorder())
@@ -41,5 +22,13 @@ class HaystackTracerCompatibility(unittest.TestCase, ModifiedAPICompatibilityChe
         return parent.context.span_id == span.context.parent_id
 
 
+class UnsynchronizedSpanHaystackTracerCompatibility(
+        HaystackTracerCompatibility):
+
+    def setUp(self):
+        self._tracer = HaystackTracer("TestTracer", NoopRecorder(),
+                                      thread_safe_spans=False)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from opentracing import SpanContextCorruptedException
+from haystack.propagator import CompositePropagator, hex_id, uuid_trace_id
+from haystack.text_propagator import TextPropagator
+from haystack.w3c_propagator import W3CPropagator
+from haystack.b3_propagator import B3Propagator
+from haystack.span import SpanContext
+from haystack.constants import TRACE_ID, SPAN_ID, TRACEPARENT, B3_TRACE_ID
+
+TRACEPARENT_HEADER = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class CompositePropagatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.propagator = CompositePropagator([TextPropagator(),
+                                               W3CPropagator(),
+                                               B3Propagator()])
+
+    def test_all_formats_are_injected(self):
+        carrier = {}
+
+        self.propagator.inject(SpanContext(
+            trace_id="9c5a3b52-2f9e-4bb0-9a53-1e47ca1b6a10",
+            span_id="0d4b8e6c-42c0-4d0e-8f7c-3c2d25d0a4c1",
+            sampled=True), carrier)
+
+        for key in (TRACE_ID, SPAN_ID, TRACEPARENT, B3_TRACE_ID):
+            self.assertIn(key, carrier)
+
+    def test_first_format_present_is_extracted(self):
+        carrier = {TRACEPARENT: TRACEPARENT_HEADER}
+        self.assertEqual(self.propagator.extract(carrier).span_id,
+                         "00f067aa0ba902b7")
+
+        carrier.update({TRACE_ID: "1212", SPAN_ID: "1234"})
+        self.assertEqual(self.propagator.extract(carrier).span_id, "1234")
+
+    def test_corrupted_format_is_skipped_if_another_is_present(self):
+        carrier = {TRACE_ID: "1212", TRACEPARENT: TRACEPARENT_HEADER}
+
+        self.assertEqual(self.propagator.extract(carrier).span_id,
+                         "00f067aa0ba902b7")
+        self.assertRaises(SpanContextCorruptedException,
+                          self.propagator.extract, {TRACE_ID: "1212"})
+
+    def test_decision_not_to_sample_without_trace_is_passed_on(self):
+        propagator = CompositePropagator([TextPropagator(), B3Propagator()])
+        carrier = {}
+
+        ctx = propagator.extract({"b3": "0"})
+        propagator.inject(ctx, carrier)
+        downstream = propagator.extract(carrier)
+
+        self.assertEqual(carrier, {"Sampled": "0", "X-B3-Sampled": "0"})
+        self.assertIs(downstream.sampled, False)
+        self.assertIsNone(downstream.trace_id)
+
+    def test_no_context_returns_none(self):
+        self.assertIsNone(self.propagator.extract({"Host": "example.com"}))
+
+
+class HexIdTest(unittest.TestCase):
+
+    def test_ids_are_converted_to_hex(self):
+        uuid = "9c5a3b52-2f9e-4bb0-9a53-1e47ca1b6a10"
+
+        self.assertEqual(hex_id(uuid, 32), "9c5a3b522f9e4bb09a531e47ca1b6a10")
+        self.assertEqual(hex_id(uuid, 16), "9a531e47ca1b6a10")
+        self.assertEqual(hex_id("1A2b", 16), "0000000000001a2b")
+        self.assertEqual(uuid_trace_id(hex_id(uuid, 32)), uuid)
+
+    def test_non_hex_and_zero_ids_are_rejected(self):
+        for value in ("", "0x12", "not-hex", "0000-0000", "1" * 33, None):
+            with self.subTest(value=value):
+                self.assertIsNone(hex_id(value, 16))
+
+
+if __name__ == "__main__":
+    unittest.main()
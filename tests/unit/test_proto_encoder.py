@@ -0,0 +1,151 @@
+import random
+import sys
+import unittest
+from haystack import HaystackTracer
+from haystack.recorder import NoopRecorder
+from haystack.proto_encoder import serialize_span, write_span
+from haystack.span_pb2 import Span as ProtoSpan
+from haystack.util import span_to_proto
+
+
+class SerializeSpanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = HaystackTracer("any_service", NoopRecorder())
+
+    def assertSameBytes(self, span):
+        expected = span_to_proto(span).SerializeToString()
+        encoded = serialize_span(span)
+
+        self.assertEqual(encoded, expected)
+        parsed = ProtoSpan()
+        parsed.ParseFromString(encoded)
+        self.assertEqual(parsed, span_to_proto(span))
+
+    def test_span_without_tags_and_logs(self):
+        span = self.tracer.start_span("any_operation")
+        span.finish()
+
+        self.assertSameBytes(span)
+
+    def test_child_span_with_every_tag_type(self):
+        parent = self.tracer.start_span("parent")
+        span = self.tracer.start_span("chïld", child_of=parent)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            traceback = sys.exc_info()[2]
+        span.set_tag("string", "value")
+        span.set_tag("unicode", "välüe ✓")
+        span.set_tag("empty", "")
+        span.set_tag("", "empty key")
+        span.set_tag("true", True)
+        span.set_tag("false", False)
+        span.set_tag("zero", 0)
+        span.set_tag("long", 2 ** 40)
+        span.set_tag("negative", -3)
+        span.set_tag("double", 3.25)
+        span.set_tag("negative_double", -0.5)
+        span.set_tag("bytes", b"\x00\xff")
+        span.set_tag("empty_bytes", b"")
+        span.set_tag("dict", {"a": [1, 2]})
+        span.set_tag("type", ValueError)
+        span.set_tag("traceback", traceback)
+        span.set_tag("unsupported", object())
+        span.finish()
+
+        self.assertSameBytes(span)
+
+    def test_span_with_logs(self):
+        span = self.tracer.start_span("any_operation")
+        span.log_kv({"event": "error", "code": 500, "ok": False})
+        span.log_kv({}, timestamp=0)
+        span.log_kv({"long_message": "x" * 300}, timestamp=1234.5)
+        span.finish()
+
+        self.assertSameBytes(span)
+
+    def test_negative_times_use_ten_byte_varints(self):
+        span = self.tracer.start_span("any_operation", start_time=-1.0)
+        span.finish(finish_time=-2.0)
+
+        self.assertSameBytes(span)
+
+    def test_out_of_range_tag_is_rejected_like_protobuf(self):
+        span = self.tracer.start_span("any_operation")
+        span.set_tag("huge", 2 ** 64)
+        span.finish()
+
+        with self.assertRaises(ValueError):
+            span_to_proto(span)
+        with self.assertRaises(ValueError):
+            serialize_span(span)
+
+    def test_common_tags_reuse_their_encoding_unless_overridden(self):
+        tracer = HaystackTracer("any_service", NoopRecorder(),
+                                common_tags={"env": "prod",
+                                             "version": 3,
+                                             "config": {"a": 1}})
+        kept = tracer.start_span("kept", tags={"local": True})
+        overridden = tracer.start_span("overridden", tags={"env": "dev"})
+        overridden.set_tag("version", 4)
+        kept.finish()
+        overridden.finish()
+
+        self.assertEqual(list(tracer.encoded_common_fields.tags),
+                         ["env", "version", "config"])
+        self.assertSameBytes(kept)
+        self.assertSameBytes(overridden)
+
+    def test_unencodable_common_tag_is_rejected_per_span(self):
+        tracer = HaystackTracer("any_service", NoopRecorder(),
+                                common_tags={"huge": 2 ** 64})
+        span = tracer.start_span("any_operation")
+        span.finish()
+
+        self.assertIsNone(tracer.encoded_common_fields.tags)
+        with self.assertRaises(ValueError):
+            serialize_span(span)
+
+    def test_changed_service_name_is_encoded(self):
+        tracer = HaystackTracer("any_service", NoopRecorder())
+        tracer.service_name = "renamed_service"
+        span = tracer.start_span("any_operation")
+        span.finish()
+
+        self.assertSameBytes(span)
+
+    def test_write_span_appends_to_buffer(self):
+        span = self.tracer.start_span("any_operation")
+        span.finish()
+        buffer = bytearray(b"prefix")
+
+        write_span(buffer, span)
+
+        self.assertEqual(bytes(buffer),
+                         b"prefix" + span_to_proto(span).SerializeToString())
+
+    def test_random_spans_match_protobuf(self):
+        rng = random.Random(42)
+        values = [lambda: rng.choice(["", "a", "välüe", "x" * 200]),
+                  lambda: rng.randint(-2 ** 63, 2 ** 63 - 1),
+                  lambda: rng.randint(0, 300),
+                  lambda: rng.random() * rng.choice([1, -1e300, 1e-300]),
+                  lambda: rng.random() < 0.5,
+                  lambda: bytes(rng.randrange(256) for _ in range(5))]
+        for _ in range(200):
+            span = self.tracer.start_span("op" * rng.randint(0, 3),
+                                          start_time=rng.random() * 2e9)
+            for i in range(rng.randint(0, 8)):
+                span.set_tag(f"tag.{i}", rng.choice(values)())
+            for _ in range(rng.randint(0, 3)):
+                span.log_kv({f"field.{i}": rng.choice(values)()
+                             for i in range(rng.randint(0, 3))},
+                            timestamp=rng.random() * 2e9)
+            span.finish(finish_time=span.start_time + rng.random())
+
+            self.assertSameBytes(span)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+from haystack.sampler import (
+    ConstSampler,
+    ProbabilisticSampler,
+    RateLimitingSampler,
+)
+
+
+class ConstSamplerTest(unittest.TestCase):
+
+    def test_decision_is_constant(self):
+        self.assertTrue(ConstSampler().is_sampled("trace", "op"))
+        self.assertFalse(ConstSampler(False).is_sampled("trace", "op"))
+
+
+class ProbabilisticSamplerTest(unittest.TestCase):
+
+    def test_rate_must_be_a_probability(self):
+        self.assertRaises(ValueError, ProbabilisticSampler, 1.5)
+        self.assertRaises(ValueError, ProbabilisticSampler, -0.1)
+
+    @mock.patch("haystack.sampler.random.random")
+    def test_traces_below_rate_are_sampled(self, mock_random):
+        sampler = ProbabilisticSampler(0.25)
+
+        mock_random.return_value = 0.1
+        self.assertTrue(sampler.is_sampled("trace", "op"))
+        mock_random.return_value = 0.3
+        self.assertFalse(sampler.is_sampled("trace", "op"))
+
+
+class RateLimitingSamplerTest(unittest.TestCase):
+
+    @mock.patch("haystack.sampler.time.monotonic")
+    def test_each_operation_is_limited_independently(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        sampler = RateLimitingSampler(2)
+
+        decisions = [sampler.is_sampled("trace", "op") for _ in range(3)]
+        other_decision = sampler.is_sampled("trace", "other_op")
+
+        self.assertEqual(decisions, [True, True, False])
+        self.assertTrue(other_decision)
+
+    @mock.patch("haystack.sampler.time.monotonic")
+    def test_tokens_are_refilled_over_time(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        sampler = RateLimitingSampler(1)
+        sampler.is_sampled("trace", "op")
+
+        self.assertFalse(sampler.is_sampled("trace", "op"))
+        mock_monotonic.return_value = 101.0
+        self.assertTrue(sampler.is_sampled("trace", "op"))
+
+    @mock.patch("haystack.sampler.time.monotonic")
+    def test_fractional_rates_sample_one_trace_per_interval(self,
+                                                            mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        sampler = RateLimitingSampler(0.5)
+
+        self.assertTrue(sampler.is_sampled("trace", "op"))
+        self.assertFalse(sampler.is_sampled("trace", "op"))
+        mock_monotonic.return_value = 101.0
+        self.assertFalse(sampler.is_sampled("trace", "op"))
+        mock_monotonic.return_value = 102.0
+        self.assertTrue(sampler.is_sampled("trace", "op"))
+
+    @mock.patch("haystack.sampler.time.monotonic")
+    def test_operations_beyond_max_share_a_bucket(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        sampler = RateLimitingSampler(1, max_operations=1)
+        sampler.is_sampled("trace", "op")
+
+        self.assertTrue(sampler.is_sampled("trace", "op2"))
+        self.assertFalse(sampler.is_sampled("trace", "op3"))
+
+
+if __name__ == "__main__":
+    unittest.main()
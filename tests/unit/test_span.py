@@ -0,0 +1,104 @@
+import pickle
+import unittest
+from unittest import mock
+from haystack import HaystackTracer
+from haystack.recorder import NoopRecorder
+from haystack.span import LogData, UnsynchronizedSpan
+
+
+class SpanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = HaystackTracer("any_service", NoopRecorder())
+
+    def test_tags_and_logs_are_empty_until_first_write(self):
+        span = self.tracer.start_span("any_operation")
+
+        self.assertEqual(dict(span.tags), {})
+        self.assertEqual(list(span.logs), [])
+        with self.assertRaises(TypeError):
+            span.tags["a"] = "tag"
+
+    def test_tags_are_read_only_and_logs_a_tuple_after_writes(self):
+        span = self.tracer.start_span("any_operation")
+        span.set_tag("a", "tag")
+        span.log_kv({"event": "any"})
+
+        with self.assertRaises(TypeError):
+            span.tags["b"] = "lost"
+        with self.assertRaises(TypeError):
+            span.local_tags["b"] = "lost"
+        self.assertIsInstance(span.logs, tuple)
+        self.assertDictEqual(dict(span.tags), {"a": "tag"})
+
+    def test_first_writes_allocate_tags_and_logs(self):
+        span = self.tracer.start_span("any_operation")
+
+        span.set_tag("a", "tag")
+        span.log_kv({"event": "any"}, timestamp=1.5)
+
+        self.assertDictEqual(dict(span.tags), {"a": "tag"})
+        self.assertEqual(span.logs, (LogData({"event": "any"}, 1.5),))
+        self.assertEqual(span.logs[0].key_values, {"event": "any"})
+        self.assertEqual(span.logs[0].timestamp, 1.5)
+
+    def test_attributes_are_kept_out_of_the_instance_dict(self):
+        span = self.tracer.start_span("any_operation", tags={"a": "tag"})
+        span.set_baggage_item("item", "value")
+        span.log_kv({"event": "any"})
+        span.finish()
+
+        self.assertEqual(vars(span), {})
+        self.assertEqual(vars(span.context), {})
+
+    def test_children_share_baggage_until_they_set_an_item(self):
+        parent = self.tracer.start_span("parent")
+        parent.set_baggage_item("item", "value")
+
+        child = self.tracer.start_span("child", child_of=parent)
+        grandchild = self.tracer.start_span("grandchild", child_of=child)
+        self.assertIs(grandchild.context.baggage, parent.context.baggage)
+
+        child.set_baggage_item("other", "value")
+        child.set_baggage_item("item", None)
+        self.assertEqual(child.context.baggage, {"other": "value"})
+        self.assertEqual(parent.context.baggage, {"item": "value"})
+        self.assertEqual(grandchild.context.baggage, {"item": "value"})
+
+    def test_baggage_is_read_only(self):
+        span = self.tracer.start_span("any_operation")
+        span.set_baggage_item("item", "value")
+        baggage = span.context.baggage
+
+        with self.assertRaises(TypeError):
+            baggage["item"] = "changed"
+        with self.assertRaises(TypeError):
+            baggage.update(item="changed")
+        copy = baggage.copy()
+        copy["item"] = "changed"
+
+        self.assertEqual(span.get_baggage_item("item"), "value")
+        self.assertEqual(pickle.loads(pickle.dumps(baggage)), baggage)
+
+
+class UnsynchronizedSpanTest(unittest.TestCase):
+
+    def test_tracer_creates_lock_free_spans_when_not_thread_safe(self):
+        recorder = mock.Mock()
+        tracer = HaystackTracer("any_service", recorder,
+                                thread_safe_spans=False)
+
+        span = tracer.start_span("any_operation")
+        span.set_tag("a", "tag").log_kv({"event": "any"})
+        span.set_baggage_item("item", "value")
+        span.finish()
+
+        self.assertIsInstance(span, UnsynchronizedSpan)
+        self.assertDictEqual(dict(span.tags), {"a": "tag"})
+        self.assertEqual(len(span.logs), 1)
+        self.assertEqual(span.get_baggage_item("item"), "value")
+        recorder.record_span.assert_called_once_with(span)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from haystack.spill import SpillQueue
+
+
+class SpillQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.sent = []
+
+    def send(self, records):
+        self.sent.append([bytes(record) for record in records])
+        return True
+
+    def test_replays_records_in_order_and_removes_segments(self):
+        spill = SpillQueue(self.directory, segment_bytes=16)
+        spill.append_all([b"first", b"second", b"third"])
+
+        self.assertEqual(len(spill), 3)
+        self.assertTrue(spill.replay(self.send))
+
+        self.assertEqual(self.sent, [[b"first"], [b"second"], [b"third"]])
+        self.assertEqual(len(spill), 0)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_replay_batches_records_up_to_max_batch_bytes(self):
+        spill = SpillQueue(self.directory)
+        spill.append_all([b"aaaa", b"bbbb", b"cccc"])
+
+        spill.replay(self.send, max_batch_bytes=8)
+
+        self.assertEqual(self.sent, [[b"aaaa", b"bbbb"], [b"cccc"]])
+
+    def test_replay_stops_once_deadline_passed(self):
+        spill = SpillQueue(self.directory)
+        spill.append_all([b"first", b"second"])
+
+        self.assertFalse(spill.replay(self.send, deadline=time.monotonic()))
+
+        self.assertEqual(self.sent, [])
+        self.assertEqual(len(spill), 2)
+        self.assertTrue(spill.replay(self.send))
+
+    def test_failed_send_keeps_records_and_backs_off(self):
+        spill = SpillQueue(self.directory, retry_interval_seconds=60)
+        spill.append_all([b"first", b"second"])
+
+        self.assertFalse(spill.replay(lambda records: False))
+
+        self.assertEqual(len(spill), 2)
+        self.assertFalse(spill.retry_due())
+        self.assertFalse(spill.send_or_spill([b"third"], self.send))
+        self.assertEqual(self.sent, [])
+        self.assertTrue(spill.replay(self.send))
+        self.assertEqual(self.sent, [[b"first"], [b"second"], [b"third"]])
+
+    def test_oldest_segments_are_evicted_beyond_max_bytes(self):
+        spill = SpillQueue(self.directory, max_bytes=64, segment_bytes=16)
+        spill.append_all([b"%012d" % i for i in range(10)])
+
+        spill.replay(self.send)
+
+        replayed = [records[0] for records in self.sent]
+        self.assertEqual(spill.evicted + len(replayed), 10)
+        self.assertLess(len(replayed), 10)
+        self.assertEqual(replayed, [b"%012d" % i for i in
+                                    range(spill.evicted, 10)])
+
+    def test_records_survive_restart_and_torn_record_is_dropped(self):
+        spill = SpillQueue(self.directory)
+        spill.append_all([b"first", b"second"])
+        spill.close()
+        segment = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(segment, "ab") as f:
+            f.write(b"\x00\x00\x00\x10torn")
+
+        recovered = SpillQueue(self.directory)
+        recovered.append(b"third")
+
+        self.assertEqual(len(recovered), 3)
+        self.assertTrue(recovered.replay(self.send))
+        self.assertEqual(self.sent, [[b"first"], [b"second"], [b"third"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
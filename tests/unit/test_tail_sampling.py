@@ -0,0 +1,130 @@
+import time
+import unittest
+from unittest import mock
+from haystack import HaystackTracer
+from haystack import TailSamplingRecorder
+from haystack.recorder import SpanRecorder
+from haystack.span import SpanContext
+from haystack.tail_sampling import (
+    ErrorPolicy,
+    LatencyPolicy,
+    OperationNamePolicy,
+)
+
+
+class CapturingRecorder(SpanRecorder):
+
+    def __init__(self):
+        self.spans = []
+        self.flush = mock.Mock(return_value=True)
+
+    def record_span(self, span):
+        self.spans.append(span)
+
+
+class TailSamplingRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.delegate = CapturingRecorder()
+
+    def make_tracer(self, policies, **kwargs):
+        recorder = TailSamplingRecorder(self.delegate, policies, **kwargs)
+        self.addCleanup(recorder.close)
+        return HaystackTracer("any_service", recorder), recorder
+
+    def reported_operations(self):
+        return [span.operation_name for span in self.delegate.spans]
+
+    def finish_trace(self, tracer, name, error=False, duration=0.0):
+        root = tracer.start_span(f"{name}-root", start_time=100.0)
+        child = tracer.start_span(f"{name}-child", child_of=root)
+        if error:
+            child.set_tag("error", True)
+        child.finish()
+        root.finish(finish_time=100.0 + duration)
+
+    def test_error_trace_is_reported_when_its_root_finishes(self):
+        tracer, recorder = self.make_tracer([ErrorPolicy()])
+
+        self.finish_trace(tracer, "ok")
+        self.finish_trace(tracer, "failed", error=True)
+
+        self.assertEqual(self.reported_operations(),
+                         ["failed-child", "failed-root"])
+        self.assertEqual(recorder.sampled_traces, 1)
+        self.assertEqual(recorder.dropped_traces, 1)
+        self.assertEqual(recorder.buffered_spans, 0)
+
+    def test_latency_and_operation_policies(self):
+        tracer, _ = self.make_tracer([LatencyPolicy(threshold_ms=500),
+                                      OperationNamePolicy(["checkout-root"])])
+
+        self.finish_trace(tracer, "fast", duration=0.1)
+        self.finish_trace(tracer, "slow", duration=0.6)
+        self.finish_trace(tracer, "checkout", duration=0.1)
+
+        self.assertEqual(self.reported_operations(),
+                         ["slow-child", "slow-root",
+                          "checkout-child", "checkout-root"])
+
+    def test_trace_without_local_root_is_decided_after_wait(self):
+        tracer, _ = self.make_tracer([ErrorPolicy()], decision_wait_ms=20)
+        upstream = SpanContext(trace_id="trace", span_id="upstream",
+                               sampled=True)
+
+        span = tracer.start_span("server", child_of=upstream)
+        span.set_tag("error", True)
+        span.finish()
+        self.assertEqual(self.reported_operations(), [])
+
+        deadline = time.monotonic() + 5
+        while not self.reported_operations() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.reported_operations(), ["server"])
+
+    def test_late_spans_follow_the_decision_of_their_trace(self):
+        tracer, _ = self.make_tracer([ErrorPolicy()])
+
+        failed = tracer.start_span("failed")
+        ok = tracer.start_span("ok")
+        failed.set_tag("error", True)
+        failed.finish()
+        ok.finish()
+        tracer.start_span("late-failed", child_of=failed).finish()
+        tracer.start_span("late-ok", child_of=ok).finish()
+
+        self.assertEqual(self.reported_operations(), ["failed", "late-failed"])
+
+    def test_least_recently_updated_traces_are_evicted(self):
+        tracer, recorder = self.make_tracer([ErrorPolicy()], max_spans=2)
+        upstream = SpanContext(trace_id="first", span_id="upstream")
+
+        first = tracer.start_span("first", child_of=upstream)
+        first.set_tag("error", True)
+        first.finish()
+        for name in ("second", "third"):
+            tracer.start_span(name, child_of=SpanContext(
+                trace_id=name, span_id="upstream")).finish()
+
+        self.assertEqual(recorder.evicted_traces, 1)
+        self.assertEqual(recorder.buffered_spans, 2)
+        self.assertEqual(self.reported_operations(), ["first"])
+
+    def test_flush_decides_buffered_traces(self):
+        tracer, recorder = self.make_tracer([OperationNamePolicy(["server"])])
+        upstream = SpanContext(trace_id="trace", span_id="upstream")
+
+        tracer.start_span("server", child_of=upstream).finish()
+
+        self.assertTrue(tracer.flush(timeout=5))
+        self.assertEqual(self.reported_operations(), ["server"])
+        self.assertEqual(recorder.buffered_spans, 0)
+        self.delegate.flush.assert_called_once_with(5)
+
+    def test_policies_are_required(self):
+        with self.assertRaises(ValueError):
+            TailSamplingRecorder(self.delegate, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,16 @@
 import unittest
 from opentracing import SpanContextCorruptedException
+from multidict import CIMultiDict
+from requests.structures import CaseInsensitiveDict
 from haystack.text_propagator import TextPropagator
-from haystack.propagator import PropagatorOpts
+from haystack.propagator import PropagatorOpts, is_case_insensitive
+from haystack.span import SpanContext
 from haystack.constants import (
     TRACE_ID,
     SPAN_ID,
     PARENT_SPAN_ID,
     BAGGAGE_PREFIX,
+    SAMPLED,
 )
 
 
@@ -36,7 +40,41 @@ class TextPropagatorTest(unittest.TestCase):
         self.assertIsNone(ctx)
 
     def test_lowercase_headers_are_still_extracted(self):
-        pass
+        carrier = {TRACE_ID.lower(): "1212", SPAN_ID.lower(): "1234",
+                   PARENT_SPAN_ID.lower(): "4321", SAMPLED.lower(): "1",
+                   BAGGAGE_PREFIX.lower() + "Item1": "Value1"}
+
+        ctx = self.propagator.extract(carrier)
+
+        self.assertEqual(ctx.trace_id, "1212")
+        self.assertEqual(ctx.span_id, "1234")
+        self.assertEqual(ctx.parent_id, "4321")
+        self.assertTrue(ctx.sampled)
+        self.assertDictEqual(ctx.baggage, {"Item1": "Value1"})
+
+    def test_case_insensitive_carriers_are_looked_up_directly(self):
+        headers = {"Host": "example.com", "Accept": "*/*",
+                   TRACE_ID.upper(): "1212", SPAN_ID.lower(): "1234",
+                   BAGGAGE_PREFIX.upper() + "Item1": "Value1"}
+        for carrier in (CaseInsensitiveDict(headers), CIMultiDict(headers)):
+            self.assertTrue(is_case_insensitive(carrier))
+
+            ctx = self.propagator.extract(carrier)
+
+            self.assertEqual(ctx.trace_id, "1212")
+            self.assertEqual(ctx.span_id, "1234")
+            self.assertIsNone(ctx.parent_id)
+            self.assertIsNone(ctx.sampled)
+            self.assertDictEqual(ctx.baggage, {"Item1": "Value1"})
+
+    def test_other_mappings_are_scanned(self):
+        class Headers(dict):
+            pass
+
+        carrier = Headers({TRACE_ID.upper(): "1212", SPAN_ID.lower(): "1234"})
+
+        self.assertFalse(is_case_insensitive(carrier))
+        self.assertEqual(self.propagator.extract(carrier).trace_id, "1212")
 
     def test_default_propagator_options_injected_and_context_is_extracted(self):
         span_id = "1234"
@@ -72,6 +110,33 @@ class TextPropagatorTest(unittest.TestCase):
         self.assertEqual(ctx.parent_id, parent_id)
         self.assertEqual(ctx.trace_id, trace_id)
 
+    def test_sampling_decision_is_injected_and_extracted(self):
+        for sampled, header in ((True, "1"), (False, "0")):
+            carrier = {}
+            self.propagator.inject(SpanContext(trace_id="1212", span_id="1234",
+                                               sampled=sampled), carrier)
+
+            self.assertEqual(carrier[SAMPLED], header)
+            self.assertEqual(self.propagator.extract(carrier).sampled, sampled)
+
+    def test_decision_not_to_sample_without_trace_round_trips(self):
+        carrier = {}
+
+        self.propagator.inject(SpanContext(sampled=False), carrier)
+        ctx = self.propagator.extract(carrier)
+
+        self.assertEqual(carrier, {SAMPLED: "0"})
+        self.assertIs(ctx.sampled, False)
+        self.assertIsNone(ctx.trace_id)
+        self.assertIsNone(self.propagator.extract({SAMPLED: "1"}))
+
+    def test_missing_sampling_decision_is_extracted_as_none(self):
+        carrier = {TRACE_ID: "1212", SPAN_ID: "1234"}
+
+        ctx = self.propagator.extract(carrier)
+
+        self.assertIsNone(ctx.sampled)
+
 
 if __name__ == "__main__":
     unittest.main()
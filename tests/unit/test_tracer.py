@@ -1,7 +1,33 @@
 import unittest
+from unittest import mock
+from opentracing import Format
 from haystack import HaystackTracer
+from haystack import tracer as tracer_module
 from haystack.recorder import NoopRecorder
-from haystack.span import SpanContext
+from haystack.sampler import ConstSampler
+from haystack.span import SpanContext, NonRecordingSpan
+from haystack.id_generator import IdGenerator
+from haystack.propagator import CompositePropagator
+from haystack.text_propagator import TextPropagator
+from haystack.w3c_propagator import W3CPropagator
+from haystack.b3_propagator import B3Propagator
+from haystack.constants import TRACEPARENT, DEFAULT_CLOSE_TIMEOUT
+
+
+class SequentialIdGenerator(IdGenerator):
+
+    def __init__(self):
+        self._next_id = 0
+
+    def _generate(self):
+        self._next_id += 1
+        return str(self._next_id)
+
+    def generate_trace_id(self):
+        return self._generate()
+
+    def generate_span_id(self):
+        return self._generate()
 
 
 class HaystackTracerTests(unittest.TestCase):
@@ -17,7 +43,7 @@ class HaystackTracerTests(unittest.TestCase):
 
         span = tracer.start_span("any_operation")
 
-        self.assertDictEqual(common_tags, span.tags)
+        self.assertDictEqual(common_tags, dict(span.tags))
 
     def test_common_tags_are_overridden_if_span_specifies_the_same(self):
         common_tags = {"a": "common_tag", "another": "common_tag"}
@@ -28,7 +54,51 @@ class HaystackTracerTests(unittest.TestCase):
         span = tracer.start_span("any_operation", tags=span_tags)
 
         expected_tags = {**common_tags, **span_tags}
-        self.assertDictEqual(expected_tags, span.tags)
+        self.assertDictEqual(expected_tags, dict(span.tags))
+
+    def test_spans_only_hold_their_own_tags(self):
+        common_tags = {"a": "common_tag"}
+        tracer = HaystackTracer("any_service", NoopRecorder(),
+                                common_tags=common_tags)
+
+        span = tracer.start_span("any_operation")
+        span.set_tag("b", "span_tag")
+        common_tags["a"] = "changed"
+
+        self.assertDictEqual({"b": "span_tag"}, dict(span.local_tags))
+        self.assertDictEqual({"a": "common_tag", "b": "span_tag"},
+                             dict(span.tags))
+        self.assertDictEqual({"a": "common_tag", "b": "span_tag"},
+                             dict(span.snapshot().tags))
+
+    def test_set_tag_does_not_modify_the_tags_passed_to_start_span(self):
+        for common_tags in (None, {"a": "common_tag"}):
+            with self.subTest(common_tags=common_tags):
+                tracer = HaystackTracer("any_service", NoopRecorder(),
+                                        common_tags=common_tags)
+                span_tags = {"span.kind": "server"}
+
+                tracer.start_span("a", tags=span_tags).set_tag("error", True)
+                span = tracer.start_span("b", tags=span_tags)
+
+                self.assertEqual(span_tags, {"span.kind": "server"})
+                self.assertNotIn("error", span.tags)
+
+    def test_merged_tags_are_read_only(self):
+        tracer = HaystackTracer("any_service", NoopRecorder(),
+                                common_tags={"a": "common_tag"})
+
+        span = tracer.start_span("any_operation")
+        with self.assertRaises(TypeError):
+            span.tags["b"] = "lost"
+        span.set_tag("b", "span_tag")
+        with self.assertRaises(TypeError):
+            span.tags["c"] = "lost"
+        with self.assertRaises(TypeError):
+            span.snapshot().tags["c"] = "lost"
+
+        self.assertDictEqual({"a": "common_tag", "b": "span_tag"},
+                             dict(span.tags))
 
     def test_non_shared_spans_are_created_by_default(self):
         tracer = HaystackTracer("any_service", NoopRecorder())
@@ -59,6 +129,143 @@ class HaystackTracerTests(unittest.TestCase):
         self.assertEqual(span.context.span_id, span_id)
         self.assertEqual(span.context.parent_id, parent_id)
 
+    def test_ids_are_taken_from_custom_id_generator(self):
+        tracer = HaystackTracer("any_service", NoopRecorder(),
+                                id_generator=SequentialIdGenerator())
+
+        root = tracer.start_span("root")
+        child = tracer.start_span("child", child_of=root)
+
+        self.assertEqual(root.context.span_id, "1")
+        self.assertEqual(root.context.trace_id, "2")
+        self.assertEqual(child.context.span_id, "3")
+        self.assertEqual(child.context.trace_id, "2")
+
+    def test_sampling_decision_is_stored_and_inherited_by_children(self):
+        recorder = mock.Mock()
+        tracer = HaystackTracer("any_service", recorder,
+                                sampler=ConstSampler(False))
+
+        root = tracer.start_span("root")
+        child = tracer.start_span("child", child_of=root)
+        child.finish()
+        root.finish()
+
+        self.assertFalse(root.context.sampled)
+        self.assertFalse(child.context.sampled)
+        recorder.record_span.assert_not_called()
+
+    def test_upstream_sampling_decision_overrides_sampler(self):
+        recorder = mock.Mock()
+        tracer = HaystackTracer("any_service", recorder,
+                                sampler=ConstSampler(False))
+        upstream_ctx = SpanContext(trace_id="123", span_id="1234",
+                                   sampled=True)
+
+        span = tracer.start_span("any_operation", child_of=upstream_ctx)
+        span.finish()
+
+        self.assertTrue(span.context.sampled)
+        recorder.record_span.assert_called_once_with(span)
+
+    def test_sampler_decides_when_upstream_made_no_decision(self):
+        sampler = mock.Mock()
+        sampler.is_sampled.return_value = False
+        tracer = HaystackTracer("any_service", NoopRecorder(), sampler=sampler)
+        upstream_ctx = SpanContext(trace_id="123", span_id="1234")
+
+        span = tracer.start_span("any_operation", child_of=upstream_ctx)
+
+        sampler.is_sampled.assert_called_once_with("123", "any_operation")
+        self.assertFalse(span.context.sampled)
+
+    def test_unsampled_spans_are_non_recording_but_propagate(self):
+        tracer = HaystackTracer("any_service", NoopRecorder(),
+                                sampler=ConstSampler(False))
+
+        span = tracer.start_span("any_operation")
+        span.set_tag("a", "tag").log_kv({"a": "log"})
+        span.set_baggage_item("item", "value")
+        child = tracer.start_span("child", child_of=span)
+        carrier = {}
+        tracer.inject(child.context, "text_map", carrier)
+
+        self.assertIsInstance(span, NonRecordingSpan)
+        self.assertEqual(child.context.trace_id, span.context.trace_id)
+        self.assertEqual(child.get_baggage_item("item"), "value")
+        self.assertEqual(tracer.extract("text_map", carrier).span_id,
+                         child.context.span_id)
+
+    def test_upstream_deny_without_ids_is_not_recorded_and_passed_on(self):
+        recorder = mock.Mock()
+        propagator = B3Propagator(single_header=True)
+        tracer = HaystackTracer("any_service", recorder,
+                                propagators={Format.HTTP_HEADERS: propagator})
+
+        upstream_ctx = tracer.extract(Format.HTTP_HEADERS, {"b3": "0"})
+        span = tracer.start_span("any_operation", child_of=upstream_ctx)
+        child = tracer.start_span("child", child_of=span)
+        child.finish()
+        span.finish()
+        carrier = {}
+        tracer.inject(child.context, Format.HTTP_HEADERS, carrier)
+
+        self.assertIsInstance(child, NonRecordingSpan)
+        recorder.record_span.assert_not_called()
+        self.assertEqual(carrier, {"b3": "0"})
+
+    def test_trace_state_is_inherited_by_children(self):
+        tracer = HaystackTracer("any_service", NoopRecorder())
+        upstream_ctx = SpanContext(trace_id="123", span_id="1234",
+                                   sampled=True, trace_state="vendor=abc")
+
+        span = tracer.start_span("any_operation", child_of=upstream_ctx)
+        span.set_baggage_item("item", "value")
+        child = tracer.start_span("child", child_of=span)
+
+        self.assertEqual(child.context.trace_state, "vendor=abc")
+
+    def test_propagators_replace_defaults_of_their_format(self):
+        propagator = CompositePropagator([TextPropagator(), W3CPropagator()])
+        tracer = HaystackTracer("any_service", NoopRecorder(),
+                                propagators={Format.HTTP_HEADERS: propagator})
+        span = tracer.start_span("any_operation")
+        headers = {}
+        text_map = {}
+
+        tracer.inject(span.context, Format.HTTP_HEADERS, headers)
+        tracer.inject(span.context, Format.TEXT_MAP, text_map)
+
+        self.assertIn(TRACEPARENT, headers)
+        self.assertNotIn(TRACEPARENT, text_map)
+
+    def test_exiting_tracer_context_flushes_shared_recorder(self):
+        recorder = mock.Mock()
+
+        with HaystackTracer("any_service", recorder):
+            pass
+
+        recorder.flush.assert_called_once_with(DEFAULT_CLOSE_TIMEOUT)
+        recorder.close.assert_not_called()
+
+    def test_closing_tracer_closes_recorder_once(self):
+        recorder = mock.Mock()
+        tracer = HaystackTracer("any_service", recorder)
+
+        tracer.close()
+        tracer.close()
+
+        recorder.close.assert_called_once_with(None)
+
+    def test_open_tracers_are_closed_at_exit(self):
+        recorder = mock.Mock()
+        tracer = HaystackTracer("any_service", recorder)
+
+        tracer_module._close_open_tracers()
+
+        recorder.close.assert_called_once()
+        self.assertNotIn(tracer, tracer_module._open_tracers)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from haystack import HaystackTracer
+from haystack import UnixSocketRecorder
+from haystack.exporter import SpanSocketServer
+from haystack.recorder import SpanRecorder
+from haystack.span_pb2 import Batch, Span
+from tests.unit.test_asyncio_recorder import CollectorStandIn
+
+
+class CapturingRecorder(SpanRecorder):
+    """Stands in for the batching recorder of the exporter"""
+
+    def __init__(self, expected):
+        self.encoded_spans = []
+        self._expected = expected
+        self.received = threading.Event()
+
+    def record_span(self, span):
+        pass
+
+    def record_encoded_span(self, encoded_span):
+        self.encoded_spans.append(encoded_span)
+        if len(self.encoded_spans) >= self._expected:
+            self.received.set()
+
+
+class UnixSocketRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.socket_path = os.path.join(directory, "exporter.sock")
+
+    def serve(self, recorder):
+        server = SpanSocketServer(self.socket_path, recorder)
+        threading.Thread(target=server.serve_forever,
+                         args=(0.05,),
+                         daemon=True).start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+
+        self.addCleanup(stop)
+
+    def test_spans_are_framed_to_the_exporter(self):
+        capturing = CapturingRecorder(expected=3)
+        self.serve(capturing)
+        recorder = UnixSocketRecorder(self.socket_path)
+        tracer = HaystackTracer("any_service", recorder)
+
+        for i in range(3):
+            tracer.start_span(f"operation-{i}").finish()
+
+        self.assertTrue(tracer.close(timeout=5))
+        self.assertTrue(capturing.received.wait(5))
+        names = [Span.FromString(encoded).operationName
+                 for encoded in capturing.encoded_spans]
+        self.assertEqual(names, ["operation-0", "operation-1", "operation-2"])
+
+    def test_spans_beyond_the_buffer_are_dropped_without_exporter(self):
+        recorder = UnixSocketRecorder(self.socket_path,
+                                      max_buffer_bytes=200,
+                                      reconnect_interval_seconds=60)
+        tracer = HaystackTracer("any_service", recorder)
+
+        for _ in range(10):
+            tracer.start_span("any_operation").finish()
+
+        self.assertGreater(recorder.dropped_spans, 0)
+        self.assertLess(recorder.dropped_spans, 10)
+        self.assertFalse(recorder.flush(timeout=0.05))
+
+    def test_buffered_spans_are_sent_once_the_exporter_starts(self):
+        recorder = UnixSocketRecorder(self.socket_path,
+                                      reconnect_interval_seconds=0.01)
+        tracer = HaystackTracer("any_service", recorder)
+        tracer.start_span("before_exporter").finish()
+
+        capturing = CapturingRecorder(expected=1)
+        self.serve(capturing)
+
+        self.assertTrue(tracer.close(timeout=5))
+        self.assertTrue(capturing.received.wait(5))
+        self.assertEqual(
+            Span.FromString(capturing.encoded_spans[0]).operationName,
+            "before_exporter")
+        self.assertEqual(recorder.dropped_spans, 0)
+
+
+class ExporterTest(unittest.TestCase):
+
+    def test_exporter_forwards_spans_to_the_collector(self):
+        collector = CollectorStandIn()
+        self.addCleanup(collector.stop)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        socket_path = os.path.join(directory, "exporter.sock")
+        exporter = subprocess.Popen([sys.executable, "-m", "haystack.exporter",
+                                     "--socket", socket_path,
+                                     "--collector-url", collector.url,
+                                     "--linger-ms", "10"],
+                                    stderr=subprocess.DEVNULL)
+        self.addCleanup(exporter.wait, 10)
+        self.addCleanup(exporter.send_signal, signal.SIGTERM)
+
+        tracer = HaystackTracer(
+            "any_service",
+            UnixSocketRecorder(socket_path, reconnect_interval_seconds=0.05))
+        tracer.start_span("through_exporter").finish()
+        self.assertTrue(tracer.close(timeout=10))
+        self.assertTrue(collector.received.wait(10))
+
+        batch = Batch.FromString(collector.payloads[0])
+        self.assertEqual(batch.spans[0].operationName, "through_exporter")
+        self.assertEqual(batch.spans[0].serviceName, "any_service")
+
+
+if __name__ == "__main__":
+    unittest.main()
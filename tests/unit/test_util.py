@@ -0,0 +1,71 @@
+import enum
+import numbers
+import unittest
+from haystack.span_pb2 import Tag
+from haystack.util import TypeDispatch, set_proto_tag_value
+
+
+class Status(enum.IntEnum):
+    OK = 200
+
+
+class RegisteredIntegral(object):
+    """Counts as numbers.Integral only through ABC registration"""
+
+    def __int__(self):
+        return 7
+
+    def __index__(self):
+        return 7
+
+
+numbers.Integral.register(RegisteredIntegral)
+
+
+class TypeDispatchTest(unittest.TestCase):
+
+    def test_resolves_each_type_once(self):
+        resolved = []
+        dispatch = TypeDispatch(lambda value_type: resolved.append(
+            value_type) or value_type.__name__)
+
+        self.assertEqual(dispatch[type(1)], "int")
+        self.assertEqual(dispatch[type(2)], "int")
+        self.assertEqual(dispatch[type("a")], "str")
+
+        self.assertEqual(resolved, [int, str])
+
+    def test_stops_caching_beyond_max_types(self):
+        dispatch = TypeDispatch(lambda value_type: value_type.__name__)
+        dispatch.max_types = 1
+
+        dispatch[int]
+        self.assertEqual(dispatch[str], "str")
+
+        self.assertEqual(list(dispatch), [int])
+
+
+class SetProtoTagValueTest(unittest.TestCase):
+
+    def test_subclasses_and_registered_types_use_abc_fallback(self):
+        enum_tag = Tag(key="status")
+        registered_tag = Tag(key="registered")
+
+        set_proto_tag_value(enum_tag, Status.OK)
+        set_proto_tag_value(registered_tag, RegisteredIntegral())
+
+        self.assertEqual((enum_tag.type, enum_tag.vLong), (Tag.LONG, 200))
+        self.assertEqual((registered_tag.type, registered_tag.vLong),
+                         (Tag.LONG, 7))
+
+    def test_bool_is_not_dispatched_as_long(self):
+        tag = Tag(key="flag")
+
+        set_proto_tag_value(tag, True)
+        set_proto_tag_value(tag, False)
+
+        self.assertEqual((tag.type, tag.vBool), (Tag.BOOL, False))
+
+
+if __name__ == "__main__":
+    unittest.main()
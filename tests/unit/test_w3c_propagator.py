@@ -0,0 +1,96 @@
+import unittest
+from opentracing import SpanContextCorruptedException
+from requests.structures import CaseInsensitiveDict
+from haystack.w3c_propagator import W3CPropagator
+from haystack.span import SpanContext
+from haystack.constants import TRACEPARENT, TRACESTATE
+
+TRACEPARENT_HEADER = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class W3CPropagatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.propagator = W3CPropagator()
+
+    def test_traceparent_is_extracted(self):
+        carrier = {"Traceparent": TRACEPARENT_HEADER,
+                   "Tracestate": "congo=t61rcWkgMzE"}
+
+        ctx = self.propagator.extract(carrier)
+
+        self.assertEqual(ctx.trace_id, "4bf92f35-77b3-4da6-a3ce-929d0e0e4736")
+        self.assertEqual(ctx.span_id, "00f067aa0ba902b7")
+        self.assertIsNone(ctx.parent_id)
+        self.assertTrue(ctx.sampled)
+        self.assertEqual(ctx.trace_state, "congo=t61rcWkgMzE")
+
+    def test_uuid_ids_are_injected_and_trace_id_round_trips(self):
+        span_context = SpanContext(
+            trace_id="9c5a3b52-2f9e-4bb0-9a53-1e47ca1b6a10",
+            span_id="0d4b8e6c-42c0-4d0e-8f7c-3c2d25d0a4c1",
+            sampled=False,
+            trace_state="vendor=abc")
+        carrier = {}
+
+        self.propagator.inject(span_context, carrier)
+        ctx = self.propagator.extract(carrier)
+
+        self.assertEqual(
+            carrier[TRACEPARENT],
+            "00-9c5a3b522f9e4bb09a531e47ca1b6a10-8f7c3c2d25d0a4c1-00")
+        self.assertEqual(carrier[TRACESTATE], "vendor=abc")
+        self.assertEqual(ctx.trace_id, span_context.trace_id)
+        self.assertEqual(ctx.span_id, "8f7c3c2d25d0a4c1")
+        self.assertFalse(ctx.sampled)
+
+    def test_ids_not_fitting_the_header_are_not_injected(self):
+        carrier = {}
+
+        self.propagator.inject(SpanContext(trace_id="not-hex",
+                                           span_id="1234"), carrier)
+
+        self.assertEqual(carrier, {})
+
+    def test_unsampled_flag_is_honored_unless_ignored(self):
+        carrier = {TRACEPARENT: TRACEPARENT_HEADER[:-2] + "00"}
+
+        self.assertIs(self.propagator.extract(carrier).sampled, False)
+        ctx = W3CPropagator(ignore_sampled_flag=True).extract(carrier)
+        self.assertIsNone(ctx.sampled)
+        self.assertEqual(ctx.span_id, "00f067aa0ba902b7")
+
+    def test_missing_traceparent_returns_none(self):
+        self.assertIsNone(self.propagator.extract({"tracestate": "a=b"}))
+
+    def test_case_insensitive_carriers_are_extracted(self):
+        carrier = CaseInsensitiveDict({"TRACEPARENT": TRACEPARENT_HEADER})
+
+        self.assertEqual(self.propagator.extract(carrier).span_id,
+                         "00f067aa0ba902b7")
+
+    def test_later_versions_with_extra_fields_are_extracted(self):
+        carrier = {TRACEPARENT: "cc" + TRACEPARENT_HEADER[2:] + "-what-ever"}
+
+        self.assertEqual(self.propagator.extract(carrier).span_id,
+                         "00f067aa0ba902b7")
+
+    def test_malformed_traceparent_throws_exception(self):
+        for header in (
+                "",
+                "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7",
+                "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01-x",
+                "ff-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",
+                "00-00000000000000000000000000000000-00f067aa0ba902b7-01",
+                "00-4bf92f3577b34da6a3ce929d0e0e4736-0000000000000000-01",
+                "00-4bf92f3577b34da6a3ce929d0e0e473-00f067aa0ba902b7f-01",
+                "00-4bf92f3577b34da6a3ce929d0e0e47zz-00f067aa0ba902b7-01",
+                "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-0x"):
+            with self.subTest(header=header):
+                self.assertRaises(SpanContextCorruptedException,
+                                  self.propagator.extract,
+                                  {TRACEPARENT: header})
+
+
+if __name__ == "__main__":
+    unittest.main()